@@ -0,0 +1,287 @@
+"""Streaming alert rules evaluated on every ingest batch
+
+Rules run against each newly inserted document in the order it was
+written, keeping a few numbers of state per rule and key (sensor, symbol,
+location), so memory stays constant however much history accumulates.
+Alerts are edge-triggered: a rule fires once when a key starts breaching
+it and re-arms when a reading is back in range. Fired alerts are stored in
+the ``alerts`` collection and pushed to connected dashboards.
+
+Rule state lives in the writing process; with several writer processes
+each sees only the documents it wrote.
+"""
+import abc
+import logging
+import math
+import threading
+from datetime import datetime
+
+from pymongo import DESCENDING, IndexModel
+
+from .conf import app_setting
+from .db_utils import get_collection, get_read_collection, get_write_collection
+from .jsonutils import epoch_ms
+from .metrics import Counter
+from .models_advanced import SensorData, StockData, SystemMetrics, TrafficData
+
+logger = logging.getLogger(__name__)
+
+ALERTS_COLLECTION = 'alerts'
+
+ALERTS_FIRED = Counter(
+    'dashboard_alerts_total',
+    'Alerts fired by the streaming rules engine',
+    ('source', 'rule'),
+)
+
+
+class Rule(abc.ABC):
+    """Checks one numeric field of ``model`` documents
+
+    ``check(state, value, timestamp)`` returns a message when the reading
+    breaches the rule, else None. ``state`` is the key's entry from
+    ``initial_state()``, updated in place.
+    """
+
+    def __init__(self, name, model, field, severity='warning'):
+        self.name = name
+        self.model = model
+        self.field = field
+        self.severity = severity
+
+    def initial_state(self):
+        return None
+
+    @abc.abstractmethod
+    def check(self, state, value, timestamp):
+        """Message when ``value`` breaches the rule, else None"""
+
+
+class Threshold(Rule):
+    """Fires when the value is above ``above`` or below ``below``
+
+    With ``inclusive`` a value equal to either limit fires too.
+    """
+
+    def __init__(self, name, model, field, above=None, below=None, inclusive=False, **kwargs):
+        super().__init__(name, model, field, **kwargs)
+        self.above = above
+        self.below = below
+        self.inclusive = inclusive
+
+    def check(self, state, value, timestamp):
+        at = 'at or ' if self.inclusive else ''
+        if self.above is not None and (
+            value >= self.above if self.inclusive else value > self.above
+        ):
+            return f'{self.field} {value:g} {at}above {self.above:g}'
+        if self.below is not None and (
+            value <= self.below if self.inclusive else value < self.below
+        ):
+            return f'{self.field} {value:g} {at}below {self.below:g}'
+        return None
+
+
+class RateOfChange(Rule):
+    """Fires when the value moves more than ``max_change`` between readings
+
+    With ``relative`` the change is a percentage of the previous reading;
+    with ``per_seconds`` it is scaled to that interval, so irregularly
+    spaced readings are compared fairly.
+    """
+
+    def __init__(self, name, model, field, max_change, relative=False, per_seconds=None,
+                 **kwargs):
+        super().__init__(name, model, field, **kwargs)
+        self.max_change = max_change
+        self.relative = relative
+        self.per_seconds = per_seconds
+
+    def initial_state(self):
+        # Previous value and timestamp
+        return [None, None]
+
+    def check(self, state, value, timestamp):
+        previous, previous_timestamp = state
+        state[0], state[1] = value, timestamp
+        if previous is None:
+            return None
+        change = value - previous
+        if self.relative:
+            if not previous:
+                return None
+            change = change / abs(previous) * 100
+        if self.per_seconds is not None:
+            elapsed = (timestamp - previous_timestamp).total_seconds()
+            if elapsed <= 0:
+                return None
+            change = change / elapsed * self.per_seconds
+        if abs(change) <= self.max_change:
+            return None
+        unit = '%' if self.relative else ''
+        interval = f'/{self.per_seconds:g}s' if self.per_seconds is not None else ''
+        return f'{self.field} changed {change:+.2f}{unit}{interval} (limit {self.max_change:g}{unit})'
+
+
+class EwmaZScore(Rule):
+    """Fires when the value is more than ``threshold`` standard deviations
+    from the exponentially weighted moving average of its key
+
+    Mean and variance are updated incrementally with smoothing ``alpha``;
+    nothing fires until ``warmup`` readings have been seen. The outlier is
+    folded into the average afterwards, so a lasting level shift stops
+    firing once the average has caught up.
+    """
+
+    def __init__(self, name, model, field, alpha=0.05, threshold=4.0, warmup=30, **kwargs):
+        super().__init__(name, model, field, **kwargs)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+
+    def initial_state(self):
+        # Readings seen, mean, variance
+        return [0, 0.0, 0.0]
+
+    def check(self, state, value, timestamp):
+        count, mean, variance = state
+        if count == 0:
+            state[:] = [1, float(value), 0.0]
+            return None
+        deviation = value - mean
+        z = deviation / math.sqrt(variance) if variance > 0 else 0.0
+        increment = self.alpha * deviation
+        state[:] = [count + 1, mean + increment, (1 - self.alpha) * (variance + deviation * increment)]
+        if count < self.warmup or abs(z) <= self.threshold:
+            return None
+        return f'{self.field} {value:g} is {z:+.1f}σ from its moving average {mean:.2f}'
+
+
+class AlertEngine:
+    """Evaluates ``rules`` against inserted documents, per key"""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self._rules_by_model = {}
+        for rule in self.rules:
+            self._rules_by_model.setdefault(rule.model, []).append(rule)
+        # (rule name, key) -> rule state
+        self._state = {}
+        # (rule name, key) pairs currently breaching
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def evaluate(self, model, documents):
+        """Alert documents fired by ``documents`` of ``model``"""
+        rules = self._rules_by_model.get(model)
+        if not rules:
+            return []
+        alerts = []
+        with self._lock:
+            for doc in documents:
+                key = doc.get(model.key_field) if model.key_field else None
+                timestamp = doc.get('timestamp')
+                for rule in rules:
+                    value = doc.get(rule.field)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    slot = (rule.name, key)
+                    state = self._state.get(slot)
+                    if state is None:
+                        state = self._state[slot] = rule.initial_state()
+                    message = rule.check(state, value, timestamp)
+                    if message is None:
+                        self._active.discard(slot)
+                    elif slot not in self._active:
+                        self._active.add(slot)
+                        alerts.append({
+                            'source': model.source,
+                            'key': key,
+                            'rule': rule.name,
+                            'severity': rule.severity,
+                            'field': rule.field,
+                            'value': value,
+                            'message': message,
+                            'timestamp': timestamp,
+                            'document_id': doc.get('_id'),
+                        })
+        return alerts
+
+    def process(self, model, documents):
+        """Evaluate, store and broadcast; returns the alerts fired"""
+        alerts = self.evaluate(model, documents)
+        if not alerts:
+            return alerts
+        for alert in alerts:
+            ALERTS_FIRED.inc(source=alert['source'], rule=alert['rule'])
+        # insert_many adds _id to the dicts, so serialize for clients first
+        payload = [serialize(alert) for alert in alerts]
+        get_write_collection(ALERTS_COLLECTION).insert_many(alerts, ordered=False)
+        if app_setting('ALERTS', 'broadcast', True):
+            from .broadcast import broadcast_alerts
+            broadcast_alerts(payload)
+        return alerts
+
+
+def serialize(alert):
+    """JSON-ready copy of an alert document, timestamp in epoch ms"""
+    data = {name: value for name, value in alert.items() if name not in ('_id', 'document_id')}
+    if isinstance(data.get('timestamp'), datetime):
+        data['timestamp'] = epoch_ms(data['timestamp'])
+    return data
+
+
+RULES = (
+    # Same limit the generators use for a sensor's 'warning' status
+    Threshold('high_temperature', SensorData, 'temperature', above=30, inclusive=True),
+    EwmaZScore('temperature_anomaly', SensorData, 'temperature'),
+    Threshold('high_cpu', SystemMetrics, 'cpu_usage', above=90, severity='critical'),
+    Threshold('high_memory', SystemMetrics, 'memory_usage', above=90),
+    Threshold('disk_full', SystemMetrics, 'disk_usage', above=95, severity='critical'),
+    EwmaZScore('network_in_anomaly', SystemMetrics, 'network_in'),
+    RateOfChange('price_jump', StockData, 'price', max_change=5, relative=True),
+    EwmaZScore('volume_anomaly', StockData, 'volume'),
+    # Same limit as the 'High' congestion level
+    Threshold('congestion', TrafficData, 'avg_speed', below=30),
+    RateOfChange('speed_drop', TrafficData, 'avg_speed', max_change=40),
+)
+
+INDEXES = (
+    IndexModel([('timestamp', DESCENDING)], name='timestamp_desc'),
+    IndexModel([('source', 1), ('timestamp', DESCENDING)], name='source_timestamp'),
+)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide AlertEngine over RULES"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AlertEngine(RULES)
+    return _engine
+
+
+def ensure_indexes():
+    return get_collection(ALERTS_COLLECTION).create_indexes(list(INDEXES))
+
+
+def get_recent(limit=50, source=None):
+    """Newest alerts first, optionally for one source"""
+    query = {'source': source} if source else {}
+    cursor = get_read_collection(ALERTS_COLLECTION).find(query, {'_id': 0, 'document_id': 0})
+    return [serialize(alert) for alert in cursor.sort('timestamp', DESCENDING).limit(limit)]
+
+
+def evaluate_alerts(sender, documents, **kwargs):
+    """documents_inserted receiver: run the alert rules over new documents"""
+    if not documents:
+        return
+    try:
+        get_engine().process(sender, documents)
+    except Exception:
+        # The raw write already succeeded; a lost alert must not fail it
+        logger.exception('Failed to evaluate alerts for %s', sender.source)
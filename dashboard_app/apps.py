@@ -1,6 +1,87 @@
+import logging
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_all_indexes():
+    from . import alerts
+    from .models_advanced import MODELS
+
+    for model in MODELS:
+        try:
+            model.ensure_collection()
+            model.ensure_indexes()
+        except Exception:
+            logger.exception("Could not create indexes for %s", model.collection_name)
+    try:
+        alerts.ensure_indexes()
+    except Exception:
+        logger.exception("Could not create indexes for %s", alerts.ALERTS_COLLECTION)
 
 
 class DashboardAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dashboard_app"
+
+    def ready(self):
+        from .alerts import evaluate_alerts
+        from .broadcast import broadcast_documents
+        from .cache import invalidate_snapshots
+        from .db_utils import retry_in_background
+        from .hottier import feed_hot_tier, is_enabled as hot_tier_enabled, warm_up
+        from .rollups import update_rollups
+        from .signals import documents_inserted
+        from .windows import update_windows, warm_up as warm_up_windows
+
+        # Rollups first so an invalidated snapshot is rebuilt from fresh totals
+        documents_inserted.connect(
+            update_rollups, dispatch_uid="dashboard_update_rollups"
+        )
+        if settings.ALERTS.get("enabled"):
+            documents_inserted.connect(
+                evaluate_alerts, dispatch_uid="dashboard_evaluate_alerts"
+            )
+        if not settings.CHANGE_STREAM.get("enabled"):
+            # Otherwise the change stream watcher publishes inserts from
+            # every writer process (see changestream.py)
+            documents_inserted.connect(
+                feed_hot_tier, dispatch_uid="dashboard_feed_hot_tier"
+            )
+            documents_inserted.connect(
+                update_windows, dispatch_uid="dashboard_update_windows"
+            )
+            documents_inserted.connect(
+                invalidate_snapshots, dispatch_uid="dashboard_invalidate_snapshots"
+            )
+            documents_inserted.connect(
+                broadcast_documents, dispatch_uid="dashboard_broadcast"
+            )
+
+        if settings.CHANGE_STREAM.get("enabled"):
+            from .changestream import unsupported_reason
+
+            reason = unsupported_reason()
+            if reason is not None:
+                logger.error("Live updates will not work: %s", reason)
+
+        if not settings.CHANGE_STREAM.get("enabled"):
+            # Otherwise the change stream watcher warms up once its stream is open
+            if hot_tier_enabled():
+                retry_in_background(warm_up, "hot-tier-warm-up")
+            elif settings.HOT_TIER.get("enabled"):
+                logger.warning(
+                    "Hot tier disabled: it needs CHANGE_STREAM_ENABLED=True, or "
+                    "HOT_TIER_SINGLE_PROCESS=True in the only process writing data"
+                )
+            if settings.ANALYTICS_WINDOWS.get("incremental"):
+                retry_in_background(warm_up_windows, "analytics-windows-warm-up")
+
+        if settings.MONGODB_SETTINGS.get("ensure_indexes"):
+            # In a thread so an unreachable MongoDB doesn't block startup
+            threading.Thread(
+                target=ensure_all_indexes, name="ensure-indexes", daemon=True
+            ).start()
@@ -0,0 +1,248 @@
+"""Parallel, resumable generation of historical data
+
+The requested time range is split into fixed-size chunks per source. Each
+chunk is generated with the vectorized generator and written with
+unordered ``insert_many`` calls from a pool of worker processes.
+
+Every document gets a deterministic ``_id`` derived from the run, source,
+chunk and row, with the document's own timestamp in the ObjectId's time
+part. Each run's parameters and resolved time range, and its started and
+completed chunks, are recorded in the ``backfill_progress`` collection: a
+rerun with the same parameters skips completed chunks and only writes the
+missing documents of interrupted ones (time-series collections have no
+unique ``_id`` index to reject them). ``unfinished_run()`` finds the range
+of an interrupted run whose end defaulted to "now", so it can be resumed.
+
+The writes bypass ``create_many()`` and its signal, so each chunk is folded
+into the matching rollups directly. Rebuilding them afterwards would lose
+history once raw data expires. Chunks whose rollups were applied are
+recorded too, so a retry folds in the whole chunk, including documents an
+earlier attempt wrote, unless that attempt got as far as its rollups.
+"""
+import hashlib
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from .conf import setup_worker
+from .data_generator_vectorized import columns_to_documents, default_keys, generate_columns
+from .db_utils import DUPLICATE_KEY, get_collection
+from .models_advanced import SOURCES
+from .rollups import ROLLUPS
+
+PROGRESS_COLLECTION = 'backfill_progress'
+# The ObjectId counter is 3 bytes
+MAX_ROWS_PER_CHUNK = 2 ** 24
+# Ranges are stored with MongoDB's millisecond precision
+MILLISECOND = timedelta(milliseconds=1)
+
+def run_id(params):
+    """Stable identifier for a backfill's parameters"""
+    text = repr(sorted(params.items()))
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+def backfill_params(sources, interval=1.0, chunk_seconds=3600, seed=0, sensors=4, symbols=6,
+                    cities=5):
+    """Parameters other than the time range that identify a run"""
+    return {
+        'sources': tuple(sources), 'interval': interval, 'chunk': chunk_seconds,
+        'seed': seed, 'sensors': sensors, 'symbols': symbols, 'cities': cities,
+    }
+
+def _params_query(params):
+    return {
+        f'params.{name}': list(value) if isinstance(value, tuple) else value
+        for name, value in params.items()
+    }
+
+def chunk_ranges(start, end, chunk_seconds):
+    """(chunk_index, chunk_start, chunk_end) tuples covering [start, end)"""
+    step = np.timedelta64(int(chunk_seconds * 1000), 'ms')
+    ranges = []
+    current = start
+    index = 0
+    while current < end:
+        ranges.append((index, current, min(current + step, end)))
+        current += step
+        index += 1
+    return ranges
+
+def document_ids(run, source, chunk_index, timestamps):
+    """Deterministic ObjectIds: timestamp seconds + run/source/chunk digest + row"""
+    digest = hashlib.sha1(f'{run}:{source}:{chunk_index}'.encode()).digest()[:5]
+    seconds = timestamps.astype('datetime64[s]').astype('>u4')
+    raw = np.empty((len(timestamps), 12), dtype=np.uint8)
+    raw[:, 0:4] = seconds.view(np.uint8).reshape(-1, 4)
+    raw[:, 4:9] = np.frombuffer(digest, dtype=np.uint8)
+    counter = np.arange(len(timestamps), dtype='>u4').view(np.uint8).reshape(-1, 4)
+    raw[:, 9:12] = counter[:, 1:]
+    data = raw.tobytes()
+    return [ObjectId(data[i:i + 12]) for i in range(0, len(data), 12)]
+
+def backfill_chunk(task):
+    """Generate and insert one chunk; returns (source, chunk_index, inserted, seconds)"""
+    setup_worker()
+
+    started = time.perf_counter()
+    source = task['source']
+    start = np.datetime64(task['start'], 'ms')
+    end = np.datetime64(task['end'], 'ms')
+    keys = task['keys']
+    per_tick = len(keys) if keys else 1
+
+    ticks = np.arange(start, end, np.timedelta64(int(task['interval'] * 1000), 'ms'))
+    timestamps = np.repeat(ticks, per_tick)
+    if len(timestamps) > MAX_ROWS_PER_CHUNK:
+        raise ValueError(f'Chunk of {len(timestamps)} rows is too large; use a smaller --chunk')
+
+    rng = np.random.default_rng([task['seed'], zlib.crc32(source.encode()), task['chunk_index']])
+    state = {'prices': {}} if source == 'stocks' else {}
+    columns = generate_columns(source, len(timestamps), rng, keys, timestamps, **state)
+    docs = columns_to_documents(columns)
+    for doc, _id in zip(docs, document_ids(task['run'], source, task['chunk_index'], timestamps)):
+        doc['_id'] = _id
+
+    model = SOURCES[source]
+    missing = docs
+    if task['retry']:
+        # Skip the documents an interrupted earlier attempt already wrote
+        existing = {
+            doc['_id'] for doc in model.get_collection().find(
+                {'timestamp': {'$gte': task['start'], '$lt': task['end']}}, {'_id': 1}
+            )
+        }
+        missing = [doc for doc in docs if doc['_id'] not in existing]
+
+    collection = model.get_write_collection()
+    inserted = 0
+    for offset in range(0, len(missing), task['batch_size']):
+        batch = missing[offset:offset + task['batch_size']]
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+                raise
+            inserted += e.details['nInserted']
+
+    if task['rollups'] and not task['rolled_up']:
+        # The whole chunk: an interrupted attempt may have written documents
+        # without folding them in
+        for rollup in ROLLUPS:
+            if rollup.model is model:
+                rollup.apply(docs)
+        mark_rolled_up(task['run'], source, task['chunk_index'])
+    return source, task['chunk_index'], inserted, time.perf_counter() - started
+
+def chunk_progress(run, source):
+    """(started, completed, rolled_up) chunk indexes of a source in a run"""
+    progress = get_collection(PROGRESS_COLLECTION).find_one({'_id': f'{run}:{source}'}) or {}
+    return tuple(set(progress.get(name, [])) for name in ('started', 'completed', 'rolled_up'))
+
+def record_run(run, params, start, end):
+    """Store a run's parameters and resolved range, once"""
+    get_collection(PROGRESS_COLLECTION).update_one(
+        {'_id': run},
+        {'$setOnInsert': {
+            'params': dict(params, sources=list(params['sources'])),
+            'start': start, 'end': end, 'created': datetime.now(), 'finished': False,
+        }},
+        upsert=True,
+    )
+
+def unfinished_run(params, start=None, length=None):
+    """(start, end) of the newest unfinished run with these parameters
+
+    ``start`` and ``length`` (a timedelta), when given, must match too.
+    Returns None when there is no such run.
+    """
+    runs = get_collection(PROGRESS_COLLECTION).find(
+        {'finished': False, **_params_query(params)}
+    ).sort('created', -1)
+    for run in runs:
+        if start is not None and abs(run['start'] - start) >= MILLISECOND:
+            continue
+        if length is not None and abs(run['end'] - run['start'] - length) >= MILLISECOND:
+            continue
+        return run['start'], run['end']
+    return None
+
+def mark_finished(run):
+    get_collection(PROGRESS_COLLECTION).update_one({'_id': run}, {'$set': {'finished': True}})
+
+def mark_started(run, source, chunk_indexes):
+    get_collection(PROGRESS_COLLECTION).update_one(
+        {'_id': f'{run}:{source}'},
+        {'$addToSet': {'started': {'$each': list(chunk_indexes)}}},
+        upsert=True,
+    )
+
+def mark_rolled_up(run, source, chunk_index):
+    get_collection(PROGRESS_COLLECTION).update_one(
+        {'_id': f'{run}:{source}'},
+        {'$addToSet': {'rolled_up': chunk_index}},
+        upsert=True,
+    )
+
+def mark_completed(run, source, chunk_index, inserted):
+    get_collection(PROGRESS_COLLECTION).update_one(
+        {'_id': f'{run}:{source}'},
+        {'$addToSet': {'completed': chunk_index}, '$inc': {'inserted': inserted}},
+        upsert=True,
+    )
+
+def run_backfill(start, end, sources, interval=1.0, chunk_seconds=3600, workers=4,
+                 batch_size=5000, seed=0, sensors=4, symbols=6, cities=5, rollups=True,
+                 on_progress=None):
+    """Backfill ``sources`` over [start, end) and return per-source totals
+
+    ``on_progress(source, done_chunks, total_chunks, inserted, docs_per_sec)``
+    is called after every completed chunk.
+    """
+    start = np.datetime64(start, 'ms')
+    end = np.datetime64(end, 'ms')
+    params = backfill_params(
+        sources, interval=interval, chunk_seconds=chunk_seconds, seed=seed,
+        sensors=sensors, symbols=symbols, cities=cities,
+    )
+    run = run_id({'start': str(start), 'end': str(end), **params})
+    record_run(run, params, start.astype(object), end.astype(object))
+    chunks = chunk_ranges(start, end, chunk_seconds)
+
+    tasks = []
+    totals = {}
+    for source in sources:
+        started, done, rolled_up = chunk_progress(run, source)
+        keys = default_keys(source, sensors=sensors, symbols=symbols, cities=cities)
+        totals[source] = {'done': len(done), 'chunks': len(chunks), 'inserted': 0}
+        pending = [chunk for chunk in chunks if chunk[0] not in done]
+        mark_started(run, source, [index for index, _, _ in pending])
+        for index, chunk_start, chunk_end in pending:
+            tasks.append({
+                'run': run, 'source': source, 'chunk_index': index,
+                'start': chunk_start.astype(object), 'end': chunk_end.astype(object),
+                'interval': interval, 'keys': keys, 'seed': seed,
+                'batch_size': batch_size, 'retry': index in started,
+                'rollups': rollups, 'rolled_up': index in rolled_up,
+            })
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(backfill_chunk, task) for task in tasks]
+        for future in as_completed(futures):
+            source, index, inserted, _ = future.result()
+            mark_completed(run, source, index, inserted)
+            total = totals[source]
+            total['done'] += 1
+            total['inserted'] += inserted
+            if on_progress is not None:
+                elapsed = time.perf_counter() - started
+                on_progress(source, total['done'], total['chunks'], total['inserted'],
+                            sum(t['inserted'] for t in totals.values()) / elapsed)
+    if all(total['done'] == total['chunks'] for total in totals.values()):
+        mark_finished(run)
+    return run, totals
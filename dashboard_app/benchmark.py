@@ -0,0 +1,198 @@
+"""Benchmarks of the API, read, write and serialization hot paths
+
+``run_benchmarks`` seeds a scratch database with synthetic documents at
+each requested dataset size and times every case, reporting per-call
+latency percentiles and throughput. It runs against the configured
+MongoDB (under a separate database name) or, for the CPU-bound parts,
+against mongomock.
+"""
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.test import RequestFactory
+
+from . import db_utils
+from .cache import get_snapshot_cache
+from .conditional import reset_last_built
+from .data_generator_vectorized import columns_to_documents, generate_columns
+from .metrics import percentile
+from .models_advanced import MODELS
+from .rollups import ROLLUPS
+from .views_advanced import api_all_data, api_analytics
+
+SEED_BATCH = 10000
+SERIALIZE_DOCS = 1000
+# Databases whose name lacks this suffix are only dropped with force=True
+SCRATCH_SUFFIX = '_benchmark'
+
+def use_database(db_name, mongomock=False):
+    """Point db_utils at ``db_name``, on mongomock if requested"""
+    if mongomock:
+        import mongomock as mongomock_module
+        client = mongomock_module.MongoClient()
+    else:
+        client = db_utils.get_db().client
+    with db_utils._lock:
+        db_utils._client = client
+        db_utils._db = client[db_name]
+        db_utils._pid = os.getpid()
+    return db_utils._db
+
+def summarize(samples_ms, ops_per_call=1):
+    """Latency percentiles (ms) and throughput of a list of call durations"""
+    ordered = sorted(samples_ms)
+    total = sum(ordered)
+    return {
+        'calls': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50), 3),
+        'p95_ms': round(percentile(ordered, 0.95), 3),
+        'p99_ms': round(percentile(ordered, 0.99), 3),
+        'mean_ms': round(total / len(ordered), 3) if ordered else 0.0,
+        'ops_per_sec': round(len(ordered) * ops_per_call / (total / 1000), 1) if total else 0.0,
+    }
+
+def time_calls(fn, iterations, before=None):
+    """Durations (ms) of ``iterations`` calls of ``fn``; ``before`` runs untimed"""
+    samples = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def view_caller(view, path):
+    """Call ``view`` for a GET of ``path``, failing on error responses"""
+    factory = RequestFactory()
+
+    def call():
+        response = view(factory.get(path))
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} answered {response.status_code}: {response.content[:200]!r}')
+    return call
+
+def seed(model, size, seed_value=0):
+    """Insert ``size`` documents spread over the last ``size`` seconds"""
+    rng = np.random.default_rng(seed_value)
+    collection = model.get_write_collection()
+    end = np.datetime64(datetime.now(), 'ms')
+    rollups = [rollup for rollup in ROLLUPS if rollup.model is model]
+    state = {'prices': {}} if model.source == 'stocks' else {}
+    for offset in range(0, size, SEED_BATCH):
+        n = min(SEED_BATCH, size - offset)
+        timestamps = end - np.arange(offset + n, offset, -1).astype('timedelta64[s]')
+        docs = columns_to_documents(
+            generate_columns(model.source, n, rng, timestamps=timestamps, **state)
+        )
+        collection.insert_many(docs, ordered=False)
+        # Written directly, so fold into the rollups like the insert signal would
+        for rollup in rollups:
+            rollup.apply(docs)
+
+def reset(db):
+    for model in MODELS:
+        db.drop_collection(model.collection_name)
+    for rollup in ROLLUPS:
+        db.drop_collection(rollup.totals.name)
+        db.drop_collection(rollup.hourly.name)
+    cold_start()
+
+def cold_start():
+    """Drop cached snapshots and the builds they would be reused from"""
+    get_snapshot_cache().invalidate()
+    reset_last_built()
+
+def benchmark_cases(iterations):
+    """(name, run) pairs; run() returns summarize() output"""
+    all_data = view_caller(api_all_data, '/api/all-data/')
+    analytics = view_caller(api_analytics, '/api/analytics/')
+    cases = [
+        ('api_all_data (cold)', lambda: summarize(
+            time_calls(all_data, iterations, cold_start)
+        )),
+        ('api_all_data (cached)', lambda: summarize(time_calls(all_data, iterations))),
+        ('api_analytics (cold)', lambda: summarize(
+            time_calls(analytics, iterations, cold_start)
+        )),
+    ]
+    for model in MODELS:
+        cases.append((f'{model.__name__}.get_latest(50)', lambda model=model: summarize(
+            time_calls(lambda: model.get_latest(50), iterations)
+        )))
+
+        def serialize(model=model):
+            docs = model.get_latest(SERIALIZE_DOCS)
+            return summarize(
+                time_calls(lambda: model.serialize_many(docs), iterations), len(docs) or 1
+            )
+        cases.append((f'{model.__name__}.serialize_many({SERIALIZE_DOCS})', serialize))
+
+        def create(model=model):
+            records = columns_to_documents(
+                generate_columns(model.source, iterations, np.random.default_rng(1))
+            )
+            for record in records:
+                del record['timestamp']
+            records = iter(records)
+            return summarize(time_calls(lambda: model.create(**next(records)), iterations))
+        cases.append((f'{model.__name__}.create', create))
+    return cases
+
+def check_scratch_database(db_name):
+    """Raise ValueError unless ``db_name`` looks like a scratch database
+
+    The benchmark drops every dashboard collection of the database it runs
+    in, before and after each dataset size.
+    """
+    if db_name == settings.MONGODB_SETTINGS['db_name']:
+        raise ValueError(f'{db_name!r} is the configured dashboard database')
+    if not db_name.endswith(SCRATCH_SUFFIX):
+        raise ValueError(f'{db_name!r} does not end with {SCRATCH_SUFFIX!r}')
+
+def run_benchmarks(sizes, iterations=50, mongomock=False, db_name=None, keep=False,
+                   on_result=None, force=False):
+    """Benchmark every case at each dataset size (documents per source)
+
+    ``on_result(size, name, result)`` is called as results come in; the
+    full report is returned. On MongoDB, ``db_name`` must pass
+    ``check_scratch_database`` unless ``force`` is set.
+    """
+    db_name = db_name or f"{settings.MONGODB_SETTINGS['db_name']}{SCRATCH_SUFFIX}"
+    if not (mongomock or force):
+        check_scratch_database(db_name)
+    db = use_database(db_name, mongomock=mongomock)
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'backend': 'mongomock' if mongomock else 'mongodb',
+        'database': db_name,
+        'python': platform.python_version(),
+        'iterations': iterations,
+        'results': [],
+    }
+    try:
+        for size in sizes:
+            reset(db)
+            started = time.perf_counter()
+            for model in MODELS:
+                seed(model, size)
+            seed_seconds = time.perf_counter() - started
+            if on_result is not None:
+                on_result(size, 'seed', {
+                    'documents': size * len(MODELS),
+                    'docs_per_sec': round(size * len(MODELS) / seed_seconds, 1),
+                })
+            for name, run in benchmark_cases(iterations):
+                result = run()
+                report['results'].append({'size': size, 'case': name, **result})
+                if on_result is not None:
+                    on_result(size, name, result)
+    finally:
+        if not keep:
+            reset(db)
+    report['finished'] = datetime.now().isoformat(timespec='seconds')
+    return report
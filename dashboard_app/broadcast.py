@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import zlib
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .conf import app_setting
+from .cursors import high_water_mark
+from .jsonutils import dumps
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_GROUP = 'dashboard'
+SEND_TIMEOUT = 5
+
+# Event loop of the ASGI server, set by the consumers. Background threads
+# send through it because the in-memory channel layer only works there.
+_server_loop = None
+
+
+def bind_event_loop(loop):
+    global _server_loop
+    _server_loop = loop
+
+
+def feed_is_complete():
+    """Whether the live feed carries inserts from every writer process
+
+    The in-memory channel layer only reaches consumers of the process that
+    wrote the documents, unless this process watches the change stream.
+    With change streams on, writers do not broadcast, so the feed is empty
+    when the stream cannot report the inserts.
+    """
+    from django.conf import settings
+    from .changestream import unsupported_reason
+    if settings.CHANGE_STREAM.get('enabled', False):
+        return unsupported_reason() is None
+    return settings.CHANNEL_LAYER != 'memory'
+
+
+def encode_batch(batch):
+    """Channel layer message carrying one client frame for ``batch``
+
+    The frame (model -> documents as a list of per-source updates) is
+    serialized once here, so consumers forward it to every client without
+    re-encoding. Large frames are zlib-compressed for the channel layer hop.
+    """
+    frame = dumps({
+        'type': 'batch',
+        'updates': [
+            {
+                'source': model.source,
+                'data': model.serialize_many(documents),
+                'cursor': high_water_mark(documents),
+            }
+            for model, documents in batch.items() if documents
+        ],
+    })
+    compressed = len(frame) >= app_setting('BROADCAST', 'compress_min_bytes', 4096)
+    if compressed:
+        frame = zlib.compress(frame, app_setting('BROADCAST', 'compress_level', 1))
+    return {'type': 'dashboard.batch', 'frame': frame, 'compressed': compressed}
+
+
+def broadcast_batch(batch):
+    """Push one batch (model -> newly inserted documents) to every dashboard"""
+    if not any(batch.values()):
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        _group_send(channel_layer, encode_batch(batch))
+    except Exception:
+        # A failed broadcast must never fail the write that triggered it
+        logger.exception('Failed to broadcast %s', ', '.join(model.source for model in batch))
+
+
+def broadcast_alerts(alerts):
+    """Push serialized alerts (see alerts.serialize) to every dashboard"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not alerts:
+        return
+    try:
+        frame = dumps({'type': 'alerts', 'alerts': alerts})
+        _group_send(channel_layer, {'type': 'dashboard.alerts', 'frame': frame, 'compressed': False})
+    except Exception:
+        logger.exception('Failed to broadcast %d alerts', len(alerts))
+
+
+def _group_send(channel_layer, message):
+    loop = _server_loop
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(
+            channel_layer.group_send(DASHBOARD_GROUP, message), loop
+        ).result(SEND_TIMEOUT)
+    else:
+        async_to_sync(channel_layer.group_send)(DASHBOARD_GROUP, message)
+
+
+class BroadcastBatcher:
+    """Coalesces broadcasts over ``interval`` seconds into one message
+
+    The first documents queued start a timer; everything queued until it
+    fires goes out in a single group_send. With an interval of 0 every call
+    is sent immediately.
+    """
+
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = app_setting('BROADCAST', 'batch_interval', 0.1)
+        self.interval = interval
+        self._pending = defaultdict(list)
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, model, documents):
+        if not self.interval:
+            broadcast_batch({model: documents})
+            return
+        with self._lock:
+            self._pending[model].extend(documents)
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(list)
+            self._timer = None
+        broadcast_batch(batch)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Process-wide BroadcastBatcher configured from settings.BROADCAST"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = BroadcastBatcher()
+    return _batcher
+
+
+def broadcast_documents(sender, documents, **kwargs):
+    """documents_inserted receiver: queue new documents for the next broadcast"""
+    if documents:
+        get_batcher().add(sender, documents)
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+
+from .conf import app_setting
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """Short-lived cache of API snapshots shared by every request
+
+    Entries live for ``ttl`` seconds or until ``invalidate()`` is called by
+    the ingest path. Concurrent misses for the same key are collapsed so the
+    builder runs once per refresh, not once per viewer.
+
+    With ``backend`` set to a Django cache alias (e.g. Redis), snapshots are
+    stored there and shared by every worker process. Invalidation bumps a
+    generation counter in the backend so all workers see it.
+    """
+
+    GENERATION_KEY = 'dashboard:snapshot:generation'
+
+    def __init__(self, ttl=None, backend=None):
+        self.ttl = ttl if ttl is not None else app_setting('SNAPSHOT_CACHE', 'ttl', 2.0)
+        if backend is None:
+            backend = app_setting('SNAPSHOT_CACHE', 'backend', None)
+        self.backend_alias = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    @property
+    def backend(self):
+        if not self.backend_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend_alias]
+
+    def get_or_build(self, key, builder):
+        """Return the cached snapshot for ``key``, building it on a miss"""
+        value = self._get(key)
+        if value is not None:
+            self._count_hit()
+            return value
+
+        with self._build_lock(key):
+            # Another thread may have built it while we waited
+            value = self._get(key)
+            if value is not None:
+                self._count_hit()
+                return value
+            with self._lock:
+                self.misses += 1
+                generation = self._generation
+            value = builder()
+            self._set(key, value, generation)
+            return value
+
+    def invalidate(self):
+        """Drop every cached snapshot"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+        backend = self.backend
+        if backend is not None:
+            try:
+                backend.incr(self.GENERATION_KEY)
+            except ValueError:
+                backend.set(self.GENERATION_KEY, 1, timeout=None)
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'ttl': self.ttl,
+                'backend': self.backend_alias or 'local',
+            }
+
+    def _count_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def _build_lock(self, key):
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def _backend_key(self, backend, key):
+        generation = backend.get(self.GENERATION_KEY, 0)
+        return f'dashboard:snapshot:{key}:{generation}'
+
+    def _get(self, key):
+        backend = self.backend
+        if backend is not None:
+            return backend.get(self._backend_key(backend, key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def _set(self, key, value, generation):
+        backend = self.backend
+        if backend is not None:
+            backend.set(self._backend_key(backend, key), value, timeout=self.ttl)
+        now = time.monotonic()
+        with self._lock:
+            # Don't store a snapshot built from data invalidated mid-build
+            if backend is None and generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+            self._prune(now)
+
+    def _prune(self, now):
+        """Drop expired entries and idle build locks; call with _lock held"""
+        for key in [key for key, (expires, _) in self._entries.items() if expires < now]:
+            del self._entries[key]
+        for key in [
+            key for key, lock in self._build_locks.items()
+            if key not in self._entries and not lock.locked()
+        ]:
+            # At worst a thread about to take the dropped lock builds once more
+            del self._build_locks[key]
+
+
+_snapshot_cache = None
+_snapshot_cache_lock = threading.Lock()
+
+
+def get_snapshot_cache():
+    """Process-wide SnapshotCache configured from settings.SNAPSHOT_CACHE"""
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        with _snapshot_cache_lock:
+            if _snapshot_cache is None:
+                _snapshot_cache = SnapshotCache()
+    return _snapshot_cache
+
+
+def invalidate_snapshots(sender, documents, **kwargs):
+    """documents_inserted receiver: new data makes cached snapshots stale"""
+    if documents:
+        try:
+            get_snapshot_cache().invalidate()
+        except Exception:
+            # e.g. the shared cache backend is down; the insert already succeeded
+            logger.exception('Failed to invalidate cached snapshots')
@@ -0,0 +1,184 @@
+"""Live updates from a MongoDB change stream
+
+One ``db.watch()`` cursor observes inserts into every source collection, no
+matter which process wrote them. Events are coalesced into per-source
+micro-batches of ``batch_interval`` seconds and each batch is published
+once: a single channel layer message and one snapshot cache invalidation.
+
+Change streams need a replica set (Atlas always is) and do not report
+writes to time-series collections.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from pymongo.errors import PyMongoError
+
+from .broadcast import broadcast_batch
+from .cache import get_snapshot_cache
+from .conf import app_setting
+from .db_utils import get_db, retry_in_background
+from . import hottier, windows
+from .models_advanced import MODELS
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeStreamFanout:
+    """Watches the source collections and publishes coalesced inserts
+
+    ``run()`` blocks; ``start()`` runs it in a background thread. After a
+    transient error the stream is reopened from the last resume token, so
+    no events are lost.
+    """
+
+    RETRY_SECONDS = 5
+
+    def __init__(self, batch_interval=None, max_batch=None):
+        self.batch_interval = batch_interval or app_setting('CHANGE_STREAM', 'batch_interval', 0.1)
+        self.max_batch = max_batch or app_setting('CHANGE_STREAM', 'max_batch', 1000)
+        self.events = 0
+        self.batches = 0
+        self.errors = 0
+        self._models = {model.collection_name: model for model in MODELS}
+        self._resume_token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def pipeline(self):
+        return [
+            {'$match': {
+                'operationType': 'insert',
+                'ns.coll': {'$in': list(self._models)},
+            }},
+            # The event _id is the resume token and must be kept
+            {'$project': {'ns.coll': 1, 'fullDocument': 1}},
+        ]
+
+    def start(self):
+        """Watch from a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run, name='change-stream-fanout', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self._watch()
+            except PyMongoError:
+                self.errors += 1
+                logger.exception(
+                    'Change stream failed; reopening in %ds', self.RETRY_SECONDS
+                )
+                self._stop.wait(self.RETRY_SECONDS)
+
+    def publish(self, batch):
+        """Send one micro-batch (model -> documents) to every listener"""
+        hottier.feed_batch(batch)
+        windows.feed_batch(batch)
+        broadcast_batch(batch)
+        get_snapshot_cache().invalidate()
+        self.batches += 1
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'events': self.events,
+            'batches': self.batches,
+            'errors': self.errors,
+            'batch_interval': self.batch_interval,
+        }
+
+    def _watch(self):
+        with get_db().watch(
+            self.pipeline(),
+            resume_after=self._resume_token,
+            max_await_time_ms=int(self.batch_interval * 1000),
+            batch_size=self.max_batch,
+        ) as stream:
+            if self._resume_token is None:
+                # Read after the stream opened, so no insert falls in between;
+                # events are fed meanwhile and kept by the warm-up
+                retry_in_background(hottier.warm_up, 'hot-tier-warm-up')
+                retry_in_background(windows.warm_up, 'analytics-windows-warm-up')
+            batch = defaultdict(list)
+            pending = 0
+            first_seen = None
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    model = self._models[change['ns']['coll']]
+                    batch[model].append(change['fullDocument'])
+                    pending += 1
+                    self.events += 1
+                    if first_seen is None:
+                        first_seen = time.monotonic()
+                # try_next() returns None once the server has no more events
+                # within max_await_time_ms, so a batch waits at most one interval
+                if pending and (
+                    change is None
+                    or pending >= self.max_batch
+                    or time.monotonic() - first_seen >= self.batch_interval
+                ):
+                    self._publish_safely(batch)
+                    batch = defaultdict(list)
+                    pending = 0
+                    first_seen = None
+                if not pending:
+                    # Only resume past events that have been published
+                    self._resume_token = stream.resume_token
+
+    def _publish_safely(self, batch):
+        try:
+            self.publish(batch)
+        except Exception:
+            # A failed publish must not kill the watcher
+            logger.exception('Failed to publish change stream batch')
+
+
+_fanout = None
+_fanout_lock = threading.Lock()
+
+
+def get_fanout():
+    """Process-wide ChangeStreamFanout configured from settings.CHANGE_STREAM"""
+    global _fanout
+    if _fanout is None:
+        with _fanout_lock:
+            if _fanout is None:
+                _fanout = ChangeStreamFanout()
+    return _fanout
+
+
+def unsupported_reason():
+    """Why change streams cannot see the inserts, or None"""
+    from django.conf import settings
+    if settings.MONGODB_SETTINGS.get('timeseries'):
+        return (
+            'Change streams do not report writes to time-series collections; '
+            'disable MONGODB_TIMESERIES or CHANGE_STREAM_ENABLED'
+        )
+    return None
+
+
+def ensure_started():
+    """Start this process's watcher if change streams drive live updates"""
+    if not app_setting('CHANGE_STREAM', 'enabled', False):
+        return
+    if not app_setting('CHANGE_STREAM', 'autostart', True):
+        return
+    if unsupported_reason() is not None:
+        # Logged once at startup (apps.py)
+        return
+    get_fanout().start()
@@ -0,0 +1,94 @@
+"""Negotiated response compression
+
+``CompressionMiddleware`` behaves like Django's GZipMiddleware but answers
+with Brotli when the client accepts it and the optional ``brotli`` package
+is installed. Snapshot responses carry an ETag, and many dashboards poll
+the same one, so their compressed bodies are kept per ETag and encoding
+and compressed only once.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from .conf import app_setting
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+
+MIN_BYTES = 200
+# e.g. gzipped exports, which would not shrink further
+ALREADY_COMPRESSED = ('application/gzip', 'application/zip', 'image/')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli or gzip, by Accept-Encoding, for non-streaming responses;
+    streaming responses are left to GZipMiddleware's gzip"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # (path, ETag, encoding) -> compressed body, least recently used first
+        self._compressed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(ALREADY_COMPRESSED):
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return super().process_response(request, response)
+        if len(response.content) < MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_brotli.search(accept):
+            encoding = 'br'
+        elif re_accepts_gzip.search(accept):
+            encoding = 'gzip'
+        else:
+            return response
+
+        etag = response.get('ETag')
+        key = (request.path, etag, encoding)
+        content = self._cached(key) if etag else None
+        if content is None:
+            content = self._compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            if etag:
+                self._store(key, content)
+
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        # Compressed bytes differ from the identity representation's
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress(self, content, encoding):
+        if encoding == 'br':
+            quality = app_setting('COMPRESSION', 'brotli_quality', 5)
+            return brotli.compress(content, quality=quality)
+        return gzip.compress(content, compresslevel=app_setting('COMPRESSION', 'gzip_level', 6))
+
+    def _cached(self, key):
+        with self._lock:
+            content = self._compressed.get(key)
+            if content is not None:
+                self._compressed.move_to_end(key)
+            return content
+
+    def _store(self, key, content):
+        with self._lock:
+            self._compressed[key] = content
+            while len(self._compressed) > app_setting('COMPRESSION', 'cache_entries', 32):
+                self._compressed.popitem(last=False)
@@ -0,0 +1,74 @@
+"""Conditional GET (ETag / If-None-Match) for the snapshot endpoints
+
+Snapshots are cached already JSON-encoded, together with a content-hash
+ETag, so a poll with a matching ``If-None-Match`` is answered 304 without
+any query or serialization while the snapshot is cached. Once it has
+expired, the newest ``_id`` of each source the snapshot is built from is
+probed first (one indexed lookup per source): if nothing was inserted
+since the previous build, its body and ETag are reused instead of running
+the queries again.
+"""
+import hashlib
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .cache import get_snapshot_cache
+from .jsonutils import dumps
+from .querypool import map_timed
+
+# Snapshot key -> last entry built by this process, for snapshots with models
+_last_built = {}
+_last_built_lock = threading.Lock()
+
+
+def reset_last_built():
+    """Forget every previous build, so the next expired snapshot is rebuilt"""
+    with _last_built_lock:
+        _last_built.clear()
+
+
+def etag_for(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def newest_ids(models):
+    """Newest _id per model, as a comparable tuple"""
+    return tuple(str(newest) for _, newest, _ in map_timed(lambda model: model.newest_id(), models))
+
+
+def get_snapshot(key, build, models=None):
+    """Cached ``{'etag', 'body'}`` snapshot for ``key``
+
+    ``build()`` returns the data to encode. ``models`` lists the sources it
+    is derived from; without them (e.g. time windows, which change as time
+    passes) an expired snapshot is always rebuilt. Builds with ``models``
+    are kept for the life of the process, so their keys must come from a
+    fixed set.
+    """
+    def build_entry():
+        if not models:
+            body = dumps(build())
+            return {'marks': None, 'etag': etag_for(body), 'body': body}
+        marks = newest_ids(models)
+        previous = _last_built.get(key)
+        if previous is not None and previous['marks'] == marks:
+            # Nothing new since the last build
+            return previous
+        body = dumps(build())
+        entry = {'marks': marks, 'etag': etag_for(body), 'body': body}
+        with _last_built_lock:
+            _last_built[key] = entry
+        return entry
+
+    return get_snapshot_cache().get_or_build(key, build_entry)
+
+
+def snapshot_response(request, entry):
+    """200 with the snapshot body, or 304 when If-None-Match matches"""
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    # Cache, but revalidate on every poll
+    response['Cache-Control'] = 'no-cache'
+    return get_conditional_response(request, etag=entry['etag'], response=response)
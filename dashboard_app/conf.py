@@ -0,0 +1,18 @@
+"""Grouped app settings, e.g. ``settings.HOT_TIER``, and worker setup"""
+import django
+from django.apps import apps
+from django.conf import settings
+
+
+def app_setting(group, key, default):
+    """``settings.<group>[key]``, or ``default`` when either is not set"""
+    return getattr(settings, group, {}).get(key, default)
+
+
+def setup_worker():
+    """Configure Django in a worker process if it isn't yet
+
+    Spawned (not forked) workers start without Django configured.
+    """
+    if not apps.ready:
+        django.setup()
@@ -0,0 +1,36 @@
+import asyncio
+import zlib
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .broadcast import DASHBOARD_GROUP, bind_event_loop, feed_is_complete
+from .changestream import ensure_started
+from .jsonutils import dumps
+
+class DashboardConsumer(AsyncJsonWebsocketConsumer):
+    """Streams newly inserted documents to a connected dashboard"""
+    
+    async def connect(self):
+        bind_event_loop(asyncio.get_running_loop())
+        ensure_started()
+        await self.channel_layer.group_add(DASHBOARD_GROUP, self.channel_name)
+        await self.accept()
+        # Clients keep polling unless every insert reaches them over the socket
+        await self.send_json({'type': 'hello', 'complete': feed_is_complete()})
+    
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(DASHBOARD_GROUP, self.channel_name)
+    
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content).decode()
+    
+    async def dashboard_batch(self, event):
+        # The frame is already JSON-encoded once for every client
+        frame = event['frame']
+        if event['compressed']:
+            frame = zlib.decompress(frame)
+        await self.send(text_data=frame.decode())
+    
+    # Alert frames are pre-encoded the same way
+    dashboard_alerts = dashboard_batch
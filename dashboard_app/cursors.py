@@ -0,0 +1,30 @@
+"""High-water marks used by the incremental (delta) API
+
+A cursor maps each source to the ObjectId of the newest document the
+client has seen. On the wire it is ``source:hex`` pairs joined by commas,
+e.g. ``sensors:65f0c1...,stocks:65f0c2...``.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+
+def high_water_mark(documents):
+    """Hex ObjectId of the newest document, or None for an empty list"""
+    if not documents:
+        return None
+    return str(max(doc['_id'] for doc in documents))
+
+def parse_cursor(value, sources):
+    """Parse a ``since`` parameter into {source: ObjectId}
+
+    Raises ValueError for unknown sources or malformed ObjectIds.
+    """
+    cursor = {}
+    for part in filter(None, value.split(',')):
+        source, sep, oid = part.partition(':')
+        if not sep or source not in sources:
+            raise ValueError(f'Unknown cursor source: {source!r}')
+        try:
+            cursor[source] = ObjectId(oid)
+        except (InvalidId, TypeError):
+            raise ValueError(f'Invalid cursor position for {source!r}')
+    return cursor
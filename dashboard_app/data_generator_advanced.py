@@ -2,11 +2,64 @@ import time
 import random
 import string
 from datetime import datetime
+from .ingest import BufferedWriter
 from .models_advanced import (
     SensorData, SystemMetrics, StockData, WeatherData,
     EcommerceTransaction, SocialMediaMetrics, TrafficData
 )
 
+# Source definitions
+SENSOR_IDS = ['SENSOR_001', 'SENSOR_002', 'SENSOR_003', 'SENSOR_004']
+
+STOCKS = {
+    'AAPL': 150.00,
+    'GOOGL': 2800.00,
+    'MSFT': 300.00,
+    'TSLA': 700.00,
+    'AMZN': 3200.00,
+    'META': 280.00
+}
+
+CITIES = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
+WEATHER_CONDITIONS = ['Sunny', 'Cloudy', 'Rainy', 'Partly Cloudy', 'Stormy']
+
+PRODUCT_CATEGORIES = ['Electronics', 'Clothing', 'Books', 'Home & Kitchen', 'Sports', 'Toys']
+PRODUCTS = {
+    'Electronics': ['Laptop', 'Smartphone', 'Tablet', 'Headphones', 'Smart Watch'],
+    'Clothing': ['T-Shirt', 'Jeans', 'Jacket', 'Shoes', 'Hat'],
+    'Books': ['Fiction Novel', 'Programming Book', 'Biography', 'Cook Book', 'Self-Help'],
+    'Home & Kitchen': ['Blender', 'Coffee Maker', 'Vacuum Cleaner', 'Microwave', 'Toaster'],
+    'Sports': ['Basketball', 'Tennis Racket', 'Yoga Mat', 'Dumbbells', 'Running Shoes'],
+    'Toys': ['Action Figure', 'Board Game', 'Puzzle', 'RC Car', 'Doll']
+}
+
+CUSTOMER_LOCATIONS = ['California', 'Texas', 'New York', 'Florida', 'Illinois', 'Washington']
+
+SOCIAL_PLATFORMS = ['Twitter', 'Facebook', 'Instagram', 'LinkedIn', 'TikTok']
+
+TRAFFIC_LOCATIONS = [
+    'Highway 101 North',
+    'Downtown Main St',
+    'Airport Freeway',
+    'Broadway Ave',
+    'Fifth Avenue'
+]
+
+def sensor_ids(count=len(SENSOR_IDS)):
+    """Sensor IDs for ``count`` sensors"""
+    return [f'SENSOR_{i:03d}' for i in range(1, count + 1)]
+
+def stock_prices(count=len(STOCKS)):
+    """Starting prices for ``count`` symbols, the real ones first"""
+    prices = dict(list(STOCKS.items())[:count])
+    for i in range(len(prices) + 1, count + 1):
+        prices[f'SYM{i:04d}'] = round(random.uniform(10.0, 1000.0), 2)
+    return prices
+
+def city_names(count=len(CITIES)):
+    """Names for ``count`` cities, the real ones first"""
+    return CITIES[:count] + [f'City {i}' for i in range(len(CITIES) + 1, count + 1)]
+
 def generate_order_id():
     """Generate random order ID"""
     return 'ORD' + ''.join(random.choices(string.digits, k=8))
@@ -15,46 +68,99 @@ def generate_post_id():
     """Generate random post ID"""
     return 'POST' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
-def run_advanced_data_simulation():
-    """Generate simulated data for all data sources"""
-    
-    # Configuration
-    sensor_ids = ['SENSOR_001', 'SENSOR_002', 'SENSOR_003', 'SENSOR_004']
-    
-    stocks = {
-        'AAPL': 150.00,
-        'GOOGL': 2800.00,
-        'MSFT': 300.00,
-        'TSLA': 700.00,
-        'AMZN': 3200.00,
-        'META': 280.00
+def congestion_level(avg_speed):
+    if avg_speed < 30:
+        return 'High'
+    elif avg_speed < 60:
+        return 'Medium'
+    return 'Low'
+
+# Record builders: each returns the create() fields of one document
+
+def make_sensor_reading(sensor_id):
+    temperature = round(random.uniform(18.0, 32.0), 2)
+    return {
+        'sensor_id': sensor_id,
+        'temperature': temperature,
+        'humidity': round(random.uniform(30.0, 90.0), 2),
+        'pressure': round(random.uniform(980.0, 1025.0), 2),
+        'status': 'normal' if temperature < 30 else 'warning',
+    }
+
+def make_system_metrics():
+    return {
+        'cpu_usage': round(random.uniform(15.0, 85.0), 2),
+        'memory_usage': round(random.uniform(40.0, 90.0), 2),
+        'disk_usage': round(random.uniform(50.0, 85.0), 2),
+        'network_in': round(random.uniform(1.0, 100.0), 2),
+        'network_out': round(random.uniform(1.0, 100.0), 2),
     }
-    
-    cities = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
-    weather_conditions = ['Sunny', 'Cloudy', 'Rainy', 'Partly Cloudy', 'Stormy']
-    
-    product_categories = ['Electronics', 'Clothing', 'Books', 'Home & Kitchen', 'Sports', 'Toys']
-    products = {
-        'Electronics': ['Laptop', 'Smartphone', 'Tablet', 'Headphones', 'Smart Watch'],
-        'Clothing': ['T-Shirt', 'Jeans', 'Jacket', 'Shoes', 'Hat'],
-        'Books': ['Fiction Novel', 'Programming Book', 'Biography', 'Cook Book', 'Self-Help'],
-        'Home & Kitchen': ['Blender', 'Coffee Maker', 'Vacuum Cleaner', 'Microwave', 'Toaster'],
-        'Sports': ['Basketball', 'Tennis Racket', 'Yoga Mat', 'Dumbbells', 'Running Shoes'],
-        'Toys': ['Action Figure', 'Board Game', 'Puzzle', 'RC Car', 'Doll']
+
+def make_stock_quote(symbol, prices):
+    """Random-walk ``prices[symbol]`` and return the new quote"""
+    base_price = prices[symbol]
+    change = random.uniform(-10, 10)
+    new_price = round(base_price + change, 2)
+    prices[symbol] = new_price
+    return {
+        'symbol': symbol,
+        'price': new_price,
+        'volume': random.randint(500000, 2000000),
+        'change_percent': round((change / base_price) * 100, 2),
+        'market_cap': round(new_price * random.randint(100, 500), 2),
+    }
+
+def make_weather_report(city):
+    return {
+        'city': city,
+        'temperature': round(random.uniform(10.0, 35.0), 1),
+        'humidity': round(random.uniform(40.0, 95.0), 1),
+        'wind_speed': round(random.uniform(5.0, 30.0), 1),
+        'condition': random.choice(WEATHER_CONDITIONS),
+        'pressure': round(random.uniform(1000.0, 1020.0), 1),
+    }
+
+def make_transaction():
+    category = random.choice(PRODUCT_CATEGORIES)
+    return {
+        'order_id': generate_order_id(),
+        'product_name': random.choice(PRODUCTS[category]),
+        'category': category,
+        'amount': round(random.uniform(10.0, 500.0), 2),
+        'quantity': random.randint(1, 5),
+        'customer_location': random.choice(CUSTOMER_LOCATIONS),
     }
-    
-    customer_locations = ['California', 'Texas', 'New York', 'Florida', 'Illinois', 'Washington']
-    
-    social_platforms = ['Twitter', 'Facebook', 'Instagram', 'LinkedIn', 'TikTok']
-    
-    traffic_locations = [
-        'Highway 101 North',
-        'Downtown Main St',
-        'Airport Freeway',
-        'Broadway Ave',
-        'Fifth Avenue'
-    ]
-    
+
+def make_social_post(platform):
+    likes = random.randint(100, 10000)
+    shares = random.randint(10, 2000)
+    comments = random.randint(5, 500)
+    total_engagement = likes + shares + comments
+    return {
+        'platform': platform,
+        'post_id': generate_post_id(),
+        'likes': likes,
+        'shares': shares,
+        'comments': comments,
+        'engagement_rate': round((total_engagement / 10000) * 100, 2),
+    }
+
+def make_traffic_reading(location):
+    avg_speed = round(random.uniform(20.0, 100.0), 1)
+    return {
+        'location': location,
+        'vehicle_count': random.randint(50, 500),
+        'avg_speed': avg_speed,
+        'congestion_level': congestion_level(avg_speed),
+    }
+
+def run_advanced_data_simulation(quiet=False):
+    """Generate simulated data for all data sources"""
+    log = (lambda *args, **kwargs: None) if quiet else print
+
+    # Configuration
+    stocks = dict(STOCKS)
+
     print("=" * 80)
     print("🚀 Starting ADVANCED Real-Time Data Simulation with 7 Data Sources")
     print("=" * 80)
@@ -67,153 +173,78 @@ def run_advanced_data_simulation():
     print("   6. Social Media Analytics (5 platforms)")
     print("   7. Traffic Monitoring (5 locations)")
     print("=" * 80)
-    
+
     iteration = 0
-    
+    # Documents are buffered per collection and written with insert_many
+    writer = BufferedWriter()
+
     while True:
         iteration += 1
-        print(f"\n📡 Iteration {iteration} - {datetime.now().strftime('%H:%M:%S')}")
-        print("-" * 80)
-        
+        log(f"\n📡 Iteration {iteration} - {datetime.now().strftime('%H:%M:%S')}")
+        log("-" * 80)
+
         # 1. Generate IoT Sensor Data
-        print("📡 1. Generating IoT Sensor Data...")
-        for sensor_id in sensor_ids:
-            temperature = round(random.uniform(18.0, 32.0), 2)
-            humidity = round(random.uniform(30.0, 90.0), 2)
-            pressure = round(random.uniform(980.0, 1025.0), 2)
-            status = 'normal' if temperature < 30 else 'warning'
-            
-            SensorData.create(
-                sensor_id=sensor_id,
-                temperature=temperature,
-                humidity=humidity,
-                pressure=pressure,
-                status=status
-            )
-            print(f"   ✅ {sensor_id}: {temperature}°C, {humidity}%, {pressure}hPa [{status}]")
-        
+        log("📡 1. Generating IoT Sensor Data...")
+        for sensor_id in SENSOR_IDS:
+            reading = make_sensor_reading(sensor_id)
+            writer.add(SensorData, **reading)
+            log(f"   ✅ {sensor_id}: {reading['temperature']}°C, {reading['humidity']}%, "
+                f"{reading['pressure']}hPa [{reading['status']}]")
+
         # 2. Generate Server Metrics
-        print("\n💻 2. Generating Server Metrics...")
-        cpu = round(random.uniform(15.0, 85.0), 2)
-        memory = round(random.uniform(40.0, 90.0), 2)
-        disk = round(random.uniform(50.0, 85.0), 2)
-        net_in = round(random.uniform(1.0, 100.0), 2)
-        net_out = round(random.uniform(1.0, 100.0), 2)
-        
-        SystemMetrics.create(
-            cpu_usage=cpu,
-            memory_usage=memory,
-            disk_usage=disk,
-            network_in=net_in,
-            network_out=net_out
-        )
-        print(f"   ✅ CPU: {cpu}% | Memory: {memory}% | Disk: {disk}%")
-        print(f"   ✅ Network: ↓{net_in} MB/s | ↑{net_out} MB/s")
-        
+        log("\n💻 2. Generating Server Metrics...")
+        metrics = make_system_metrics()
+        writer.add(SystemMetrics, **metrics)
+        log(f"   ✅ CPU: {metrics['cpu_usage']}% | Memory: {metrics['memory_usage']}% | "
+            f"Disk: {metrics['disk_usage']}%")
+        log(f"   ✅ Network: ↓{metrics['network_in']} MB/s | ↑{metrics['network_out']} MB/s")
+
         # 3. Generate Stock Market Data
-        print("\n📈 3. Generating Stock Market Data...")
-        for symbol, base_price in stocks.items():
-            change = random.uniform(-10, 10)
-            new_price = round(base_price + change, 2)
-            stocks[symbol] = new_price
-            
-            volume = random.randint(500000, 2000000)
-            change_percent = round((change / base_price) * 100, 2)
-            market_cap = round(new_price * random.randint(100, 500), 2)
-            
-            StockData.create(
-                symbol=symbol,
-                price=new_price,
-                volume=volume,
-                change_percent=change_percent,
-                market_cap=market_cap
-            )
-            
+        log("\n📈 3. Generating Stock Market Data...")
+        for symbol in stocks:
+            quote = make_stock_quote(symbol, stocks)
+            writer.add(StockData, **quote)
+
+            change_percent = quote['change_percent']
             arrow = "↑" if change_percent >= 0 else "↓"
             color = "+" if change_percent >= 0 else ""
-            print(f"   ✅ {symbol}: ${new_price} {arrow} {color}{change_percent}%")
-        
+            log(f"   ✅ {symbol}: ${quote['price']} {arrow} {color}{change_percent}%")
+
         # 4. Generate Weather Data
-        print("\n🌤️  4. Generating Weather Data...")
-        for city in cities:
-            temp = round(random.uniform(10.0, 35.0), 1)
-            humidity = round(random.uniform(40.0, 95.0), 1)
-            wind = round(random.uniform(5.0, 30.0), 1)
-            condition = random.choice(weather_conditions)
-            pressure = round(random.uniform(1000.0, 1020.0), 1)
-            
-            WeatherData.create(
-                city=city,
-                temperature=temp,
-                humidity=humidity,
-                wind_speed=wind,
-                condition=condition,
-                pressure=pressure
-            )
-            print(f"   ✅ {city}: {temp}°C, {condition}, Wind: {wind} km/h")
-        
+        log("\n🌤️  4. Generating Weather Data...")
+        for city in CITIES:
+            report = make_weather_report(city)
+            writer.add(WeatherData, **report)
+            log(f"   ✅ {city}: {report['temperature']}°C, {report['condition']}, "
+                f"Wind: {report['wind_speed']} km/h")
+
         # 5. Generate E-commerce Transactions (2-4 per iteration)
-        print("\n🛒 5. Generating E-commerce Transactions...")
+        log("\n🛒 5. Generating E-commerce Transactions...")
         num_transactions = random.randint(2, 4)
         for _ in range(num_transactions):
-            category = random.choice(product_categories)
-            product = random.choice(products[category])
-            amount = round(random.uniform(10.0, 500.0), 2)
-            quantity = random.randint(1, 5)
-            location = random.choice(customer_locations)
-            order_id = generate_order_id()
-            
-            EcommerceTransaction.create(
-                order_id=order_id,
-                product_name=product,
-                category=category,
-                amount=amount,
-                quantity=quantity,
-                customer_location=location
-            )
-            print(f"   ✅ {order_id}: {product} ({category}) - ${amount} x {quantity} [{location}]")
-        
+            order = make_transaction()
+            writer.add(EcommerceTransaction, **order)
+            log(f"   ✅ {order['order_id']}: {order['product_name']} ({order['category']}) - "
+                f"${order['amount']} x {order['quantity']} [{order['customer_location']}]")
+
         # 6. Generate Social Media Metrics
-        print("\n📱 6. Generating Social Media Metrics...")
-        for platform in social_platforms:
-            likes = random.randint(100, 10000)
-            shares = random.randint(10, 2000)
-            comments = random.randint(5, 500)
-            total_engagement = likes + shares + comments
-            engagement_rate = round((total_engagement / 10000) * 100, 2)
-            post_id = generate_post_id()
-            
-            SocialMediaMetrics.create(
-                platform=platform,
-                post_id=post_id,
-                likes=likes,
-                shares=shares,
-                comments=comments,
-                engagement_rate=engagement_rate
-            )
-            print(f"   ✅ {platform} ({post_id}): {likes} ❤️ | {shares} 🔄 | {comments} 💬")
-        
+        log("\n📱 6. Generating Social Media Metrics...")
+        for platform in SOCIAL_PLATFORMS:
+            post = make_social_post(platform)
+            writer.add(SocialMediaMetrics, **post)
+            log(f"   ✅ {platform} ({post['post_id']}): {post['likes']} ❤️ | "
+                f"{post['shares']} 🔄 | {post['comments']} 💬")
+
         # 7. Generate Traffic Data
-        print("\n🚗 7. Generating Traffic Data...")
-        for location in traffic_locations:
-            vehicle_count = random.randint(50, 500)
-            avg_speed = round(random.uniform(20.0, 100.0), 1)
-            
-            if avg_speed < 30:
-                congestion = 'High'
-            elif avg_speed < 60:
-                congestion = 'Medium'
-            else:
-                congestion = 'Low'
-            
-            TrafficData.create(
-                location=location,
-                vehicle_count=vehicle_count,
-                avg_speed=avg_speed,
-                congestion_level=congestion
-            )
-            print(f"   ✅ {location}: {vehicle_count} vehicles, {avg_speed} km/h [{congestion}]")
-        
-        print("-" * 80)
-        print(f"⏱️  Waiting 5 seconds before next iteration...\n")
+        log("\n🚗 7. Generating Traffic Data...")
+        for location in TRAFFIC_LOCATIONS:
+            reading = make_traffic_reading(location)
+            writer.add(TrafficData, **reading)
+            log(f"   ✅ {location}: {reading['vehicle_count']} vehicles, "
+                f"{reading['avg_speed']} km/h [{reading['congestion_level']}]")
+
+        written = writer.flush()
+        log("-" * 80)
+        log(f"💾 Flushed {written} documents with bulk inserts")
+        log(f"⏱️  Waiting 5 seconds before next iteration...\n")
         time.sleep(5)
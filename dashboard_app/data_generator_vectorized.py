@@ -0,0 +1,183 @@
+"""Vectorized (NumPy) data generation for bulk loads and backfills
+
+Produces a whole batch per source as column arrays using the same value
+distributions as ``data_generator_advanced``, then turns the columns into
+documents ready for ``insert_many``. Output is reproducible for a given
+seed (``numpy.random.default_rng``).
+"""
+import string
+from datetime import datetime
+
+import numpy as np
+
+from .data_generator_advanced import (
+    CUSTOMER_LOCATIONS, PRODUCT_CATEGORIES, PRODUCTS, SOCIAL_PLATFORMS,
+    STOCKS, TRAFFIC_LOCATIONS, WEATHER_CONDITIONS, city_names, sensor_ids
+)
+
+POST_ID_ALPHABET = np.array(list(string.ascii_uppercase + string.digits))
+
+def _uniform(rng, low, high, n, decimals):
+    return np.round(rng.uniform(low, high, n), decimals)
+
+def _keys(keys, n):
+    """Assign keys round-robin so every key gets an even share of rows"""
+    keys = np.asarray(keys)
+    return keys[np.arange(n) % len(keys)]
+
+def _post_ids(rng, n):
+    digits = rng.integers(0, len(POST_ID_ALPHABET), size=(n, 6))
+    chars = POST_ID_ALPHABET[digits]
+    ids = np.full(n, 'POST')
+    for column in chars.T:
+        ids = np.char.add(ids, column)
+    return ids
+
+def sensor_columns(rng, n, keys):
+    temperature = _uniform(rng, 18.0, 32.0, n, 2)
+    return {
+        'sensor_id': _keys(keys, n),
+        'temperature': temperature,
+        'humidity': _uniform(rng, 30.0, 90.0, n, 2),
+        'pressure': _uniform(rng, 980.0, 1025.0, n, 2),
+        'status': np.where(temperature < 30, 'normal', 'warning'),
+    }
+
+def system_metrics_columns(rng, n, keys=None):
+    return {
+        'cpu_usage': _uniform(rng, 15.0, 85.0, n, 2),
+        'memory_usage': _uniform(rng, 40.0, 90.0, n, 2),
+        'disk_usage': _uniform(rng, 50.0, 85.0, n, 2),
+        'network_in': _uniform(rng, 1.0, 100.0, n, 2),
+        'network_out': _uniform(rng, 1.0, 100.0, n, 2),
+    }
+
+def stock_columns(rng, n, keys, prices=None):
+    """Per-symbol random walk; ``prices`` (symbol -> last price) is updated in place"""
+    keys = list(keys)
+    if prices is None:
+        prices = {}
+    for symbol in keys:
+        if symbol not in prices:
+            prices[symbol] = STOCKS.get(symbol) or round(float(rng.uniform(10.0, 1000.0)), 2)
+
+    symbol_index = np.arange(n) % len(keys)
+    change = rng.uniform(-10, 10, n)
+    price = np.empty(n)
+    previous = np.empty(n)
+    for i, symbol in enumerate(keys):
+        rows = symbol_index == i
+        walk = prices[symbol] + np.cumsum(change[rows])
+        price[rows] = walk
+        previous[rows] = np.concatenate(([prices[symbol]], walk[:-1]))
+        if rows.any():
+            prices[symbol] = float(np.round(walk[-1], 2))
+    price = np.round(price, 2)
+    return {
+        'symbol': np.asarray(keys)[symbol_index],
+        'price': price,
+        'volume': rng.integers(500000, 2000000, n, endpoint=True),
+        'change_percent': np.round(change / previous * 100, 2),
+        'market_cap': np.round(price * rng.integers(100, 500, n, endpoint=True), 2),
+    }
+
+def weather_columns(rng, n, keys):
+    return {
+        'city': _keys(keys, n),
+        'temperature': _uniform(rng, 10.0, 35.0, n, 1),
+        'humidity': _uniform(rng, 40.0, 95.0, n, 1),
+        'wind_speed': _uniform(rng, 5.0, 30.0, n, 1),
+        'condition': rng.choice(WEATHER_CONDITIONS, n),
+        'pressure': _uniform(rng, 1000.0, 1020.0, n, 1),
+    }
+
+def ecommerce_columns(rng, n, keys=None):
+    categories = np.asarray(PRODUCT_CATEGORIES)
+    products = np.asarray([PRODUCTS[category] for category in PRODUCT_CATEGORIES])
+    category_index = rng.integers(0, len(categories), n)
+    product_index = rng.integers(0, products.shape[1], n)
+    order_numbers = rng.integers(0, 10 ** 8, n).astype(str)
+    return {
+        'order_id': np.char.add('ORD', np.char.zfill(order_numbers, 8)),
+        'product_name': products[category_index, product_index],
+        'category': categories[category_index],
+        'amount': _uniform(rng, 10.0, 500.0, n, 2),
+        'quantity': rng.integers(1, 5, n, endpoint=True),
+        'customer_location': rng.choice(CUSTOMER_LOCATIONS, n),
+    }
+
+def social_media_columns(rng, n, keys):
+    likes = rng.integers(100, 10000, n, endpoint=True)
+    shares = rng.integers(10, 2000, n, endpoint=True)
+    comments = rng.integers(5, 500, n, endpoint=True)
+    return {
+        'platform': _keys(keys, n),
+        'post_id': _post_ids(rng, n),
+        'likes': likes,
+        'shares': shares,
+        'comments': comments,
+        'engagement_rate': np.round((likes + shares + comments) / 10000 * 100, 2),
+    }
+
+def traffic_columns(rng, n, keys):
+    avg_speed = _uniform(rng, 20.0, 100.0, n, 1)
+    return {
+        'location': _keys(keys, n),
+        'vehicle_count': rng.integers(50, 500, n, endpoint=True),
+        'avg_speed': avg_speed,
+        'congestion_level': np.select(
+            [avg_speed < 30, avg_speed < 60], ['High', 'Medium'], default='Low'
+        ),
+    }
+
+# Source -> column generator
+COLUMN_GENERATORS = {
+    'sensors': sensor_columns,
+    'system_metrics': system_metrics_columns,
+    'stocks': stock_columns,
+    'weather': weather_columns,
+    'ecommerce': ecommerce_columns,
+    'social_media': social_media_columns,
+    'traffic': traffic_columns,
+}
+
+def default_keys(source, sensors=4, symbols=6, cities=5):
+    """Key values (sensor IDs, symbols, ...) for a source at a given cardinality"""
+    if source == 'sensors':
+        return sensor_ids(sensors)
+    if source == 'stocks':
+        return list(STOCKS)[:symbols] + [f'SYM{i:04d}' for i in range(len(STOCKS) + 1, symbols + 1)]
+    if source == 'weather':
+        return city_names(cities)
+    if source == 'social_media':
+        return list(SOCIAL_PLATFORMS)
+    if source == 'traffic':
+        return list(TRAFFIC_LOCATIONS)
+    return None
+
+def generate_columns(source, n, rng, keys=None, timestamps=None, **state):
+    """Column arrays for ``n`` documents of ``source``
+
+    ``timestamps`` is an array of ``datetime64``; when omitted every row is
+    stamped with the current time. Extra keyword arguments (e.g. ``prices``
+    for stocks) carry state between consecutive batches.
+    """
+    if keys is None:
+        keys = default_keys(source)
+    columns = COLUMN_GENERATORS[source](rng, n, keys, **state)
+    if timestamps is None:
+        timestamps = np.full(n, np.datetime64(datetime.now(), 'ms'))
+    columns['timestamp'] = np.asarray(timestamps, dtype='datetime64[ms]')
+    return columns
+
+def columns_to_documents(columns):
+    """Turn column arrays into a list of documents with native Python values"""
+    names = list(columns)
+    # tolist() converts numpy scalars (and datetime64[ms]) to Python objects
+    values = [columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def generate_documents(source, n, seed=None, keys=None, timestamps=None, **state):
+    """Seeded batch of ``n`` documents for ``source``"""
+    rng = np.random.default_rng(seed)
+    return columns_to_documents(generate_columns(source, n, rng, keys, timestamps, **state))
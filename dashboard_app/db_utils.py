@@ -1,15 +1,138 @@
-from pymongo import MongoClient
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo import MongoClient, ReadPreference, WriteConcern
+from pymongo import monitoring
+
+from .metrics import command_listener, percentile
+
+logger = logging.getLogger(__name__)
 
 _client = None
 _db = None
+# PID that created _client; a forked worker must build its own client
+_pid = None
+_lock = threading.Lock()
+
+# Server error code of a duplicate _id or unique index value
+DUPLICATE_KEY = 11000
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+class PoolWaitMonitor(monitoring.ConnectionPoolListener):
+    """Records how long threads wait to check a connection out of the pool"""
+
+    def __init__(self, max_samples=1024):
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self._samples = deque(maxlen=max_samples)
+        self._started = threading.local()
+        self._lock = threading.Lock()
+
+    def connection_check_out_started(self, event):
+        self._started.at = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._started, 'at', None)
+        if started is None:
+            return
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._started.at = None
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self._samples.append(wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self._started.at = None
+        with self._lock:
+            self.failures += 1
+
+    def stats(self):
+        """Checkout counters and wait percentiles over the recent samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+            stats = {
+                'checkouts': self.checkouts,
+                'failures': self.failures,
+                'avg_wait_ms': self.total_wait_ms / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': self.max_wait_ms,
+            }
+        for name, q in (('p50_wait_ms', 0.5), ('p99_wait_ms', 0.99)):
+            stats[name] = percentile(samples, q)
+        return stats
+
+    # The remaining pool events are not needed
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+pool_monitor = PoolWaitMonitor()
+
+def _client_options(config):
+    """MongoClient keyword arguments from MONGODB_SETTINGS"""
+    options = {
+        'maxPoolSize': config.get('max_pool_size', 100),
+        'minPoolSize': config.get('min_pool_size', 0),
+        'maxIdleTimeMS': config.get('max_idle_time_ms'),
+        'connectTimeoutMS': config.get('connect_timeout_ms', 20000),
+        'serverSelectionTimeoutMS': config.get('server_selection_timeout_ms', 30000),
+        'socketTimeoutMS': config.get('socket_timeout_ms'),
+        'waitQueueTimeoutMS': config.get('wait_queue_timeout_ms'),
+        'event_listeners': [pool_monitor, command_listener],
+        # Connect on first use, i.e. after any pre-fork server has forked
+        'connect': False,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+def _reset_after_fork():
+    # The parent's sockets and monitor threads are not usable in the child
+    global _client, _db, _pid
+    _client = _db = _pid = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 def get_db():
-    """Lazy-load MongoDB connection"""
-    global _client, _db
-    if _db is None:
-        from django.conf import settings
-        _client = MongoClient(settings.MONGODB_SETTINGS['host'])
-        _db = _client[settings.MONGODB_SETTINGS['db_name']]
+    """Lazy-load MongoDB connection (one client per process)"""
+    global _client, _db, _pid
+    if _db is None or _pid != os.getpid():
+        with _lock:
+            if _db is None or _pid != os.getpid():
+                from django.conf import settings
+                config = settings.MONGODB_SETTINGS
+                _client = MongoClient(config['host'], **_client_options(config))
+                _db = _client[config['db_name']]
+                _pid = os.getpid()
     return _db
 
 def get_collection(name):
@@ -17,9 +140,39 @@ def get_collection(name):
     db = get_db()
     return db[name]
 
+def get_read_collection(name):
+    """Collection for dashboard reads, using the configured read preference"""
+    from django.conf import settings
+    preference = settings.MONGODB_SETTINGS.get('read_preference', 'primary')
+    return get_db().get_collection(name, read_preference=READ_PREFERENCES[preference])
+
+def get_write_collection(name):
+    """Collection for the ingest path, using the configured write concern"""
+    from django.conf import settings
+    concern = settings.MONGODB_SETTINGS.get('write_concern') or {}
+    return get_db().get_collection(name, write_concern=WriteConcern(**concern))
+
+def get_pool_stats():
+    """Connection pool checkout statistics for this process"""
+    return pool_monitor.stats()
+
+def retry_in_background(attempt, name, delay=1.0, max_delay=60.0):
+    """Call ``attempt()`` from a daemon thread until it returns True,
+    doubling the pause after each failure up to ``max_delay`` seconds"""
+    def run():
+        pause = delay
+        while not attempt():
+            logger.warning('%s failed; retrying in %gs', name, pause)
+            time.sleep(pause)
+            pause = min(pause * 2, max_delay)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
 # Collection getters
 def get_sensor_data_collection():
     return get_collection('sensor_data')
 
 def get_system_metrics_collection():
-    return get_collection('system_metrics')
\ No newline at end of file
+    return get_collection('system_metrics')
@@ -0,0 +1,42 @@
+"""Downsampling of time series for charts"""
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling
+    
+    ``points`` is a sequence of ``(x, y)`` pairs sorted by x. Returns at
+    most ``threshold`` of them, always keeping the first and last point and,
+    from every bucket in between, the one forming the largest triangle with
+    its neighbours, which preserves the visual shape of the series.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    
+    sampled = [points[0]]
+    # Bucket size for the points between the fixed first and last ones
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(points[j][0] for j in range(next_start, next_end)) / span
+        avg_y = sum(points[j][1] for j in range(next_start, next_end)) / span
+        
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a]
+        best_area = -1
+        best = start
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        a = best
+    
+    sampled.append(points[-1])
+    return sampled
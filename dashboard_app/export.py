@@ -0,0 +1,82 @@
+"""Streaming encoders for raw data exports
+
+Each encoder consumes a document iterator lazily and yields byte chunks of
+roughly ``CHUNK_BYTES``, so an export holds one cursor batch and one chunk
+in memory however many documents it covers. Timestamps are epoch
+milliseconds, as everywhere else in the API.
+"""
+import csv
+import io
+import zlib
+
+from asgiref.sync import sync_to_async
+
+from .jsonutils import dumps, epoch_ms
+
+CHUNK_BYTES = 64 * 1024
+
+def _rows(docs):
+    for doc in docs:
+        doc['timestamp'] = epoch_ms(doc['timestamp'])
+        yield doc
+
+def ndjson_chunks(docs):
+    """One JSON object per line"""
+    buffer = bytearray()
+    for doc in _rows(docs):
+        buffer += dumps(doc)
+        buffer += b'\n'
+        if len(buffer) >= CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+def csv_chunks(docs, fields):
+    """CSV with a header row of ``timestamp`` followed by ``fields``"""
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=('timestamp', *fields), extrasaction='ignore')
+    writer.writeheader()
+    for doc in _rows(docs):
+        writer.writerow(doc)
+        if text.tell() >= CHUNK_BYTES:
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode()
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+async def iterate_in_thread(chunks):
+    """Async iterator over the blocking ``chunks``, each step run in a worker thread
+
+    Under ASGI, StreamingHttpResponse collects a synchronous iterator into
+    a list before sending anything, so the export would be held in memory.
+    """
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=False)(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        # Release the MongoDB cursor when the client disconnects early
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=False)()
+
+# Format -> (content type, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
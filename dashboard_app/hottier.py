@@ -0,0 +1,288 @@
+"""Per-process in-memory hot tier of the newest documents
+
+Each source keeps its most recent documents in a fixed-size, column-wise
+ring buffer (numeric fields in ``array('d')``), plus a smaller ring per key
+(sensor, symbol, city...). ``get_latest`` and ``get_since`` answer from it
+without a MongoDB round trip whenever it provably holds every requested
+document, and fall back to MongoDB otherwise; MongoDB stays the system of
+record.
+
+The rings are fed with inserted documents in arrival order and are warmed
+up from MongoDB first. "Newest" is therefore arrival order, which matches
+timestamp order for live data as long as one feed sees every insert: the
+change stream watcher when change streams drive live updates, otherwise
+the documents_inserted signal of this process. The signal only covers the
+inserts made by this process, so without change streams the hot tier stays
+off unless ``HOT_TIER['single_process']`` declares this process the only
+writer; with several workers each would hold, and serve, a different
+subset in a different order.
+"""
+import logging
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+from .conf import app_setting
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+HOT_TIER_READS = Counter(
+    'dashboard_hot_tier_reads_total',
+    'get_latest/get_since calls answered by the hot tier (hit) or MongoDB (miss)',
+    ('source', 'result'),
+)
+
+
+class RingBuffer:
+    """Fixed-capacity columnar buffer, overwriting the oldest document
+
+    Numeric fields are stored in ``array('d')`` columns (None as NaN) and
+    the other fields, ``_id`` and ``timestamp`` in preallocated lists.
+    """
+
+    __slots__ = ('capacity', 'size', 'head', 'ids', 'timestamps', 'columns', 'integers')
+
+    def __init__(self, capacity, fields, numeric_fields):
+        self.capacity = capacity
+        self.size = 0
+        # Next slot to write
+        self.head = 0
+        self.ids = [None] * capacity
+        self.timestamps = [None] * capacity
+        self.columns = {
+            name: array('d', bytes(8 * capacity)) if name in numeric_fields else [None] * capacity
+            for name in fields
+        }
+        self.integers = frozenset(name for name in numeric_fields if fields[name] is int)
+
+    def append(self, doc):
+        """Store ``doc``; returns the _id it overwrote, or None"""
+        slot = self.head
+        evicted = self.ids[slot] if self.size == self.capacity else None
+        self.ids[slot] = doc.get('_id')
+        self.timestamps[slot] = doc.get('timestamp')
+        for name, column in self.columns.items():
+            value = doc.get(name)
+            if type(column) is array:
+                column[slot] = math.nan if value is None else value
+            else:
+                column[slot] = value
+        self.head = (slot + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return evicted
+
+    def document(self, slot):
+        """Rebuild the document stored in ``slot``"""
+        doc = {'_id': self.ids[slot]}
+        for name, column in self.columns.items():
+            value = column[slot]
+            if type(column) is array:
+                if value != value:
+                    value = None
+                elif name in self.integers:
+                    value = int(value)
+            doc[name] = value
+        doc['timestamp'] = self.timestamps[slot]
+        return doc
+
+    def slots(self):
+        """Occupied slots, newest first"""
+        for offset in range(1, self.size + 1):
+            yield (self.head - offset) % self.capacity
+
+    def newest(self, limit):
+        return [self.document(slot) for slot, _ in zip(self.slots(), range(limit))]
+
+
+class HotStore:
+    """Ring buffers of one model: all documents, and per key"""
+
+    def __init__(self, model, capacity, key_capacity, max_keys):
+        self.model = model
+        self.capacity = capacity
+        self.key_capacity = key_capacity
+        self.max_keys = max_keys
+        self.ready = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.ring = self._ring(self.capacity)
+        # Key -> RingBuffer, least recently written first
+        self.keys = OrderedDict()
+        # Every document with a larger _id is in the ring; None means all are
+        self.floor = None
+        # False once a key's ring has been dropped to stay within max_keys
+        self.keys_complete = True
+        # Warm-up documents that may be delivered again by the feed
+        self._warm_ids = frozenset()
+        self._appended = 0
+
+    def _ring(self, capacity):
+        return RingBuffer(capacity, self.model.fields, self.model.numeric_fields)
+
+    def _append(self, doc):
+        if doc.get('_id') in self._warm_ids:
+            return
+        self._appended += 1
+        if self._appended >= self.capacity:
+            # Every warm-up document has been overwritten by now
+            self._warm_ids = frozenset()
+        evicted = self.ring.append(doc)
+        if evicted is not None and (self.floor is None or evicted > self.floor):
+            self.floor = evicted
+        key_field = self.model.key_field
+        if key_field is not None:
+            key = doc.get(key_field)
+            ring = self.keys.get(key)
+            if ring is None:
+                ring = self.keys[key] = self._ring(self.key_capacity)
+                if len(self.keys) > self.max_keys:
+                    self.keys.popitem(last=False)
+                    self.keys_complete = False
+            else:
+                self.keys.move_to_end(key)
+            ring.append(doc)
+
+    def add(self, documents):
+        """Feed newly inserted documents, in insertion order"""
+        with self._lock:
+            for doc in documents:
+                self._append(doc)
+
+    def warm(self, newest_first):
+        """Load the newest documents read from MongoDB, keeping anything fed
+        since the hot tier started"""
+        with self._lock:
+            fed = [self.ring.document(slot) for slot in self.ring.slots()][::-1]
+            self._reset()
+            for doc in reversed(newest_first):
+                self._append(doc)
+            if len(newest_first) >= self.capacity:
+                self.floor = newest_first[-1]['_id']
+            self._warm_ids = frozenset(doc['_id'] for doc in newest_first)
+            self._appended = 0
+            for doc in fed:
+                self._append(doc)
+            self.ready = True
+
+    def latest(self, limit, key=None):
+        """Newest ``limit`` documents (of ``key``), or None if not all held"""
+        with self._lock:
+            ring, complete = self.ring, self.floor is None
+            if key is not None and self.model.key_field is not None:
+                ring = self.keys.get(key)
+                complete = complete and self.keys_complete
+            # A full ring may have overwritten older documents of its key
+            held = ring is not None and (
+                ring.size >= limit or (complete and ring.size < ring.capacity)
+            )
+            result = ring.newest(limit) if self.ready and held else None
+        HOT_TIER_READS.inc(source=self.model.source, result='miss' if result is None else 'hit')
+        return result
+
+    def since(self, last_id, limit):
+        """Newest ``limit`` documents with _id above ``last_id``, or None if
+        some of them may no longer be held"""
+        with self._lock:
+            covered = self.ready and (
+                self.floor is None or (last_id is not None and last_id >= self.floor)
+            )
+            result = None
+            if covered:
+                ring = self.ring
+                newer = [
+                    slot for slot in ring.slots()
+                    if last_id is None or ring.ids[slot] > last_id
+                ]
+                newer.sort(key=ring.ids.__getitem__, reverse=True)
+                result = [ring.document(slot) for slot in newer[:limit]]
+        HOT_TIER_READS.inc(source=self.model.source, result='miss' if result is None else 'hit')
+        return result
+
+    def stats(self):
+        return {
+            'ready': self.ready,
+            'documents': self.ring.size,
+            'keys': len(self.keys),
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def is_enabled():
+    """Whether the hot tier is enabled and fed with every insert"""
+    return app_setting('HOT_TIER', 'enabled', False) and (
+        app_setting('CHANGE_STREAM', 'enabled', False)
+        or app_setting('HOT_TIER', 'single_process', False)
+    )
+
+
+def get_store(model):
+    """This process's HotStore for ``model``, or None when disabled"""
+    if not is_enabled():
+        return None
+    store = _stores.get(model)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(model)
+            if store is None:
+                store = _stores[model] = HotStore(
+                    model,
+                    capacity=app_setting('HOT_TIER', 'capacity', 1000),
+                    key_capacity=app_setting('HOT_TIER', 'key_capacity', 100),
+                    max_keys=app_setting('HOT_TIER', 'max_keys', 1000),
+                )
+    return store
+
+
+def warm_up():
+    """Load every source's newest documents from MongoDB; returns whether
+    all of them were loaded
+
+    Sources that fail keep reading from MongoDB. Run it with
+    ``db_utils.retry_in_background()`` to retry until they are loaded.
+    """
+    from .models_advanced import MODELS
+
+    warmed = True
+    for model in MODELS:
+        store = get_store(model)
+        if store is None:
+            return True
+        try:
+            cursor = model.get_read_collection().find({}, model.projection)
+            store.warm(list(cursor.sort(model.cursor_sort()).limit(store.capacity)))
+        except Exception:
+            logger.exception('Could not warm up the hot tier for %s', model.source)
+            warmed = False
+    return warmed
+
+
+def feed_batch(batch):
+    """Feed a change stream batch (model -> documents)"""
+    for model, documents in batch.items():
+        store = get_store(model)
+        if store is not None and documents:
+            store.add(documents)
+
+
+def get_stats():
+    return {model.source: store.stats() for model, store in list(_stores.items())}
+
+
+def get_ready():
+    """{source: whether its store has been warmed up}"""
+    return {model.source: store.ready for model, store in list(_stores.items())}
+
+
+def feed_hot_tier(sender, documents, **kwargs):
+    """documents_inserted receiver: append new documents to the hot tier"""
+    store = get_store(sender)
+    if store is not None and documents:
+        store.add(documents)
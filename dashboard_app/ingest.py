@@ -0,0 +1,259 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .conf import app_setting
+from .db_utils import DUPLICATE_KEY
+from .metrics import INGEST_BATCH_SECONDS, INGEST_DOCUMENTS
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by BufferedWriter.add_many() when ``max_pending`` would be exceeded"""
+
+
+class BufferedWriter:
+    """Buffers documents per model and writes them with insert_many(ordered=False)
+
+    A model's buffer is flushed when it reaches ``batch_size`` documents or
+    when its oldest document has waited ``flush_interval`` seconds. Call
+    ``start()`` to have a background thread enforce the time threshold even
+    when no new documents arrive, and ``close()`` to flush whatever is left.
+    With ``record_latency`` the duration (ms) of every insert_many is kept
+    in ``latencies``; it excludes the documents_inserted receivers, which
+    run after the write.
+
+    With ``max_pending`` set, ``add_many()`` raises QueueFull instead of
+    accepting documents beyond that many buffered or being written, so
+    callers can push back on producers when MongoDB falls behind.
+
+    When a write fails for another reason than rejected documents (e.g. the
+    server is unreachable), the unwritten documents go back to the front of
+    their buffer, still counting as pending, and are retried after
+    ``flush_interval``. Each document gets its ``_id`` before the first
+    attempt, so a retry never inserts one twice.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, record_latency=False,
+                 max_pending=None):
+        self.batch_size = batch_size or app_setting('INGEST_SETTINGS', 'batch_size', 500)
+        self.flush_interval = (
+            flush_interval or app_setting('INGEST_SETTINGS', 'flush_interval', 1.0)
+        )
+        self.max_pending = max_pending
+        self.inserted = 0
+        self.failed = 0
+        self.latencies = [] if record_latency else None
+        self._buffers = {}
+        self._first_added = {}
+        # Model -> monotonic time before which a failed write is not retried
+        self._retry_at = {}
+        # _ids of requeued documents, which a failed write may have inserted
+        self._unconfirmed = set()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, model, **fields):
+        """Queue a single document for ``model``"""
+        self.add_many(model, [fields])
+
+    def add_many(self, model, records):
+        """Queue several documents for ``model``, flushing if a threshold is hit
+
+        Documents without a ``timestamp`` are stamped now, not when written.
+        """
+        now = datetime.now()
+        records = [
+            record if 'timestamp' in record else {**record, 'timestamp': now}
+            for record in records
+        ]
+        with self._lock:
+            if self.max_pending is not None and self._pending() + len(records) > self.max_pending:
+                raise QueueFull(f'{self._pending()} documents already pending')
+            buffer = self._buffers.setdefault(model, [])
+            if not buffer:
+                self._first_added[model] = time.monotonic()
+            buffer.extend(records)
+            due = self._is_due(model)
+        if due:
+            self.flush(model)
+
+    def pending(self):
+        """Number of documents buffered or being written"""
+        with self._lock:
+            return self._pending()
+
+    def flush(self, model=None):
+        """Write buffered documents for one model (or all of them)"""
+        models = [model] if model is not None else list(self._buffers)
+        written = 0
+        for current in models:
+            with self._lock:
+                docs = self._buffers.pop(current, None)
+                self._first_added.pop(current, None)
+                if docs:
+                    self._in_flight += len(docs)
+            if docs:
+                try:
+                    written += self._write(current, docs)
+                finally:
+                    with self._lock:
+                        self._in_flight -= len(docs)
+        return written
+
+    def flush_due(self):
+        """Flush every buffer whose size or age threshold has been reached"""
+        with self._lock:
+            due = [model for model in self._buffers if self._is_due(model)]
+        return sum(self.flush(model) for model in due)
+
+    def start(self):
+        """Enforce the time threshold from a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='buffered-writer', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the background thread and flush all remaining documents"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        written = self.flush()
+        with self._lock:
+            for model, docs in self._buffers.items():
+                # Requeued by a failed final write
+                self.failed += len(docs)
+                logger.error(
+                    'Dropping %d documents for %s that could not be written',
+                    len(docs), model.collection_name
+                )
+                INGEST_DOCUMENTS.inc(len(docs), source=model.source, outcome='failed')
+            self._buffers.clear()
+            self._first_added.clear()
+            self._retry_at.clear()
+            self._unconfirmed.clear()
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _pending(self):
+        return self._in_flight + sum(len(buffer) for buffer in self._buffers.values())
+
+    def _is_due(self, model):
+        buffer = self._buffers.get(model)
+        if not buffer:
+            return False
+        if time.monotonic() < self._retry_at.get(model, 0):
+            return False
+        if len(buffer) >= self.batch_size:
+            return True
+        return time.monotonic() - self._first_added[model] >= self.flush_interval
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval / 2):
+            try:
+                self.flush_due()
+            except Exception:
+                logger.exception('Background flush failed')
+
+    def _write(self, model, docs):
+        written = 0
+        for start in range(0, len(docs), self.batch_size):
+            batch = [
+                doc if '_id' in doc else {**doc, '_id': ObjectId()}
+                for doc in docs[start:start + self.batch_size]
+            ]
+            started = time.perf_counter()
+            try:
+                batch = model.insert_many(batch)
+                inserted = len(batch)
+            except BulkWriteError as e:
+                elapsed = time.perf_counter() - started
+                # A duplicate of a requeued _id was written by the failed attempt
+                inserted = e.details.get('nInserted', 0) + sum(
+                    1 for error in e.details.get('writeErrors', ())
+                    if error['code'] == DUPLICATE_KEY
+                    and batch[error['index']]['_id'] in self._unconfirmed
+                )
+                if inserted < len(batch):
+                    with self._lock:
+                        self.failed += len(batch) - inserted
+                    logger.warning(
+                        'Partial insert into %s: %d of %d documents written',
+                        model.collection_name, inserted, len(batch)
+                    )
+                    INGEST_DOCUMENTS.inc(len(batch) - inserted, source=model.source, outcome='failed')
+            except PyMongoError:
+                remainder = batch + docs[start + self.batch_size:]
+                logger.exception(
+                    'Could not write to %s; %d documents will be retried',
+                    model.collection_name, len(remainder)
+                )
+                self._requeue(model, remainder)
+                break
+            else:
+                # Timed without the documents_inserted receivers
+                elapsed = time.perf_counter() - started
+                model.notify_inserted(batch)
+            self._unconfirmed.difference_update(doc['_id'] for doc in batch)
+            written += inserted
+            INGEST_BATCH_SECONDS.observe(elapsed, source=model.source)
+            INGEST_DOCUMENTS.inc(inserted, source=model.source, outcome='inserted')
+            if self.latencies is not None:
+                self.latencies.append(elapsed * 1000)
+        with self._lock:
+            self.inserted += written
+        return written
+
+    def _requeue(self, model, docs):
+        with self._lock:
+            # Ahead of anything added while they were being written
+            self._buffers[model] = docs + self._buffers.get(model, [])
+            self._first_added[model] = time.monotonic()
+            self._retry_at[model] = time.monotonic() + self.flush_interval
+            self._unconfirmed.update(doc['_id'] for doc in docs if '_id' in doc)
+
+
+_ingest_writer = None
+_ingest_writer_lock = threading.Lock()
+
+
+def get_ingest_writer():
+    """Process-wide BufferedWriter for the ingest API, flushed in the background"""
+    global _ingest_writer
+    if _ingest_writer is None:
+        with _ingest_writer_lock:
+            if _ingest_writer is None:
+                _ingest_writer = BufferedWriter(
+                    max_pending=app_setting('INGEST_SETTINGS', 'max_pending', 50000)
+                ).start()
+    return _ingest_writer
+
+
+def get_ingest_stats():
+    """Queue and write counters of the ingest API writer in this process"""
+    writer = _ingest_writer
+    if writer is None:
+        return {}
+    return {
+        'pending': writer.pending(),
+        'inserted': writer.inserted,
+        'failed': writer.failed,
+        'max_pending': writer.max_pending,
+    }
@@ -0,0 +1,37 @@
+"""Fast JSON encoding and decoding for the API endpoints
+
+orjson is used when it is installed and the standard library otherwise;
+both produce the same compact output for the payloads served here.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+def epoch_ms(value):
+    """Milliseconds since the Unix epoch for a datetime"""
+    return int(value.timestamp() * 1000)
+
+def dumps(data):
+    """Encode ``data`` as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+def loads(data):
+    """Decode JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse equivalent that encodes with dumps()"""
+    
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,145 @@
+"""Rate-controlled, multi-process load generator used as the ingest benchmark"""
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .conf import setup_worker
+from .data_generator_advanced import (
+    SOCIAL_PLATFORMS, TRAFFIC_LOCATIONS, city_names, make_sensor_reading,
+    make_social_post, make_stock_quote, make_system_metrics, make_traffic_reading,
+    make_transaction, make_weather_report, sensor_ids, stock_prices
+)
+from .data_generator_vectorized import columns_to_documents, default_keys, generate_columns
+from .ingest import BufferedWriter
+from .metrics import percentile
+from .models_advanced import (
+    SensorData, SystemMetrics, StockData, WeatherData,
+    EcommerceTransaction, SocialMediaMetrics, TrafficData, SOURCES
+)
+
+# How often each worker tops up its sources to the target rate
+TICK_SECONDS = 0.05
+
+def record_factories(sensors, symbols, cities):
+    """Model -> zero-argument callable producing one record, cycling through keys"""
+    sensor_keys = itertools.cycle(sensor_ids(sensors))
+    prices = stock_prices(symbols)
+    symbol_keys = itertools.cycle(list(prices))
+    city_keys = itertools.cycle(city_names(cities))
+    platform_keys = itertools.cycle(SOCIAL_PLATFORMS)
+    location_keys = itertools.cycle(TRAFFIC_LOCATIONS)
+    return {
+        SensorData: lambda: make_sensor_reading(next(sensor_keys)),
+        SystemMetrics: make_system_metrics,
+        StockData: lambda: make_stock_quote(next(symbol_keys), prices),
+        WeatherData: lambda: make_weather_report(next(city_keys)),
+        EcommerceTransaction: make_transaction,
+        SocialMediaMetrics: lambda: make_social_post(next(platform_keys)),
+        TrafficData: lambda: make_traffic_reading(next(location_keys)),
+    }
+
+def vectorized_batch_factories(sources, sensors, symbols, cities, seed=None):
+    """Model -> callable(count) producing a NumPy-generated batch of records"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    factories = {}
+    for source in sources:
+        keys = default_keys(source, sensors=sensors, symbols=symbols, cities=cities)
+        state = {'prices': {}} if source == 'stocks' else {}
+        factories[SOURCES[source]] = (
+            lambda count, source=source, keys=keys, state=state: columns_to_documents(
+                generate_columns(source, count, rng, keys, **state)
+            )
+        )
+    return factories
+
+def run_worker(config):
+    """Generate ``rate`` docs/sec per source for ``duration`` seconds"""
+    setup_worker()
+    # Forked workers inherit the parent's random state and would all
+    # generate the same records
+    seed = config.get('worker', 0) << 32 | os.getpid()
+    random.seed(seed)
+    
+    if config.get('vectorized'):
+        batch_factories = vectorized_batch_factories(
+            config['sources'], config['sensors'], config['symbols'], config['cities'], seed
+        )
+    else:
+        factories = record_factories(config['sensors'], config['symbols'], config['cities'])
+        batch_factories = {
+            model: (lambda count, factory=factories[model]: [factory() for _ in range(count)])
+            for model in map(SOURCES.get, config['sources'])
+        }
+    writer = BufferedWriter(batch_size=config['batch_size'], record_latency=True)
+    
+    produced = 0
+    started = time.monotonic()
+    while True:
+        elapsed = time.monotonic() - started
+        if elapsed >= config['duration']:
+            break
+        due = int(elapsed * config['rate']) - produced
+        if due > 0:
+            for model, batch_factory in batch_factories.items():
+                writer.add_many(model, batch_factory(due))
+            produced += due
+        writer.flush_due()
+        time.sleep(max(0.0, TICK_SECONDS - (time.monotonic() - started - elapsed)))
+    writer.close()
+    
+    return {
+        'produced': {source: produced for source in config['sources']},
+        'inserted': writer.inserted,
+        'failed': writer.failed,
+        'latencies': writer.latencies,
+        'elapsed': time.monotonic() - started,
+    }
+
+def run_load_test(rate, workers=1, duration=60, sources=None, sensors=4, symbols=6,
+                  cities=5, batch_size=500, vectorized=False):
+    """Run ``workers`` processes sharing a target of ``rate`` docs/sec per source
+    
+    Returns achieved throughput and insert_many latency percentiles, the
+    latter excluding the documents_inserted receivers.
+    """
+    sources = list(sources or SOURCES)
+    config = {
+        'rate': rate / workers,
+        'duration': duration,
+        'sources': sources,
+        'sensors': sensors,
+        'symbols': symbols,
+        'cities': cities,
+        'batch_size': batch_size,
+        'vectorized': vectorized,
+    }
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            run_worker, [dict(config, worker=index) for index in range(workers)]
+        ))
+    
+    elapsed = max(result['elapsed'] for result in results)
+    inserted = sum(result['inserted'] for result in results)
+    latencies = sorted(itertools.chain.from_iterable(r['latencies'] for r in results))
+    per_source = {
+        source: sum(result['produced'][source] for result in results) / elapsed
+        for source in sources
+    }
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'inserted': inserted,
+        'failed': sum(result['failed'] for result in results),
+        'docs_per_sec': inserted / elapsed,
+        'docs_per_sec_by_source': per_source,
+        'batches': len(latencies),
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0,
+        },
+    }
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard_app.backfill import backfill_params, run_backfill, unfinished_run
+from dashboard_app.models_advanced import SOURCES
+
+class Command(BaseCommand):
+    help = 'Writes historical synthetic data over a time range in parallel, resumable chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.fromisoformat, help='Range start (ISO 8601)')
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat,
+            help='Range end (ISO 8601, default: now, or the end of the latest '
+                 'unfinished run with the same parameters)'
+        )
+        parser.add_argument('--days', type=float, default=1, help='Range length when --start is omitted')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds between readings of each sensor/symbol/city/...'
+        )
+        parser.add_argument('--sources', default=','.join(SOURCES), help='Comma-separated sources')
+        parser.add_argument('--sensors', type=int, default=4, help='Number of distinct sensors')
+        parser.add_argument('--symbols', type=int, default=6, help='Number of distinct stock symbols')
+        parser.add_argument('--cities', type=int, default=5, help='Number of distinct cities')
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes')
+        parser.add_argument('--chunk', type=float, default=3600, help='Seconds of data per chunk')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Documents per insert_many')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (part of the resume key)')
+        parser.add_argument(
+            '--no-rollups', action='store_true',
+            help='Do not fold the backfilled documents into the analytics rollups'
+        )
+        parser.add_argument('--quiet', action='store_true', help='Suppress per-chunk progress')
+
+    def handle(self, *args, **options):
+        sources = [source for source in options['sources'].split(',') if source]
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown sources: {', '.join(sorted(unknown))}")
+        if options['interval'] <= 0 or options['chunk'] <= 0 or options['workers'] < 1:
+            raise CommandError('--interval and --chunk must be positive and --workers at least 1')
+
+        params = backfill_params(
+            sources,
+            interval=options['interval'],
+            chunk_seconds=options['chunk'],
+            seed=options['seed'],
+            sensors=options['sensors'],
+            symbols=options['symbols'],
+            cities=options['cities'],
+        )
+        start, end = options['start'], options['end']
+        resumed = None
+        if end is None:
+            # "now" moves on, so pick up the range of an interrupted run instead
+            resumed = unfinished_run(
+                params, start=start,
+                length=timedelta(days=options['days']) if start is None else None,
+            )
+        if resumed is not None:
+            start, end = resumed
+            self.stdout.write(self.style.WARNING('Resuming an unfinished run with the same parameters'))
+        else:
+            end = end or datetime.now()
+            start = start or end - timedelta(days=options['days'])
+        if start >= end:
+            raise CommandError('--start must be before --end')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilling {len(sources)} sources from {start:%Y-%m-%d %H:%M:%S} to "
+            f"{end:%Y-%m-%d %H:%M:%S} every {options['interval']:g}s "
+            f"with {options['workers']} worker(s)..."
+        ))
+
+        def report(source, done, total, inserted, rate):
+            if not options['quiet']:
+                self.stdout.write(
+                    f"   {source}: {done}/{total} chunks, {inserted} docs "
+                    f"({rate:.0f} docs/sec overall)"
+                )
+
+        run, totals = run_backfill(
+            start, end, sources,
+            interval=options['interval'],
+            chunk_seconds=options['chunk'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            sensors=options['sensors'],
+            symbols=options['symbols'],
+            cities=options['cities'],
+            rollups=not options['no_rollups'],
+            on_progress=report,
+        )
+
+        self.stdout.write("=" * 80)
+        self.stdout.write(f"📊 Run {run}: inserted {sum(t['inserted'] for t in totals.values())} documents")
+        for source, total in totals.items():
+            self.stdout.write(f"   {source}: {total['done']}/{total['chunks']} chunks complete")
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard_app.benchmark import check_scratch_database, run_benchmarks
+
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+def parse_size(value):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    multiplier = SIZE_SUFFIXES.get(value[-1:].lower(), 1)
+    digits = value[:-1] if multiplier > 1 else value
+    return int(float(digits) * multiplier)
+
+class Command(BaseCommand):
+    help = 'Benchmarks the API, read, write and serialization paths at several dataset sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='10k',
+            help='Comma-separated documents per source, e.g. 10k,1M,10M'
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='Timed calls per case')
+        parser.add_argument(
+            '--mongomock', action='store_true',
+            help='Run in memory on mongomock (CPU-bound parts only; needs mongomock installed)'
+        )
+        parser.add_argument(
+            '--db',
+            help='Scratch database name, ending in _benchmark (default: <MONGODB_DB_NAME>_benchmark)'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Allow a --db without the _benchmark suffix; its dashboard collections are dropped'
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data afterwards')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [parse_size(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError(f"Invalid --sizes: {options['sizes']}")
+        if not sizes or min(sizes) < 1 or options['iterations'] < 1:
+            raise CommandError('--sizes and --iterations must be positive')
+        if options['db'] and not (options['mongomock'] or options['force']):
+            try:
+                check_scratch_database(options['db'])
+            except ValueError as e:
+                raise CommandError(f'{e}; pass --force to drop its dashboard collections anyway')
+
+        def report(size, name, result):
+            if name == 'seed':
+                self.stdout.write(self.style.SUCCESS(
+                    f"\n📦 {size} documents per source: seeded {result['documents']} "
+                    f"({result['docs_per_sec']:.0f} docs/sec)"
+                ))
+                self.stdout.write(
+                    f"   {'case':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/sec':>12}"
+                )
+                return
+            self.stdout.write(
+                f"   {name:<42} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+                f"{result['p99_ms']:>9.3f} {result['ops_per_sec']:>12.1f}"
+            )
+
+        try:
+            results = run_benchmarks(
+                sizes,
+                iterations=options['iterations'],
+                mongomock=options['mongomock'],
+                db_name=options['db'],
+                keep=options['keep'],
+                on_result=report,
+                force=options['force'],
+            )
+        except ImportError as e:
+            raise CommandError(f'--mongomock needs the mongomock package ({e})')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\n💾 Results written to {options['output']}"))
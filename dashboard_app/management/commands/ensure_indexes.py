@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from dashboard_app import alerts
+from dashboard_app.models_advanced import MODELS
+
+def find_winning_plan(explain):
+    """Locate the winning plan in find() or aggregate() explain output"""
+    if isinstance(explain, dict):
+        planner = explain.get('queryPlanner')
+        if isinstance(planner, dict) and 'winningPlan' in planner:
+            return planner['winningPlan']
+        for value in explain.values():
+            plan = find_winning_plan(value)
+            if plan is not None:
+                return plan
+    elif isinstance(explain, list):
+        for value in explain:
+            plan = find_winning_plan(value)
+            if plan is not None:
+                return plan
+    return None
+
+def describe_plan(plan):
+    """Flatten a plan tree into 'STAGE(index) <- STAGE' form"""
+    stages = []
+    while plan:
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return ' <- '.join(stages)
+
+class Command(BaseCommand):
+    help = 'Creates the MongoDB collections and indexes declared on each model and reports hot query plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-explain', action='store_true',
+            help='Only create indexes, skip the explain() report'
+        )
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            kind = model.ensure_collection()
+            names = model.ensure_indexes()
+            if kind == 'timeseries':
+                retention = model.retention_seconds()
+                kind += f", expires after {retention}s" if retention else ", no expiry"
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {model.collection_name} ({kind}): {', '.join(names)}"
+            ))
+        names = alerts.ensure_indexes()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {alerts.ALERTS_COLLECTION}: {', '.join(names)}"
+        ))
+
+        if options['no_explain']:
+            return
+
+        self.stdout.write('\nQuery plans:')
+        for model in MODELS:
+            for name, explain in model.explain_hot_queries().items():
+                plan = find_winning_plan(explain)
+                summary = describe_plan(plan) if plan else 'no plan reported'
+                style = self.style.WARNING if 'COLLSCAN' in summary else self.style.SUCCESS
+                self.stdout.write(style(f"   {model.__name__}.{name}: {summary}"))
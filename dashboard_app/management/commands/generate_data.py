@@ -1,11 +1,73 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from dashboard_app.data_generator_advanced import run_advanced_data_simulation
+from dashboard_app.load_generator import run_load_test
+from dashboard_app.models_advanced import SOURCES
 
 class Command(BaseCommand):
     help = 'Starts generating simulated real-time data from 7 different sources'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate', type=float,
+            help='Load-test mode: target documents/sec per source (across all workers)'
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (load-test mode)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run (load-test mode)')
+        parser.add_argument(
+            '--sources', default=','.join(SOURCES),
+            help='Comma-separated sources to generate (load-test mode)'
+        )
+        parser.add_argument('--sensors', type=int, default=4, help='Number of distinct sensors')
+        parser.add_argument('--symbols', type=int, default=6, help='Number of distinct stock symbols')
+        parser.add_argument('--cities', type=int, default=5, help='Number of distinct cities')
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents per insert_many')
+        parser.add_argument(
+            '--vectorized', action='store_true',
+            help='Generate each batch with NumPy instead of per-document Python (load-test mode)'
+        )
+        parser.add_argument('--quiet', action='store_true', help='Suppress per-document output')
+
     def handle(self, *args, **options):
+        if options['rate'] is None:
+            self.stdout.write(
+                self.style.SUCCESS('Starting ADVANCED real-time data generation...')
+            )
+            run_advanced_data_simulation(quiet=options['quiet'])
+            return
+
+        sources = [source for source in options['sources'].split(',') if source]
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown sources: {', '.join(sorted(unknown))}")
+        if options['rate'] <= 0 or options['workers'] < 1:
+            raise CommandError('--rate must be positive and --workers at least 1')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generating {options['rate']:g} docs/sec per source for {len(sources)} sources "
+            f"with {options['workers']} worker(s) for {options['duration']:g}s..."
+        ))
+        report = run_load_test(
+            rate=options['rate'],
+            workers=options['workers'],
+            duration=options['duration'],
+            sources=sources,
+            sensors=options['sensors'],
+            symbols=options['symbols'],
+            cities=options['cities'],
+            batch_size=options['batch_size'],
+            vectorized=options['vectorized'],
+        )
+
+        latency = report['latency_ms']
+        self.stdout.write("=" * 80)
+        self.stdout.write(f"📊 Inserted {report['inserted']} documents in {report['elapsed']:.1f}s "
+                          f"({report['failed']} failed)")
+        self.stdout.write(f"🚀 Throughput: {report['docs_per_sec']:.0f} docs/sec")
+        if not options['quiet']:
+            for source, rate in report['docs_per_sec_by_source'].items():
+                self.stdout.write(f"   {source}: {rate:.0f} docs/sec")
         self.stdout.write(
-            self.style.SUCCESS('Starting ADVANCED real-time data generation...')
+            f"⏱️  insert_many latency over {report['batches']} batches: "
+            f"p50 {latency['p50']:.1f}ms | p95 {latency['p95']:.1f}ms | "
+            f"p99 {latency['p99']:.1f}ms | max {latency['max']:.1f}ms"
         )
-        run_advanced_data_simulation()
\ No newline at end of file
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from dashboard_app.rollups import ROLLUPS
+
+class Command(BaseCommand):
+    help = 'Recomputes the analytics rollup collections from the raw data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Also rebuild rollups whose raw data expires (loses aged-out history)'
+        )
+    
+    def handle(self, *args, **options):
+        for rollup in ROLLUPS:
+            if rollup.model.retention_seconds() and not options['force']:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️  Skipping {rollup.name}: {rollup.model.collection_name} only holds "
+                    f"{rollup.model.retention_seconds()}s of raw data (use --force)"
+                ))
+                continue
+            self.stdout.write(f"🔄 Rebuilding {rollup.name} from {rollup.model.collection_name}...")
+            rollup.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"   ✅ {rollup.totals.count_documents({})} keys, "
+                f"{rollup.hourly.count_documents({})} hourly buckets"
+            ))
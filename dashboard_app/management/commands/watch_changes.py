@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from dashboard_app.changestream import ChangeStreamFanout, unsupported_reason
+from dashboard_app.models_advanced import MODELS
+
+class Command(BaseCommand):
+    help = 'Publishes inserts from a MongoDB change stream to the channel layer and snapshot cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-interval', type=float,
+            help='Seconds of events coalesced into one publish (default: CHANGE_STREAM setting)'
+        )
+
+    def handle(self, *args, **options):
+        reason = unsupported_reason()
+        if reason is not None:
+            raise CommandError(reason)
+        if not settings.CHANGE_STREAM.get('enabled'):
+            self.stdout.write(self.style.WARNING(
+                '⚠️  CHANGE_STREAM_ENABLED is off, so writers also broadcast their own inserts'
+            ))
+        fanout = ChangeStreamFanout(batch_interval=options['batch_interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Watching {len(MODELS)} collections "
+            f"({fanout.batch_interval:g}s batches)..."
+        ))
+        try:
+            fanout.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"📊 {fanout.events} events in {fanout.batches} batches")
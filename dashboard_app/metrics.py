@@ -0,0 +1,331 @@
+"""Lightweight in-process metrics in the Prometheus text format
+
+Counters and histograms are plain dicts behind a lock, so recording a
+sample costs a dict lookup and a bisect. Every worker process keeps its
+own values; scrape each worker (or aggregate them) to see the whole
+deployment. ``render()`` produces the exposition served at ``/metrics``.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Seconds; tuned for sub-millisecond cache hits up to multi-second aggregations
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_registry = []
+
+
+def percentile(sorted_values, q, counts=None):
+    """Nearest-rank ``q`` quantile (0-1) of ascending ``sorted_values``, 0.0
+    when empty
+
+    ``counts``, when given, is how often each value occurs (e.g. histogram
+    bins); otherwise every value counts once.
+    """
+    if not sorted_values:
+        return 0.0
+    if counts is None:
+        return sorted_values[max(math.ceil(q * len(sorted_values)) - 1, 0)]
+    rank = q * sum(counts)
+    seen = 0
+    for value, count in zip(sorted_values, counts):
+        seen += count
+        if seen >= rank:
+            return value
+    return sorted_values[-1]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter:
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Gauge:
+    """Value read from ``function`` at scrape time
+
+    ``function`` returns a number, or a dict mapping label value tuples to
+    numbers.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def samples(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        try:
+            samples = list(metric.samples())
+        except Exception:
+            # One failing gauge must not break the whole scrape
+            continue
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in samples:
+            lines.append(f'{name}{labels} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Application metrics
+
+QUERY_SECONDS = Histogram(
+    'dashboard_query_seconds',
+    'Duration of model queries, aggregations and serialization',
+    ('operation', 'source'),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'dashboard_http_request_seconds',
+    'Duration of HTTP requests by URL name and status code',
+    ('view', 'status'),
+)
+MONGODB_COMMAND_SECONDS = Histogram(
+    'dashboard_mongodb_command_seconds',
+    'Duration of MongoDB commands reported by the driver',
+    ('command', 'collection'),
+)
+MONGODB_COMMAND_FAILURES = Counter(
+    'dashboard_mongodb_command_failures_total',
+    'MongoDB commands that failed',
+    ('command', 'collection'),
+)
+INGEST_DOCUMENTS = Counter(
+    'dashboard_ingest_documents_total',
+    'Documents written by BufferedWriter, by outcome (inserted or failed)',
+    ('source', 'outcome'),
+)
+INGEST_BATCH_SECONDS = Histogram(
+    'dashboard_ingest_batch_seconds',
+    'Duration of BufferedWriter insert_many batches',
+    ('source',),
+)
+INGEST_RECORDS = Counter(
+    'dashboard_ingest_api_records_total',
+    'Records received by /api/ingest/, by outcome (accepted, rejected or throttled)',
+    ('source', 'outcome'),
+)
+
+
+def timed(operation):
+    """Decorator recording a MongoModel classmethod's duration in QUERY_SECONDS
+
+    Apply it below ``@classmethod``; the source label comes from the class.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(cls, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(cls, *args, **kwargs)
+            finally:
+                QUERY_SECONDS.observe(
+                    time.perf_counter() - started, operation=operation, source=cls.source
+                )
+        return wrapper
+    return decorator
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """Feeds driver-reported command durations into MONGODB_COMMAND_SECONDS"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        # The command's first value names the collection, except for getMore
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        else:
+            collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ''
+        with self._lock:
+            self._collections[event.request_id, event.connection_id] = collection
+
+    def _collection(self, event):
+        with self._lock:
+            return self._collections.pop((event.request_id, event.connection_id), '')
+
+    def succeeded(self, event):
+        MONGODB_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6,
+            command=event.command_name, collection=self._collection(event),
+        )
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGODB_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name, collection=collection
+        )
+        MONGODB_COMMAND_FAILURES.inc(command=event.command_name, collection=collection)
+
+
+command_listener = CommandLatencyListener()
+
+
+class MetricsMiddleware:
+    """Records every request's duration by resolved URL name and status"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            view=match.url_name if match and match.url_name else 'unmatched',
+            status=response.status_code,
+        )
+        return response
+
+
+def _numeric(stats):
+    return {(name,): value for name, value in stats.items() if isinstance(value, (int, float))}
+
+
+def _pool_stats():
+    from .db_utils import get_pool_stats
+    return _numeric(get_pool_stats())
+
+
+def _snapshot_cache_stats():
+    from .cache import get_snapshot_cache
+    return _numeric(get_snapshot_cache().stats())
+
+
+def _ingest_stats():
+    from .ingest import get_ingest_stats
+    return _numeric(get_ingest_stats())
+
+
+def _warm_up_ready():
+    from . import hottier, windows
+    ready = {('hot_tier', source): int(value) for source, value in hottier.get_ready().items()}
+    analytics = windows.get_windowed_analytics()
+    if analytics is not None:
+        ready[('analytics_windows', '')] = int(analytics.ready)
+    return ready
+
+
+Gauge(
+    'dashboard_mongodb_pool', 'Connection pool checkout counters and waits (ms)',
+    _pool_stats, ('stat',),
+)
+Gauge(
+    'dashboard_snapshot_cache', 'Snapshot cache counters of this process',
+    _snapshot_cache_stats, ('stat',),
+)
+Gauge(
+    'dashboard_ingest_writer', 'Ingest API write queue: pending, inserted and failed documents',
+    _ingest_stats, ('stat',),
+)
+Gauge(
+    'dashboard_warm_up_ready',
+    '1 once the hot tier (per source) or the analytics windows are loaded from MongoDB',
+    _warm_up_ready, ('component', 'source'),
+)
@@ -1,145 +1,543 @@
-from datetime import datetime
-from .db_utils import get_collection
+import inspect
+import logging
+from datetime import datetime, timedelta
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from .db_utils import get_collection, get_db, get_read_collection, get_write_collection
+from .hottier import get_store
+from .jsonutils import epoch_ms
+from .metrics import timed
+from .signals import documents_inserted
 
-class SensorData:
-    """IoT Sensor data model using MongoDB"""
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = (int, float)
+
+# Time-series collections have no _id index, so cursors there are read off a
+# (timestamp, _id) index instead. A delta query only looks this far back from
+# the cursor's _id time, so it misses documents stamped longer than this
+# before they were written.
+CURSOR_LOOKBACK = timedelta(minutes=5)
+CURSOR_INDEX = IndexModel([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id_desc')
+
+class MongoModel:
+    """Declarative base for the MongoDB-backed models
+    
+    Subclasses declare their collection, API source name and field schema;
+    inserts, batch inserts, latest/range queries, projections, indexes and
+    serialization are implemented once here for every source.
+    """
+    collection_name = None
+    # Key used for this model in API responses and live updates
+    source = None
+    # Field name -> type of every field except 'timestamp', in create() order
+    fields = {}
+    # Default values for optional fields
+    defaults = {}
+    # Field identifying the entity a document belongs to (sensor, symbol, ...)
+    key_field = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Numeric fields can be bucketed into time series
+        cls.numeric_fields = tuple(
+            name for name, kind in cls.fields.items() if kind in NUMERIC_TYPES
+        )
+        # Only the declared fields are read back; _id is the delta cursor
+        cls.projection = dict.fromkeys(('_id', 'timestamp', *cls.fields), 1)
+        cls._signature = inspect.Signature([
+            inspect.Parameter(
+                name, inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                default=cls.defaults.get(name, inspect.Parameter.empty),
+            )
+            for name in cls.fields
+        ])
+        if 'indexes' not in cls.__dict__:
+            cls.indexes = cls.default_indexes()
     
     @classmethod
-    def create(cls, sensor_id, temperature, humidity, pressure, status='normal'):
-        collection = get_collection('sensor_data')
-        doc = {
-            'sensor_id': sensor_id,
-            'timestamp': datetime.now(),
-            'temperature': temperature,
-            'humidity': humidity,
-            'pressure': pressure,
-            'status': status
-        }
-        result = collection.insert_one(doc)
+    def default_indexes(cls):
+        """timestamp descending, plus (key, timestamp) for keyed sources"""
+        indexes = [IndexModel([('timestamp', DESCENDING)], name='timestamp_desc')]
+        if cls.key_field:
+            indexes.append(IndexModel(
+                [(cls.key_field, ASCENDING), ('timestamp', DESCENDING)],
+                name=f'{cls.key_field}_timestamp',
+            ))
+        return tuple(indexes)
+    
+    @classmethod
+    def get_collection(cls):
+        return get_collection(cls.collection_name)
+    
+    @classmethod
+    def get_read_collection(cls):
+        return get_read_collection(cls.collection_name)
+    
+    @classmethod
+    def get_write_collection(cls):
+        return get_write_collection(cls.collection_name)
+    
+    @classmethod
+    def build(cls, *args, **kwargs):
+        """Build a document from create() arguments, stamped with the current time"""
+        bound = cls._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        doc = dict(bound.arguments)
+        doc['timestamp'] = datetime.now()
+        return doc
+    
+    @classmethod
+    def validate(cls, record):
+        """Check an externally supplied record against ``fields``
+        
+        Returns the document to insert; raises ValueError describing the
+        first problem. ``timestamp`` is optional and may be epoch ms or ISO
+        8601; it defaults to the current time.
+        """
+        if not isinstance(record, dict):
+            raise ValueError('record must be a JSON object')
+        unknown = set(record) - set(cls.fields) - {'timestamp'}
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        
+        doc = {}
+        for name, kind in cls.fields.items():
+            if name not in record:
+                if name not in cls.defaults:
+                    raise ValueError(f'missing field: {name}')
+                doc[name] = cls.defaults[name]
+                continue
+            value = record[name]
+            if value is None and name in cls.defaults and cls.defaults[name] is None:
+                # Optional field (e.g. market_cap)
+                doc[name] = None
+            # bool is an int subclass but never a valid reading
+            elif kind is float and isinstance(value, NUMERIC_TYPES) and not isinstance(value, bool):
+                doc[name] = float(value)
+            elif isinstance(value, kind) and not isinstance(value, bool):
+                doc[name] = value
+            else:
+                raise ValueError(f'{name} must be {kind.__name__}')
+        
+        if 'timestamp' in record:
+            doc['timestamp'] = cls._parse_timestamp(record['timestamp'])
+        else:
+            doc['timestamp'] = datetime.now()
+        return doc
+    
+    @staticmethod
+    def _parse_timestamp(value):
+        """Naive local datetime from epoch ms or ISO 8601, like datetime.now()"""
+        try:
+            if isinstance(value, NUMERIC_TYPES) and not isinstance(value, bool):
+                return datetime.fromtimestamp(value / 1000)
+            if isinstance(value, str):
+                parsed = datetime.fromisoformat(value)
+                if parsed.tzinfo is not None:
+                    parsed = parsed.astimezone().replace(tzinfo=None)
+                return parsed
+        except (OverflowError, OSError, ValueError):
+            pass
+        raise ValueError('timestamp must be epoch milliseconds or ISO 8601')
+    
+    @classmethod
+    def create(cls, *args, **kwargs):
+        """Insert a single document, accepting the fields in declaration order"""
+        doc = cls.build(*args, **kwargs)
+        result = cls.get_write_collection().insert_one(doc)
         doc['_id'] = result.inserted_id
+        cls.notify_inserted([doc])
         return doc
     
     @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('sensor_data')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
+    def create_many(cls, records):
+        """Insert many documents in a single unordered round trip"""
+        docs = cls.insert_many(records)
+        if docs:
+            cls.notify_inserted(docs)
+        return docs
     
     @classmethod
-    def get_aggregated_stats(cls):
-        """Get aggregated sensor statistics using MongoDB aggregation"""
-        collection = get_collection('sensor_data')
-        pipeline = [
-            {
-                '$group': {
-                    '_id': '$sensor_id',
-                    'avg_temp': {'$avg': '$temperature'},
-                    'avg_humidity': {'$avg': '$humidity'},
-                    'avg_pressure': {'$avg': '$pressure'},
-                    'count': {'$sum': 1}
-                }
-            }
-        ]
-        return list(collection.aggregate(pipeline))
-
-class SystemMetrics:
-    """Server metrics model using MongoDB"""
+    def insert_many(cls, records):
+        """create_many() without sending documents_inserted
+        
+        Callers that time the write itself call notify_inserted() afterwards.
+        """
+        if not records:
+            return []
+        now = datetime.now()
+        docs = []
+        for record in records:
+            doc = dict(record)
+            doc.setdefault('timestamp', now)
+            docs.append(doc)
+        # insert_many fills in '_id' on each doc in place
+        cls.get_write_collection().insert_many(docs, ordered=False)
+        return docs
+    
+    @classmethod
+    @timed('get_latest')
+    def get_latest(cls, limit=50, key=None):
+        """Newest documents first, optionally of one ``key_field`` value
+        
+        Served from the hot tier when it is enabled and holds them all.
+        """
+        store = get_store(cls)
+        if store is not None:
+            docs = store.latest(limit, key)
+            if docs is not None:
+                return docs
+        query = {cls.key_field: key} if key is not None and cls.key_field else {}
+        cursor = cls.get_read_collection().find(query, cls.projection)
+        return list(cursor.sort('timestamp', -1).limit(limit))
     
     @classmethod
-    def create(cls, cpu_usage, memory_usage, disk_usage, network_in, network_out):
-        collection = get_collection('system_metrics')
-        doc = {
-            'cpu_usage': cpu_usage,
-            'memory_usage': memory_usage,
-            'disk_usage': disk_usage,
-            'network_in': network_in,
-            'network_out': network_out,
-            'timestamp': datetime.now()
+    def is_timeseries(cls):
+        """Whether source collections are (created as) time-series collections"""
+        return bool(settings.MONGODB_SETTINGS.get('timeseries'))
+    
+    @classmethod
+    def cursor_sort(cls):
+        """Newest-first order of delta cursors, backed by an index"""
+        if cls.is_timeseries():
+            return [('timestamp', DESCENDING), ('_id', DESCENDING)]
+        return [('_id', DESCENDING)]
+    
+    @classmethod
+    def since_query(cls, last_id):
+        """Filter of ``get_since``; on time-series collections bounded by
+        ``CURSOR_LOOKBACK`` so it is a range on ``CURSOR_INDEX``"""
+        if last_id is None:
+            return {}
+        query = {'_id': {'$gt': last_id}}
+        if cls.is_timeseries():
+            # Naive local time, like the stored timestamps
+            written = datetime.fromtimestamp(last_id.generation_time.timestamp())
+            query['timestamp'] = {'$gte': written - CURSOR_LOOKBACK}
+        return query
+    
+    @classmethod
+    def newest_id(cls):
+        """_id of the newest document, or None: the most recently inserted one
+        as long as ``_id`` order is insert order (see ``get_since``)"""
+        doc = cls.get_read_collection().find_one({}, {'_id': 1}, sort=cls.cursor_sort())
+        return doc['_id'] if doc else None
+    
+    @classmethod
+    @timed('get_since')
+    def get_since(cls, last_id, limit=50):
+        """Documents with an ``_id`` above ``last_id`` (an ObjectId), newest first
+        
+        ObjectIds are generated by the writing client: its clock's seconds,
+        then a per-process random value and counter. ``_id`` order is thus
+        insert order for a single writer, but across writers only to the
+        second, and only while their clocks agree. A document that sorts
+        below a cursor already handed out (another writer's, or one with an
+        explicit older ``_id`` such as ``backfill`` writes) is never
+        returned by this method. Full snapshots (``get_latest``) are
+        unaffected. On time-series collections, documents stamped more than
+        ``CURSOR_LOOKBACK`` before their ``_id`` are not returned either.
+        """
+        store = get_store(cls)
+        if store is not None:
+            docs = store.since(last_id, limit)
+            if docs is not None:
+                return docs
+        cursor = cls.get_read_collection().find(cls.since_query(last_id), cls.projection)
+        return list(cursor.sort(cls.cursor_sort()).limit(limit))
+    
+    @classmethod
+    @timed('get_range')
+    def get_range(cls, start, end, bucket=None, key=None, fields=None):
+        """Documents with ``start <= timestamp < end``, oldest first
+        
+        With ``bucket`` (seconds), documents are grouped server-side into
+        fixed intervals and each point holds the ``count`` plus the
+        ``avg``/``min``/``max`` of every requested numeric field.
+        """
+        fields = tuple(fields or cls.numeric_fields)
+        match = {'timestamp': {'$gte': start, '$lt': end}}
+        if key is not None and cls.key_field:
+            match[cls.key_field] = key
+        collection = cls.get_read_collection()
+        
+        if not bucket:
+            projection = dict.fromkeys(('timestamp',) + fields, 1)
+            projection['_id'] = 0
+            return list(collection.find(match, projection).sort('timestamp', 1))
+        
+        bucket_ms = int(bucket * 1000)
+        epoch = datetime(1970, 1, 1)
+        # Subtracting two dates yields milliseconds
+        epoch_ms = {'$subtract': ['$timestamp', epoch]}
+        group = {
+            '_id': {'$subtract': [epoch_ms, {'$mod': [epoch_ms, bucket_ms]}]},
+            'count': {'$sum': 1},
         }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
+        for field in fields:
+            group[f'{field}_avg'] = {'$avg': f'${field}'}
+            group[f'{field}_min'] = {'$min': f'${field}'}
+            group[f'{field}_max'] = {'$max': f'${field}'}
+        pipeline = [{'$match': match}, {'$group': group}, {'$sort': {'_id': 1}}]
+        
+        points = []
+        for item in collection.aggregate(pipeline, allowDiskUse=True):
+            point = {
+                'timestamp': epoch + timedelta(milliseconds=item['_id']),
+                'count': item['count'],
+            }
+            for field in fields:
+                point[field] = {
+                    'avg': item[f'{field}_avg'],
+                    'min': item[f'{field}_min'],
+                    'max': item[f'{field}_max'],
+                }
+            points.append(point)
+        return points
     
     @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('system_metrics')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
-
-class StockData:
-    """Stock market data model using MongoDB"""
+    def retention_seconds(cls):
+        """Configured raw data retention, or None to keep data forever
+        
+        Retention is enforced by time-series collections, so it only applies
+        when they are enabled.
+        """
+        config = settings.MONGODB_SETTINGS
+        if not config.get('timeseries'):
+            return None
+        retention = config.get('retention_seconds') or {}
+        return retention.get(cls.source, retention.get('*'))
     
     @classmethod
-    def create(cls, symbol, price, volume, change_percent, market_cap=None):
-        collection = get_collection('stock_data')
-        doc = {
-            'symbol': symbol,
-            'price': price,
-            'volume': volume,
-            'change_percent': change_percent,
-            'market_cap': market_cap,
-            'timestamp': datetime.now()
+    def timeseries_options(cls):
+        """``timeseries`` option of the create command for this source"""
+        options = {
+            'timeField': 'timestamp',
+            'granularity': settings.MONGODB_SETTINGS.get('timeseries_granularity', 'seconds'),
         }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
+        if cls.key_field:
+            options['metaField'] = cls.key_field
+        return options
     
     @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('stock_data')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
-
-class WeatherData:
-    """Weather data model using MongoDB"""
+    def ensure_collection(cls):
+        """Create the collection as a time-series collection when enabled
+        
+        While enabled, existing time-series collections get their
+        ``expireAfterSeconds`` brought in line with the configured
+        retention. A regular collection cannot be converted in place, so it
+        is left as is. Returns the collection type, 'timeseries' or
+        'collection'.
+        
+        Change streams cannot watch time-series collections.
+        """
+        db = get_db()
+        info = next(iter(db.list_collections(filter={'name': cls.collection_name})), None)
+        expire = cls.retention_seconds()
+        
+        if info is None:
+            if not settings.MONGODB_SETTINGS.get('timeseries'):
+                # Created implicitly by the first insert
+                return 'collection'
+            options = {'timeseries': cls.timeseries_options()}
+            if expire:
+                options['expireAfterSeconds'] = expire
+            db.create_collection(cls.collection_name, **options)
+            return 'timeseries'
+        
+        if info.get('type') == 'timeseries':
+            current = info.get('options', {}).get('expireAfterSeconds')
+            if settings.MONGODB_SETTINGS.get('timeseries') and current != expire:
+                db.command('collMod', cls.collection_name, expireAfterSeconds=expire or 'off')
+            return 'timeseries'
+        
+        if settings.MONGODB_SETTINGS.get('timeseries'):
+            logger.warning(
+                '%s already exists as a regular collection; migrate its data into a '
+                'new time-series collection to enable retention', cls.collection_name
+            )
+        return 'collection'
     
     @classmethod
-    def create(cls, city, temperature, humidity, wind_speed, condition, pressure):
-        collection = get_collection('weather_data')
-        doc = {
-            'city': city,
-            'temperature': temperature,
-            'humidity': humidity,
-            'wind_speed': wind_speed,
-            'condition': condition,
-            'pressure': pressure,
-            'timestamp': datetime.now()
+    def iter_range(cls, start, end, key=None, fields=None, batch_size=2000):
+        """Lazily iterate documents with ``start <= timestamp < end``, oldest first
+        
+        Unlike ``get_range`` nothing is collected into a list: the cursor
+        fetches ``batch_size`` documents per round trip as it is consumed.
+        """
+        match = {'timestamp': {'$gte': start, '$lt': end}}
+        if key is not None and cls.key_field:
+            match[cls.key_field] = key
+        projection = dict.fromkeys(('timestamp', *(fields or cls.fields)), 1)
+        projection['_id'] = 0
+        cursor = cls.get_read_collection().find(match, projection)
+        return cursor.sort('timestamp', 1).batch_size(batch_size)
+    
+    @classmethod
+    def ensure_indexes(cls):
+        """Create the indexes declared in ``indexes`` (no-op if they exist),
+        plus ``CURSOR_INDEX`` for time-series collections"""
+        indexes = list(cls.indexes)
+        if cls.is_timeseries():
+            indexes.append(CURSOR_INDEX)
+        return cls.get_collection().create_indexes(indexes)
+    
+    @classmethod
+    def explain_hot_queries(cls):
+        """Query plans of the queries the dashboard runs, keyed by name"""
+        collection = cls.get_collection()
+        newest = cls.newest_id()
+        plans = {
+            'get_latest': collection.find({}, cls.projection).sort('timestamp', -1).limit(50).explain(),
+            'newest_id': collection.find({}, {'_id': 1}).sort(cls.cursor_sort()).limit(1).explain(),
+            'get_since': (
+                collection.find(cls.since_query(newest), cls.projection)
+                .sort(cls.cursor_sort()).limit(50).explain()
+            ),
         }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
+        if cls.key_field:
+            key = collection.find_one({}, {cls.key_field: 1}) or {}
+            plans['get_latest_by_key'] = (
+                collection.find({cls.key_field: key.get(cls.key_field)}, cls.projection)
+                .sort('timestamp', -1).limit(50).explain()
+            )
+        return plans
+    
+    @classmethod
+    def _explain_aggregate(cls, pipeline):
+        collection = cls.get_collection()
+        return collection.database.command(
+            'aggregate', collection.name, pipeline=pipeline, explain=True
+        )
     
     @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('weather_data')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
+    def serialize(cls, doc):
+        """JSON-ready dict of the declared fields, timestamp in epoch ms
+        
+        Expects documents read with ``projection`` (or freshly inserted),
+        so a plain copy holds exactly the declared fields plus _id.
+        """
+        data = dict(doc)
+        data.pop('_id', None)
+        data['timestamp'] = epoch_ms(doc['timestamp'])
+        return data
+    
+    @classmethod
+    @timed('serialize')
+    def serialize_many(cls, docs):
+        return [cls.serialize(doc) for doc in docs]
+    
+    @classmethod
+    def notify_inserted(cls, docs):
+        """Send documents_inserted for documents written by this model"""
+        documents_inserted.send(sender=cls, documents=docs)
 
-class EcommerceTransaction:
-    """E-commerce transaction model using MongoDB"""
+class SensorData(MongoModel):
+    """IoT Sensor data model using MongoDB"""
+    collection_name = 'sensor_data'
+    source = 'sensors'
+    fields = {
+        'sensor_id': str,
+        'temperature': float,
+        'humidity': float,
+        'pressure': float,
+        'status': str,
+    }
+    defaults = {'status': 'normal'}
+    key_field = 'sensor_id'
     
     @classmethod
-    def create(cls, order_id, product_name, category, amount, quantity, customer_location):
-        collection = get_collection('ecommerce_transactions')
-        doc = {
-            'order_id': order_id,
-            'product_name': product_name,
-            'category': category,
-            'amount': amount,
-            'quantity': quantity,
-            'customer_location': customer_location,
-            'timestamp': datetime.now()
-        }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
+    @timed('aggregated_stats')
+    def get_aggregated_stats(cls):
+        """Get aggregated sensor statistics using MongoDB aggregation"""
+        collection = cls.get_read_collection()
+        return list(collection.aggregate(cls.aggregated_stats_pipeline()))
+    
+    @classmethod
+    def aggregated_stats_pipeline(cls):
+        return [
+            {
+                '$group': {
+                    '_id': '$sensor_id',
+                    'avg_temp': {'$avg': '$temperature'},
+                    'avg_humidity': {'$avg': '$humidity'},
+                    'avg_pressure': {'$avg': '$pressure'},
+                    'count': {'$sum': 1}
+                }
+            }
+        ]
     
     @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('ecommerce_transactions')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
+    def explain_hot_queries(cls):
+        plans = super().explain_hot_queries()
+        plans['get_aggregated_stats'] = cls._explain_aggregate(cls.aggregated_stats_pipeline())
+        return plans
+
+class SystemMetrics(MongoModel):
+    """Server metrics model using MongoDB"""
+    collection_name = 'system_metrics'
+    source = 'system_metrics'
+    fields = {
+        'cpu_usage': float,
+        'memory_usage': float,
+        'disk_usage': float,
+        'network_in': float,
+        'network_out': float,
+    }
+
+class StockData(MongoModel):
+    """Stock market data model using MongoDB"""
+    collection_name = 'stock_data'
+    source = 'stocks'
+    fields = {
+        'symbol': str,
+        'price': float,
+        'volume': int,
+        'change_percent': float,
+        'market_cap': float,
+    }
+    defaults = {'market_cap': None}
+    key_field = 'symbol'
+
+class WeatherData(MongoModel):
+    """Weather data model using MongoDB"""
+    collection_name = 'weather_data'
+    source = 'weather'
+    fields = {
+        'city': str,
+        'temperature': float,
+        'humidity': float,
+        'wind_speed': float,
+        'condition': str,
+        'pressure': float,
+    }
+    key_field = 'city'
+
+class EcommerceTransaction(MongoModel):
+    """E-commerce transaction model using MongoDB"""
+    collection_name = 'ecommerce_transactions'
+    source = 'ecommerce'
+    fields = {
+        'order_id': str,
+        'product_name': str,
+        'category': str,
+        'amount': float,
+        'quantity': int,
+        'customer_location': str,
+    }
+    key_field = 'category'
     
     @classmethod
+    @timed('revenue_by_category')
     def get_revenue_by_category(cls):
         """Aggregate revenue by category using MongoDB"""
-        collection = get_collection('ecommerce_transactions')
-        pipeline = [
+        collection = cls.get_read_collection()
+        return list(collection.aggregate(cls.revenue_by_category_pipeline()))
+    
+    @classmethod
+    def revenue_by_category_pipeline(cls):
+        return [
             {
                 '$group': {
                     '_id': '$category',
@@ -149,50 +547,44 @@ class EcommerceTransaction:
             },
             {'$sort': {'total_revenue': -1}}
         ]
-        return list(collection.aggregate(pipeline))
-
-class SocialMediaMetrics:
-    """Social media analytics model using MongoDB"""
     
     @classmethod
-    def create(cls, platform, post_id, likes, shares, comments, engagement_rate):
-        collection = get_collection('social_media_metrics')
-        doc = {
-            'platform': platform,
-            'post_id': post_id,
-            'likes': likes,
-            'shares': shares,
-            'comments': comments,
-            'engagement_rate': engagement_rate,
-            'timestamp': datetime.now()
-        }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
-    
-    @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('social_media_metrics')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
+    def explain_hot_queries(cls):
+        plans = super().explain_hot_queries()
+        plans['get_revenue_by_category'] = cls._explain_aggregate(cls.revenue_by_category_pipeline())
+        return plans
 
-class TrafficData:
+class SocialMediaMetrics(MongoModel):
+    """Social media analytics model using MongoDB"""
+    collection_name = 'social_media_metrics'
+    source = 'social_media'
+    fields = {
+        'platform': str,
+        'post_id': str,
+        'likes': int,
+        'shares': int,
+        'comments': int,
+        'engagement_rate': float,
+    }
+    key_field = 'platform'
+
+class TrafficData(MongoModel):
     """Traffic monitoring data model using MongoDB"""
-    
-    @classmethod
-    def create(cls, location, vehicle_count, avg_speed, congestion_level):
-        collection = get_collection('traffic_data')
-        doc = {
-            'location': location,
-            'vehicle_count': vehicle_count,
-            'avg_speed': avg_speed,
-            'congestion_level': congestion_level,
-            'timestamp': datetime.now()
-        }
-        result = collection.insert_one(doc)
-        doc['_id'] = result.inserted_id
-        return doc
-    
-    @classmethod
-    def get_latest(cls, limit=50):
-        collection = get_collection('traffic_data')
-        return list(collection.find().sort('timestamp', -1).limit(limit))
+    collection_name = 'traffic_data'
+    source = 'traffic'
+    fields = {
+        'location': str,
+        'vehicle_count': int,
+        'avg_speed': float,
+        'congestion_level': str,
+    }
+    key_field = 'location'
+
+# All MongoDB-backed models, in dashboard order
+MODELS = (
+    SensorData, SystemMetrics, StockData, WeatherData,
+    EcommerceTransaction, SocialMediaMetrics, TrafficData
+)
+
+# Models keyed by their API source name
+SOURCES = {model.source: model for model in MODELS}
@@ -0,0 +1,187 @@
+"""Incrementally maintained rollups for the analytics endpoint
+
+Each rollup keeps two collections next to the raw data:
+
+* ``<name>_totals``: one document per key (sensor, category) with the
+  running count and field sums since the beginning of time.
+* ``<name>_hourly``: the same per key and hour, plus min/max, for
+  long-term trends after raw data has aged out.
+
+They are updated with ``$inc`` on every ingest batch, so reading them costs
+O(keys) no matter how much history the raw collections hold.
+"""
+import logging
+from collections import defaultdict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .db_utils import DUPLICATE_KEY, get_collection, get_read_collection
+from .metrics import QUERY_SECONDS
+from .models_advanced import EcommerceTransaction, SensorData
+
+logger = logging.getLogger(__name__)
+
+
+def _bulk_upsert(collection, requests):
+    """bulk_write that retries upserts which lost a race to insert the same _id"""
+    try:
+        collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if not errors or any(error['code'] != DUPLICATE_KEY for error in errors):
+            raise
+        # The competing upsert created the document, so these now match it
+        collection.bulk_write([requests[error['index']] for error in errors], ordered=False)
+
+
+class Rollup:
+    """Count, sums and extremes of ``fields`` per ``model.key_field``"""
+
+    def __init__(self, name, model, fields, extremes=()):
+        self.name = name
+        self.model = model
+        self.fields = tuple(fields)
+        self.extremes = tuple(extremes)
+
+    @property
+    def totals(self):
+        return get_collection(f'{self.name}_totals')
+
+    @property
+    def hourly(self):
+        return get_collection(f'{self.name}_hourly')
+
+    def apply(self, documents):
+        """Fold a batch of raw documents into the rollup collections"""
+        totals = defaultdict(lambda: defaultdict(int))
+        hourly = defaultdict(lambda: defaultdict(int))
+        lows = {}
+        highs = {}
+        for doc in documents:
+            key = doc.get(self.model.key_field)
+            bucket = (key, doc['timestamp'].replace(minute=0, second=0, microsecond=0))
+            for sums in (totals[key], hourly[bucket]):
+                sums['count'] += 1
+                for field in self.fields:
+                    sums[f'sum_{field}'] += doc.get(field) or 0
+            for field in self.extremes:
+                value = doc.get(field)
+                if value is None:
+                    continue
+                lows[bucket, field] = min(value, lows.get((bucket, field), value))
+                highs[bucket, field] = max(value, highs.get((bucket, field), value))
+
+        if totals:
+            _bulk_upsert(self.totals, [
+                UpdateOne({'_id': key}, {'$inc': dict(sums)}, upsert=True)
+                for key, sums in totals.items()
+            ])
+        if hourly:
+            requests = []
+            for (key, hour), sums in hourly.items():
+                update = {'$inc': dict(sums)}
+                if self.extremes:
+                    update['$min'] = {
+                        f'min_{field}': lows[(key, hour), field]
+                        for field in self.extremes if ((key, hour), field) in lows
+                    }
+                    update['$max'] = {
+                        f'max_{field}': highs[(key, hour), field]
+                        for field in self.extremes if ((key, hour), field) in highs
+                    }
+                requests.append(UpdateOne(
+                    {'_id': {'key': key, 'bucket': hour}}, update, upsert=True
+                ))
+            _bulk_upsert(self.hourly, requests)
+
+    def get_totals(self):
+        with QUERY_SECONDS.time(operation=f'{self.name}_totals', source=self.model.source):
+            return list(get_read_collection(f'{self.name}_totals').find())
+
+    def rebuild(self):
+        """Recompute both collections from the raw data with $out
+
+        $out writes each result to a temporary collection and renames it
+        over the target once complete, so readers see the old rollup until
+        then instead of an empty or partial one.
+        """
+        raw = self.model.get_collection()
+        sums = {f'sum_{field}': {'$sum': f'${field}'} for field in self.fields}
+        extremes = {}
+        for field in self.extremes:
+            extremes[f'min_{field}'] = {'$min': f'${field}'}
+            extremes[f'max_{field}'] = {'$max': f'${field}'}
+        key = f'${self.model.key_field}'
+        hour = {
+            '$dateFromParts': {
+                'year': {'$year': '$timestamp'},
+                'month': {'$month': '$timestamp'},
+                'day': {'$dayOfMonth': '$timestamp'},
+                'hour': {'$hour': '$timestamp'},
+            }
+        }
+
+        raw.aggregate([
+            {'$group': {'_id': key, 'count': {'$sum': 1}, **sums}},
+            {'$out': self.totals.name},
+        ], allowDiskUse=True)
+        raw.aggregate([
+            {'$group': {
+                '_id': {'key': key, 'bucket': hour},
+                'count': {'$sum': 1}, **sums, **extremes,
+            }},
+            {'$out': self.hourly.name},
+        ], allowDiskUse=True)
+
+
+SENSOR_STATS = Rollup(
+    'sensor_stats', SensorData,
+    fields=('temperature', 'humidity', 'pressure'),
+    extremes=('temperature',),
+)
+REVENUE_BY_CATEGORY = Rollup(
+    'revenue_by_category', EcommerceTransaction,
+    fields=('amount', 'quantity'),
+)
+
+ROLLUPS = (SENSOR_STATS, REVENUE_BY_CATEGORY)
+
+
+def get_sensor_stats():
+    """Same shape as SensorData.get_aggregated_stats(), read from the rollup"""
+    return [
+        {
+            '_id': item['_id'],
+            'avg_temp': item['sum_temperature'] / item['count'],
+            'avg_humidity': item['sum_humidity'] / item['count'],
+            'avg_pressure': item['sum_pressure'] / item['count'],
+            'count': int(item['count']),
+        }
+        for item in SENSOR_STATS.get_totals()
+        if item.get('count')
+    ]
+
+
+def get_revenue_by_category():
+    """Same shape as EcommerceTransaction.get_revenue_by_category(), read from the rollup"""
+    revenue = [
+        {
+            '_id': item['_id'],
+            'total_revenue': item['sum_amount'],
+            'total_orders': int(item['count']),
+        }
+        for item in REVENUE_BY_CATEGORY.get_totals()
+    ]
+    return sorted(revenue, key=lambda item: item['total_revenue'], reverse=True)
+
+
+def update_rollups(sender, documents, **kwargs):
+    """documents_inserted receiver: fold new documents into the rollups"""
+    for rollup in ROLLUPS:
+        if rollup.model is sender and documents:
+            try:
+                rollup.apply(documents)
+            except Exception:
+                # The raw write already succeeded; rebuild_rollups can repair this
+                logger.exception('Failed to update %s rollup', rollup.name)
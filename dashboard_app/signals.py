@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by the models after documents are written to MongoDB.
+# Arguments: sender (the model class), documents (list of inserted docs)
+documents_inserted = Signal()
@@ -1,3 +1,868 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import time
+import warnings
+from datetime import datetime, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+
+try:
+    import mongomock
+except ImportError:  # Optional, as for benchmark --mongomock
+    mongomock = None
+
+from . import compression, conditional, db_utils, export, hottier, models_advanced
+from .alerts import RULES, AlertEngine, EwmaZScore, RateOfChange, Rule, Threshold
+from .backfill import backfill_chunk, chunk_progress
+from .benchmark import cold_start, use_database
+from .cache import SnapshotCache, get_snapshot_cache, invalidate_snapshots
+from .cursors import parse_cursor
+from .data_generator_advanced import make_sensor_reading
+from .data_generator_vectorized import default_keys
+from .downsampling import lttb
+from .hottier import HotStore, RingBuffer
+from .ingest import BufferedWriter, QueueFull
+from .jsonutils import epoch_ms, loads
+from .metrics import percentile
+from .rollups import SENSOR_STATS
+from .signals import documents_inserted
+from .models_advanced import SensorData, StockData
+from .views_advanced import api_all_data, api_analytics, api_export, api_ingest, api_series
+from .windows import SlidingWindow, WindowedStat, entry_percentile, _new_entry
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def readings(count, sensor_id='S1', start=NOW):
+    return [
+        {
+            '_id': ObjectId(),
+            'sensor_id': sensor_id,
+            'temperature': float(i),
+            'humidity': 50.0,
+            'pressure': None,
+            'status': 'normal',
+            'timestamp': start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+@skipIf(mongomock is None, 'needs mongomock')
+class MongoTestCase(SimpleTestCase):
+    """Runs each test against an empty in-memory mongomock database"""
+
+    def setUp(self):
+        saved = db_utils._client, db_utils._db, db_utils._pid
+        self.addCleanup(self.restore_database, saved)
+        self.db = use_database('dashboard_test', mongomock=True)
+        # Snapshots of the previous test's database
+        cold_start()
+        self.addCleanup(cold_start)
+
+    @staticmethod
+    def restore_database(saved):
+        with db_utils._lock:
+            db_utils._client, db_utils._db, db_utils._pid = saved
+
+
+class ParseCursorTests(SimpleTestCase):
+    sources = ('sensors', 'stocks')
+
+    def test_parses_pairs(self):
+        first, second = ObjectId(), ObjectId()
+        cursor = parse_cursor(f'sensors:{first},stocks:{second},', self.sources)
+        self.assertEqual(cursor, {'sensors': first, 'stocks': second})
+
+    def test_empty(self):
+        self.assertEqual(parse_cursor('', self.sources), {})
+
+    def test_unknown_source(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown cursor source'):
+            parse_cursor(f'nope:{ObjectId()}', self.sources)
+        with self.assertRaisesMessage(ValueError, 'Unknown cursor source'):
+            parse_cursor(str(ObjectId()), self.sources)
+
+    def test_invalid_object_id(self):
+        with self.assertRaisesMessage(ValueError, 'Invalid cursor position'):
+            parse_cursor('sensors:xyz', self.sources)
+
+
+class LttbTests(SimpleTestCase):
+    def test_short_series_unchanged(self):
+        points = [(0, 1), (1, 2), (2, 3)]
+        self.assertEqual(lttb(points, 10), points)
+
+    def test_keeps_ends_and_spike(self):
+        points = [(x, 0.0) for x in range(1000)]
+        points[500] = (500, 100.0)
+        sampled = lttb(points, 20)
+        self.assertEqual(len(sampled), 20)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertIn((500, 100.0), sampled)
+        self.assertEqual(sampled, sorted(sampled))
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile(values, 0.0), 1)
+
+    def test_empty(self):
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_counts(self):
+        self.assertEqual(percentile([1, 2, 3], 0.5, [8, 1, 1]), 1)
+        self.assertEqual(percentile([1, 2, 3], 0.95, [8, 1, 1]), 3)
+
+
+class AlertEngineTests(SimpleTestCase):
+    def evaluate(self, engine, values, model=SensorData, field='temperature', key='S1'):
+        docs = [
+            {model.key_field: key, field: value, 'timestamp': NOW + timedelta(seconds=i)}
+            for i, value in enumerate(values)
+        ]
+        return engine.evaluate(model, docs)
+
+    def test_threshold_is_edge_triggered(self):
+        engine = AlertEngine([Threshold('hot', SensorData, 'temperature', above=30)])
+        fired = self.evaluate(engine, [25, 31, 35, 20, 32])
+        self.assertEqual([alert['value'] for alert in fired], [31, 32])
+        self.assertEqual(fired[0]['key'], 'S1')
+        self.assertEqual(fired[0]['message'], 'temperature 31 above 30')
+
+    def test_inclusive_threshold(self):
+        engine = AlertEngine([
+            Threshold('hot', SensorData, 'temperature', above=30, inclusive=True)
+        ])
+        fired = self.evaluate(engine, [29.99, 30])
+        self.assertEqual([alert['value'] for alert in fired], [30])
+        self.assertEqual(fired[0]['message'], 'temperature 30 at or above 30')
+        self.assertEqual(self.evaluate(AlertEngine([
+            Threshold('hot', SensorData, 'temperature', above=30)
+        ]), [30]), [])
+
+    def test_high_temperature_matches_warning_status(self):
+        rule = next(rule for rule in RULES if rule.name == 'high_temperature')
+        for temperature in (29.99, 30.0, 30.01):
+            with mock.patch('dashboard_app.data_generator_advanced.random.uniform',
+                            return_value=temperature):
+                reading = make_sensor_reading('S1')
+            self.assertEqual(
+                rule.check(None, reading['temperature'], NOW) is not None,
+                reading['status'] == 'warning'
+            )
+
+    def test_rule_needs_check(self):
+        class Incomplete(Rule):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete('x', SensorData, 'temperature')
+
+    def test_keys_are_independent(self):
+        engine = AlertEngine([Threshold('hot', SensorData, 'temperature', above=30)])
+        self.evaluate(engine, [31], key='S1')
+        self.assertEqual(len(self.evaluate(engine, [31], key='S2')), 1)
+        self.assertEqual(self.evaluate(engine, [31], key='S1'), [])
+
+    def test_rate_of_change(self):
+        rule = RateOfChange('jump', StockData, 'price', max_change=5, relative=True)
+        engine = AlertEngine([rule])
+        fired = self.evaluate(engine, [100, 104, 110], model=StockData, field='price', key='X')
+        self.assertEqual(len(fired), 1)
+        self.assertEqual(fired[0]['value'], 110)
+
+    def test_ewma_waits_for_warmup(self):
+        rule = EwmaZScore('anomaly', SensorData, 'temperature', warmup=20, threshold=4)
+        steady = [20.0 + 0.1 * math.sin(i) for i in range(30)]
+        self.assertEqual(self.evaluate(AlertEngine([rule]), steady[:5] + [50.0]), [])
+        fired = self.evaluate(AlertEngine([rule]), steady + [50.0])
+        self.assertEqual([alert['value'] for alert in fired], [50.0])
+
+    def test_non_numeric_values_skipped(self):
+        engine = AlertEngine([Threshold('hot', SensorData, 'temperature', above=30)])
+        self.assertEqual(self.evaluate(engine, [None, 'x']), [])
+        self.assertEqual(engine.evaluate(StockData, [{'price': 1}]), [])
+
+
+class RingBufferTests(SimpleTestCase):
+    def ring(self, capacity, model=SensorData):
+        return RingBuffer(capacity, model.fields, model.numeric_fields)
+
+    def test_overwrites_oldest(self):
+        ring = self.ring(3)
+        docs = readings(5)
+        evicted = [ring.append(doc) for doc in docs]
+        self.assertEqual(evicted, [None, None, None, docs[0]['_id'], docs[1]['_id']])
+        self.assertEqual(ring.size, 3)
+        self.assertEqual([doc['_id'] for doc in ring.newest(10)], [d['_id'] for d in docs[:1:-1]])
+
+    def test_round_trips_documents(self):
+        ring = self.ring(2)
+        doc = readings(1)[0]
+        ring.append(doc)
+        self.assertEqual(ring.newest(1), [doc])
+
+    def test_integer_columns(self):
+        ring = self.ring(2, StockData)
+        ring.append({'_id': ObjectId(), 'symbol': 'X', 'price': 1.5, 'volume': 7})
+        stored = ring.newest(1)[0]
+        self.assertEqual(stored['volume'], 7)
+        self.assertIsInstance(stored['volume'], int)
+        self.assertIsNone(stored['market_cap'])
+
+
+class HotStoreTests(SimpleTestCase):
+    def store(self, capacity=10, key_capacity=3, max_keys=5):
+        store = HotStore(SensorData, capacity, key_capacity, max_keys)
+        store.ready = True
+        return store
+
+    def test_not_ready_misses(self):
+        store = HotStore(SensorData, 10, 3, 5)
+        store.add(readings(2))
+        self.assertIsNone(store.latest(1))
+
+    def test_latest(self):
+        store = self.store()
+        docs = readings(4)
+        store.add(docs)
+        self.assertEqual([doc['_id'] for doc in store.latest(2)], [docs[3]['_id'], docs[2]['_id']])
+        # Everything inserted is held, so asking for more than exists is a hit
+        self.assertEqual(len(store.latest(50)), 4)
+
+    def test_overflowed_key_ring_misses(self):
+        store = self.store()
+        store.add(readings(5))
+        self.assertEqual(len(store.latest(3, 'S1')), 3)
+        self.assertIsNone(store.latest(4, 'S1'))
+
+    def test_overflowed_ring_misses(self):
+        store = self.store(capacity=3)
+        store.add(readings(5))
+        self.assertEqual(len(store.latest(3)), 3)
+        self.assertIsNone(store.latest(4))
+
+    def test_dropped_key_misses(self):
+        store = self.store(max_keys=1)
+        store.add(readings(1, 'S1') + readings(1, 'S2'))
+        self.assertIsNone(store.latest(1, 'S1'))
+        self.assertEqual(len(store.latest(1, 'S2')), 1)
+        self.assertIsNone(store.latest(2, 'S2'))
+
+    def test_since(self):
+        store = self.store(capacity=3)
+        docs = readings(5)
+        store.add(docs)
+        newer = store.since(docs[2]['_id'], 10)
+        self.assertEqual([doc['_id'] for doc in newer], [docs[4]['_id'], docs[3]['_id']])
+        # Documents after docs[0] were partly overwritten
+        self.assertIsNone(store.since(docs[0]['_id'], 10))
+
+    def test_warm_keeps_fed_documents_once(self):
+        store = HotStore(SensorData, 10, 3, 5)
+        docs = readings(4)
+        store.add(docs[2:])
+        store.warm(docs[::-1])
+        self.assertTrue(store.ready)
+        self.assertEqual([doc['_id'] for doc in store.latest(10)], [d['_id'] for d in docs[::-1]])
+
+    def test_needs_a_feed_of_every_insert(self):
+        cases = [
+            ({}, {'enabled': False}, False),
+            ({'single_process': False}, {'enabled': False}, False),
+            ({'single_process': True}, {'enabled': False}, True),
+            ({'single_process': False}, {'enabled': True}, True),
+        ]
+        self.addCleanup(hottier._stores.clear)
+        for hot_tier, change_stream, enabled in cases:
+            with self.subTest(hot_tier=hot_tier, change_stream=change_stream), override_settings(
+                HOT_TIER={'enabled': True, **hot_tier}, CHANGE_STREAM=change_stream
+            ):
+                self.assertEqual(hottier.is_enabled(), enabled)
+                self.assertEqual(hottier.get_store(SensorData) is not None, enabled)
+
+
+class SlidingWindowTests(SimpleTestCase):
+    def window(self, resolution=None):
+        stat = WindowedStat('test', SensorData, 'temperature', resolution=resolution)
+        # 60s in 10s buckets
+        return SlidingWindow(stat, 60, 6)
+
+    def test_totals(self):
+        window = self.window()
+        window.add('S1', 10.0, NOW - timedelta(seconds=30), NOW)
+        window.add('S1', 20.0, NOW - timedelta(seconds=5), NOW)
+        window.add('S2', 5.0, NOW, NOW)
+        totals = window.totals(NOW)
+        self.assertEqual(totals['S1'][:4], [2, 30.0, 10.0, 20.0])
+        self.assertEqual(totals['S2'][:4], [1, 5.0, 5.0, 5.0])
+
+    def test_buckets_slide_out(self):
+        window = self.window()
+        window.add('S1', 10.0, NOW, NOW)
+        self.assertEqual(window.totals(NOW + timedelta(seconds=50))['S1'][0], 1)
+        self.assertEqual(window.totals(NOW + timedelta(seconds=60)), {})
+
+    def test_future_document_keeps_window(self):
+        window = self.window()
+        window.add('S1', 10.0, NOW, NOW)
+        window.add('S1', 99.0, NOW + timedelta(days=1), NOW)
+        window.add('S2', 1.0, NOW + timedelta(seconds=20), NOW + timedelta(seconds=20))
+        self.assertEqual(set(window.totals(NOW + timedelta(seconds=20))), {'S1', 'S2'})
+
+    def test_old_document_ignored(self):
+        window = self.window()
+        window.add('S1', 10.0, NOW - timedelta(minutes=5), NOW)
+        self.assertEqual(window.totals(NOW), {})
+
+    def test_histogram(self):
+        window = self.window(resolution=1.0)
+        for value in (1.2, 1.7, 8.4):
+            window.add('S1', value, NOW, NOW)
+        entry = window.totals(NOW)['S1']
+        self.assertEqual(entry[4], {1: 2, 8: 1})
+        self.assertEqual(entry_percentile(entry, 1.0, 0.5), 1.5)
+
+    def test_entry_percentile_clamps_to_observed_range(self):
+        entry = [4, 0.0, 0.2, 9.1, {0: 2, 5: 1, 9: 1}]
+        self.assertEqual(entry_percentile(entry, 1.0, 0.5), 0.5)
+        self.assertEqual(entry_percentile(entry, 1.0, 1.0), 9.1)
+        self.assertIsNone(entry_percentile(_new_entry(1.0), 1.0, 0.5))
+
+
+class ExportTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        start = datetime.now() - timedelta(minutes=5)
+        self.docs = readings(3, start=start) + readings(2, 'S2', start=start)
+        SensorData.get_collection().insert_many([dict(doc) for doc in self.docs])
+
+    def get(self, query, factory=RequestFactory):
+        return api_export(factory().get('/api/export/sensors/', query), 'sensors')
+
+    def test_ndjson(self):
+        response = self.get({'key': 'S2', 'fields': 'temperature'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['temperature'] for row in rows], [0.0, 1.0])
+        self.assertEqual(set(rows[0]), {'timestamp', 'temperature'})
+
+    def test_csv(self):
+        response = self.get({'format': 'csv', 'fields': 'sensor_id,temperature'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'timestamp,sensor_id,temperature')
+        self.assertEqual(len(lines), 6)
+
+    def test_invalid_field(self):
+        response = self.get({'fields': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_asgi_response_is_async(self):
+        response = self.get({}, factory=AsyncRequestFactory)
+        self.assertTrue(response.is_async)
+
+    async def test_iterate_in_thread_is_incremental(self):
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield b'%d' % i
+
+        iterator = export.iterate_in_thread(chunks())
+        self.assertEqual(await anext(iterator), b'0')
+        self.assertEqual(produced, [0])
+        self.assertEqual([chunk async for chunk in iterator], [b'1', b'2'])
+
+    async def test_asgi_export_is_streamed(self):
+        with mock.patch.object(export, 'CHUNK_BYTES', 1), warnings.catch_warnings():
+            # Django warns when it has to collect a sync iterator first
+            warnings.simplefilter('error')
+            response = self.get({}, factory=AsyncRequestFactory)
+            chunks = [chunk async for chunk in response]
+        self.assertEqual(len(chunks), len(self.docs))
+
+
+class BenchmarkDatabaseTests(SimpleTestCase):
+    def test_refuses_database_without_suffix(self):
+        for name in ('dashboard', settings.MONGODB_SETTINGS['db_name']):
+            with self.assertRaisesMessage(CommandError, 'pass --force'):
+                call_command('benchmark', db=name)
+
+    @mock.patch('dashboard_app.management.commands.benchmark.run_benchmarks')
+    def test_force_and_scratch_database(self, run_benchmarks):
+        call_command('benchmark', db='dashboard', force=True)
+        call_command('benchmark', db='dashboard_benchmark')
+        self.assertEqual(run_benchmarks.call_count, 2)
+
+
+class SnapshotTests(MongoTestCase):
+    def get(self, **headers):
+        return api_all_data(RequestFactory().get('/api/all-data/', headers=headers))
+
+    def test_etag_answers_304(self):
+        SensorData.get_collection().insert_many(readings(3))
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(loads(response.content)['sensors']), 3)
+        response = self.get(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_expired_snapshot_reused_until_insert(self):
+        SensorData.get_collection().insert_many(readings(3))
+        etag = self.get()['ETag']
+        builds = []
+        build = conditional.dumps
+
+        def counting_dumps(data):
+            builds.append(data)
+            return build(data)
+
+        with mock.patch.object(conditional, 'dumps', counting_dumps):
+            get_snapshot_cache().invalidate()
+            self.assertEqual(self.get()['ETag'], etag)
+            self.assertEqual(builds, [])
+            SensorData.get_collection().insert_many(readings(1))
+            get_snapshot_cache().invalidate()
+            self.assertNotEqual(self.get()['ETag'], etag)
+            self.assertEqual(len(builds), 1)
+
+    def test_snapshots_without_models_are_not_kept(self):
+        for n in range(3):
+            conditional.get_snapshot(f'window:{n}', lambda: {'n': n})
+        self.assertEqual(conditional._last_built, {})
+
+
+class SnapshotCacheTests(SimpleTestCase):
+    def test_invalidate(self):
+        cache = SnapshotCache(ttl=60, backend='')
+        self.assertEqual(cache.get_or_build('a', lambda: 1), 1)
+        self.assertEqual(cache.get_or_build('a', lambda: 2), 1)
+        cache.invalidate()
+        self.assertEqual(cache.get_or_build('a', lambda: 3), 3)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    @mock.patch.object(SnapshotCache, 'invalidate', side_effect=ConnectionError('redis down'))
+    def test_failed_invalidation_does_not_fail_the_insert(self, invalidate):
+        with self.assertLogs('dashboard_app.cache', 'ERROR'):
+            invalidate_snapshots(SensorData, readings(1))
+        invalidate.assert_called_once()
+
+    def test_prunes_expired_entries_and_locks(self):
+        cache = SnapshotCache(ttl=60, backend='')
+        with mock.patch('dashboard_app.cache.time.monotonic', return_value=0.0):
+            for key in range(5):
+                cache.get_or_build(key, lambda: key)
+        with mock.patch('dashboard_app.cache.time.monotonic', return_value=100.0):
+            cache.get_or_build('new', lambda: 'new')
+        self.assertEqual(list(cache._entries), ['new'])
+        self.assertEqual(list(cache._build_locks), ['new'])
+
+
+class AnalyticsWindowTests(SimpleTestCase):
+    def get(self, window):
+        return api_analytics(RequestFactory().get('/api/analytics/', {'window': window}))
+
+    @mock.patch('dashboard_app.views_advanced.snapshot_response')
+    @mock.patch('dashboard_app.views_advanced.get_snapshot')
+    def test_configured_windows_share_a_key(self, get_snapshot, snapshot_response):
+        for window in ('1h', '60m', '3600s'):
+            self.get(window)
+        keys = {call.args[0] for call in get_snapshot.call_args_list}
+        self.assertEqual(keys, {'analytics:3600'})
+
+    def test_other_windows_rejected(self):
+        for window in ('7m', '3601s', '0.5s', 'nope'):
+            self.assertEqual(self.get(window).status_code, 400)
+
+
+class BackfillResumeTests(MongoTestCase):
+    def task(self, **overrides):
+        return {
+            'run': 'test', 'source': 'sensors', 'chunk_index': 0,
+            'start': NOW, 'end': NOW + timedelta(minutes=1), 'interval': 1.0,
+            'keys': default_keys('sensors', sensors=2), 'seed': 0, 'batch_size': 50,
+            'retry': False, 'rollups': True, 'rolled_up': False, **overrides,
+        }
+
+    def rolled_up_count(self):
+        return sum(doc['count'] for doc in SENSOR_STATS.totals.find())
+
+    def test_retry_folds_in_documents_of_interrupted_attempt(self):
+        with mock.patch.object(SENSOR_STATS, 'apply', side_effect=RuntimeError('killed')):
+            with self.assertRaises(RuntimeError):
+                backfill_chunk(self.task())
+        # The interrupted attempt wrote only part of the chunk
+        SensorData.get_collection().delete_many({'timestamp': {'$gte': NOW + timedelta(seconds=30)}})
+
+        _, _, inserted, _ = backfill_chunk(self.task(retry=True))
+        self.assertEqual(inserted, 60)
+        self.assertEqual(SensorData.get_collection().count_documents({}), 120)
+        self.assertEqual(self.rolled_up_count(), 120)
+        self.assertEqual(chunk_progress('test', 'sensors')[2], {0})
+
+    def test_retry_after_rollups_does_not_count_twice(self):
+        backfill_chunk(self.task())
+        _, _, inserted, _ = backfill_chunk(self.task(retry=True, rolled_up=True))
+        self.assertEqual(inserted, 0)
+        self.assertEqual(self.rolled_up_count(), 120)
+
+
+class RollupRebuildTests(MongoTestCase):
+    def test_replaces_totals_from_raw_data(self):
+        SENSOR_STATS.totals.insert_one({'_id': 'gone', 'count': 5})
+        SENSOR_STATS.apply(readings(2, 'S1'))
+        SensorData.get_collection().insert_many(
+            readings(3, 'S1') + readings(2, 'S2', start=NOW + timedelta(hours=1))
+        )
+        SENSOR_STATS.rebuild()
+        totals = {doc['_id']: doc for doc in SENSOR_STATS.totals.find()}
+        self.assertEqual(set(totals), {'S1', 'S2'})
+        self.assertEqual((totals['S1']['count'], totals['S1']['sum_temperature']), (3, 3.0))
+        hourly = sorted(
+            (doc['_id']['key'], doc['count'], doc['max_temperature'])
+            for doc in SENSOR_STATS.hourly.find()
+        )
+        self.assertEqual(hourly, [('S1', 3, 2.0), ('S2', 2, 1.0)])
+
+
+class SeriesBucketTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        SensorData.get_collection().insert_many(readings(120))
+
+    def get(self, **params):
+        params.update(start=NOW.isoformat(), end=(NOW + timedelta(minutes=2)).isoformat())
+        return api_series(RequestFactory().get('/api/series/sensors/', params), 'sensors')
+
+    def test_buckets(self):
+        response = self.get(bucket='10', fields='temperature')
+        data = loads(response.content)
+        self.assertEqual(data['bucket'], 10)
+        self.assertEqual([point['count'] for point in data['points']], [10] * 12)
+        self.assertEqual(data['points'][0]['temperature'], {'avg': 4.5, 'min': 0.0, 'max': 9.0})
+
+    def test_points(self):
+        data = loads(self.get(points='4').content)
+        self.assertEqual(data['bucket'], 30)
+        self.assertEqual(len(data['points']), 4)
+
+    def test_bucket_below_a_millisecond_rejected(self):
+        for bucket in ('0.0001', '0', '-1', 'inf', 'nan'):
+            self.assertEqual(self.get(bucket=bucket).status_code, 400)
+
+    def test_bucket_raised_to_max_points(self):
+        data = loads(self.get(bucket='0.001').content)
+        self.assertEqual(data['bucket'], 0.024)
+
+
+class BufferedWriterTests(MongoTestCase):
+    def writer(self, **options):
+        return BufferedWriter(**{'batch_size': 3, 'flush_interval': 60, **options})
+
+    def records(self, count):
+        return [
+            {'sensor_id': 'S1', 'temperature': float(i), 'humidity': 50.0, 'pressure': 1000.0,
+             'status': 'normal'}
+            for i in range(count)
+        ]
+
+    def stored(self):
+        return list(SensorData.get_collection().find().sort('temperature', 1))
+
+    def test_flushes_at_batch_size(self):
+        writer = self.writer()
+        writer.add_many(SensorData, self.records(2))
+        self.assertEqual(self.stored(), [])
+        writer.add(SensorData, **self.records(1)[0])
+        self.assertEqual(len(self.stored()), 3)
+        self.assertEqual(writer.inserted, 3)
+        self.assertEqual(writer.pending(), 0)
+
+    def test_stamped_when_added(self):
+        writer = self.writer()
+        before = datetime.now()
+        writer.add_many(SensorData, self.records(1))
+        with mock.patch('dashboard_app.models_advanced.datetime') as clock:
+            clock.now.return_value = datetime(2000, 1, 1)
+            writer.flush()
+        self.assertGreaterEqual(self.stored()[0]['timestamp'], before.replace(microsecond=0))
+
+    def test_close_flushes_the_rest(self):
+        with self.writer() as writer:
+            writer.add_many(SensorData, self.records(2))
+        self.assertEqual(len(self.stored()), 2)
+
+    def test_requeued_after_driver_error(self):
+        writer = self.writer()
+        insert_many = SensorData.insert_many
+        with mock.patch.object(SensorData, 'insert_many', side_effect=AutoReconnect('down')), \
+                self.assertLogs('dashboard_app.ingest', 'ERROR'):
+            writer.add_many(SensorData, self.records(3))
+        self.assertEqual(writer.pending(), 3)
+        self.assertEqual(writer.flush_due(), 0, 'retried before flush_interval')
+        with mock.patch.object(SensorData, 'insert_many', side_effect=insert_many):
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual([doc['temperature'] for doc in self.stored()], [0.0, 1.0, 2.0])
+        self.assertEqual((writer.inserted, writer.failed, writer.pending()), (3, 0, 0))
+
+    def test_retry_of_a_written_batch_is_not_a_failure(self):
+        writer = self.writer()
+        insert_many = SensorData.insert_many
+
+        def written_but_unacknowledged(docs):
+            insert_many(docs)
+            raise AutoReconnect('connection lost before the reply')
+
+        with mock.patch.object(SensorData, 'insert_many', side_effect=written_but_unacknowledged), \
+                self.assertLogs('dashboard_app.ingest', 'ERROR'):
+            writer.add_many(SensorData, self.records(3))
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(len(self.stored()), 3)
+        self.assertEqual(writer.failed, 0)
+
+    def test_duplicate_of_a_new_document_fails(self):
+        writer = self.writer()
+        record = dict(self.records(1)[0], _id=ObjectId())
+        SensorData.get_collection().insert_one(dict(record))
+        with self.assertLogs('dashboard_app.ingest', 'WARNING'):
+            writer.add_many(SensorData, [record] + self.records(2))
+        self.assertEqual((writer.inserted, writer.failed), (2, 1))
+
+    def test_latency_excludes_receivers(self):
+        received = []
+
+        def slow_receiver(sender, documents, **kwargs):
+            time.sleep(0.1)
+            received.extend(documents)
+
+        documents_inserted.connect(slow_receiver, dispatch_uid='slow_receiver')
+        self.addCleanup(documents_inserted.disconnect, dispatch_uid='slow_receiver')
+        writer = self.writer(record_latency=True)
+        writer.add_many(SensorData, self.records(3))
+        self.assertEqual(len(received), 3)
+        self.assertLess(writer.latencies[0], 100)
+
+    def test_queue_full(self):
+        writer = self.writer(max_pending=2)
+        writer.add_many(SensorData, self.records(2))
+        with self.assertRaises(QueueFull):
+            writer.add_many(SensorData, self.records(1))
+        self.assertEqual(writer.pending(), 2)
+
+
+class ValidateTests(SimpleTestCase):
+    record = {'sensor_id': 'S1', 'temperature': 21, 'humidity': 40.5, 'pressure': 1000.0}
+
+    def test_valid_record(self):
+        doc = SensorData.validate(dict(self.record, timestamp=1704110400000))
+        self.assertEqual(doc['temperature'], 21.0)
+        self.assertIsInstance(doc['temperature'], float)
+        self.assertEqual(doc['status'], 'normal')
+        self.assertEqual(doc['timestamp'], datetime.fromtimestamp(1704110400))
+
+    def test_invalid_records(self):
+        cases = [
+            (dict(self.record, extra=1), 'unknown fields: extra'),
+            ({'sensor_id': 'S1'}, 'missing field: temperature'),
+            (dict(self.record, temperature=True), 'temperature must be float'),
+            (dict(self.record, sensor_id=7), 'sensor_id must be str'),
+            (dict(self.record, timestamp='yesterday'), 'timestamp must be'),
+            ([self.record], 'record must be a JSON object'),
+        ]
+        for record, message in cases:
+            with self.subTest(record=record), self.assertRaisesMessage(ValueError, message):
+                SensorData.validate(record)
+
+    def test_optional_field(self):
+        doc = StockData.validate(
+            {'symbol': 'X', 'price': 1.5, 'volume': 7, 'change_percent': 0.1, 'market_cap': None}
+        )
+        self.assertIsNone(doc['market_cap'])
+
+    def test_aware_timestamp_made_naive(self):
+        doc = SensorData.validate(dict(self.record, timestamp='2024-01-01T12:00:00+00:00'))
+        self.assertIsNone(doc['timestamp'].tzinfo)
+
+
+@override_settings(INGEST_SETTINGS={'token': 'secret'})
+class IngestTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.writer = BufferedWriter(batch_size=500, flush_interval=60, max_pending=3)
+        patcher = mock.patch('dashboard_app.views_advanced.get_ingest_writer', return_value=self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, records, token='secret'):
+        headers = {'authorization': f'Bearer {token}'} if token else {}
+        request = RequestFactory().post(
+            '/api/ingest/sensors/', json.dumps(records), content_type='application/json',
+            headers=headers,
+        )
+        return api_ingest(request, 'sensors')
+
+    def test_accepts_and_rejects(self):
+        record = {'sensor_id': 'S1', 'temperature': 20.0, 'humidity': 40.0, 'pressure': 1000.0}
+        response = self.post([record, dict(record, temperature='hot')])
+        self.assertEqual(response.status_code, 202)
+        data = loads(response.content)
+        self.assertEqual((data['accepted'], data['rejected']), (1, 1))
+        # Records are numbered from 1
+        self.assertEqual(data['batches'][0]['errors'][0]['record'], 2)
+        self.writer.flush()
+        self.assertEqual(SensorData.get_collection().count_documents({}), 1)
+
+    def test_queue_full_answers_429(self):
+        record = {'sensor_id': 'S1', 'temperature': 20.0, 'humidity': 40.0, 'pressure': 1000.0}
+        response = self.post([record] * 4)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(loads(response.content)['processed'], 0)
+
+    def test_token_required(self):
+        self.assertEqual(self.post([], token=None).status_code, 401)
+        self.assertEqual(self.post([], token='wrong').status_code, 401)
+
+    def test_disabled_without_token(self):
+        with override_settings(INGEST_SETTINGS={}), self.assertRaises(Http404):
+            self.post([])
+
+
+class MongoModelTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inserted = []
+
+        def receiver(sender, documents, **kwargs):
+            self.inserted.append((sender, len(documents)))
+
+        documents_inserted.connect(receiver, weak=False, dispatch_uid='test_receiver')
+        self.addCleanup(documents_inserted.disconnect, dispatch_uid='test_receiver')
+
+    def test_build_in_declaration_order(self):
+        doc = SensorData.build('S1', 20.0, 40.0, pressure=1000.0)
+        self.assertEqual(
+            [doc[name] for name in SensorData.fields], ['S1', 20.0, 40.0, 1000.0, 'normal']
+        )
+        self.assertIsInstance(doc['timestamp'], datetime)
+        with self.assertRaises(TypeError):
+            SensorData.build('S1', 20.0)
+
+    def test_create(self):
+        doc = SensorData.create('S1', 20.0, 40.0, 1000.0)
+        self.assertIsInstance(doc['_id'], ObjectId)
+        self.assertEqual(SensorData.get_latest(1)[0]['_id'], doc['_id'])
+        self.assertEqual(self.inserted, [(SensorData, 1)])
+
+    def test_create_many(self):
+        docs = SensorData.create_many([
+            {'sensor_id': key, 'temperature': 1.0, 'humidity': 2.0, 'pressure': 3.0,
+             'status': 'normal'}
+            for key in ('S1', 'S2', 'S1')
+        ])
+        self.assertTrue(all('_id' in doc and 'timestamp' in doc for doc in docs))
+        self.assertEqual(len(SensorData.get_latest(10, key='S1')), 2)
+        self.assertEqual(self.inserted, [(SensorData, 3)])
+        self.assertEqual(SensorData.create_many([]), [])
+
+    def test_serialize(self):
+        doc = readings(1)[0]
+        data = SensorData.serialize(doc)
+        self.assertNotIn('_id', data)
+        self.assertEqual(data['timestamp'], epoch_ms(NOW))
+        self.assertEqual(data['sensor_id'], 'S1')
+
+
+class CompressionTests(SimpleTestCase):
+    body = b'{"value": 1}' * 100
+
+    def respond(self, accept='gzip', body=None, **headers):
+        response = HttpResponse(self.body if body is None else body, content_type='application/json')
+        for name, value in headers.items():
+            response[name] = value
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        request = RequestFactory().get('/api/all-data/', headers={'accept-encoding': accept})
+        return middleware, middleware(request)
+
+    @mock.patch.object(compression, 'brotli', None)
+    def test_gzip(self):
+        _, response = self.respond(ETag='"abc"')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @skipIf(compression.brotli is None, 'needs brotli')
+    def test_brotli_preferred(self):
+        _, response = self.respond(accept='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), self.body)
+
+    def test_left_alone(self):
+        for accept, body, headers in (
+            ('', None, {}),
+            ('gzip', b'{}', {}),
+            ('gzip', None, {'Content-Type': 'application/gzip'}),
+        ):
+            with self.subTest(accept=accept, body=body, headers=headers):
+                _, response = self.respond(accept, body, **headers)
+                self.assertFalse(response.has_header('Content-Encoding'))
+
+    @mock.patch.object(compression, 'brotli', None)
+    def test_compressed_once_per_etag(self):
+        middleware, _ = self.respond(ETag='"abc"')
+        with mock.patch.object(middleware, '_compress', wraps=middleware._compress) as compress:
+            request = RequestFactory().get('/api/all-data/', headers={'accept-encoding': 'gzip'})
+            for _ in range(2):
+                response = HttpResponse(self.body, content_type='application/json')
+                response['ETag'] = '"abc"'
+                self.assertEqual(middleware.process_response(request, response)['Content-Encoding'], 'gzip')
+        compress.assert_not_called()
+
+
+class TimeSeriesCursorTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        timeseries = override_settings(MONGODB_SETTINGS={**settings.MONGODB_SETTINGS, 'timeseries': True})
+        timeseries.enable()
+        self.addCleanup(timeseries.disable)
+        now = datetime.now().replace(microsecond=0)
+        self.docs = readings(3, start=now - timedelta(seconds=3))
+        SensorData.get_collection().insert_many([dict(doc) for doc in self.docs])
+
+    def test_newest_id_by_timestamp(self):
+        self.assertEqual(SensorData.cursor_sort()[0], ('timestamp', -1))
+        self.assertEqual(SensorData.newest_id(), self.docs[-1]['_id'])
+
+    def test_get_since(self):
+        newer = SensorData.get_since(self.docs[0]['_id'])
+        self.assertEqual([doc['_id'] for doc in newer], [d['_id'] for d in self.docs[:0:-1]])
+        self.assertEqual(SensorData.get_since(self.docs[-1]['_id']), [])
+
+    def test_get_since_is_bounded_by_lookback(self):
+        query = SensorData.since_query(self.docs[0]['_id'])
+        self.assertLessEqual(
+            self.docs[0]['timestamp'] - query['timestamp']['$gte'],
+            models_advanced.CURSOR_LOOKBACK + timedelta(seconds=1),
+        )
+        stale = dict(readings(1)[0], timestamp=datetime.now() - timedelta(hours=1))
+        SensorData.get_collection().insert_one(stale)
+        self.assertNotIn(stale['_id'], [doc['_id'] for doc in SensorData.get_since(self.docs[0]['_id'])])
+
+    def test_cursor_index(self):
+        self.assertIn('timestamp_id_desc', SensorData.ensure_indexes())
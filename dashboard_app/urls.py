@@ -6,4 +6,10 @@ urlpatterns = [
     path('', views_advanced.advanced_dashboard, name='dashboard'),
     path('api/all-data/', views_advanced.api_all_data, name='api_all_data'),
     path('api/analytics/', views_advanced.api_analytics, name='api_analytics'),
+    path('api/series/<str:source>/', views_advanced.api_series, name='api_series'),
+    path('api/export/<str:source>/', views_advanced.api_export, name='api_export'),
+    path('api/ingest/<str:source>/', views_advanced.api_ingest, name='api_ingest'),
+    path('api/alerts/', views_advanced.api_alerts, name='api_alerts'),
+    path('api/cache-stats/', views_advanced.api_cache_stats, name='api_cache_stats'),
+    path('metrics', views_advanced.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,142 +1,151 @@
+import hmac
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models_advanced import (
     SensorData, SystemMetrics, StockData, WeatherData,
-    EcommerceTransaction, SocialMediaMetrics, TrafficData
+    EcommerceTransaction, SocialMediaMetrics, TrafficData, SOURCES
 )
+from . import alerts, rollups, windows
+from .cache import get_snapshot_cache
+from .changestream import get_fanout
+from .conf import app_setting
+from .conditional import get_snapshot, snapshot_response
+from .cursors import high_water_mark, parse_cursor
+from .db_utils import get_pool_stats
+from .hottier import get_stats as get_hot_tier_stats
+from .downsampling import lttb
+from .export import FORMATS, csv_chunks, gzip_chunks, iterate_in_thread, ndjson_chunks
+from .ingest import QueueFull, get_ingest_writer
+from .jsonutils import FastJsonResponse, epoch_ms, loads
+from . import metrics
+from .querypool import map_timed, server_timing
+
+logger = logging.getLogger(__name__)
+
+# Number of latest documents returned per source by api_all_data
+LATEST_LIMITS = (
+    (SensorData, 20),
+    (SystemMetrics, 20),
+    (StockData, 30),
+    (WeatherData, 25),
+    (EcommerceTransaction, 20),
+    (SocialMediaMetrics, 25),
+    (TrafficData, 25),
+)
+
+# Default and maximum number of points returned by api_series
+SERIES_POINTS = 300
+SERIES_MAX_POINTS = 5000
+# LTTB samples from this many bucket averages per output point, not raw documents
+LTTB_BUCKETS_PER_POINT = 10
+# get_range() groups by whole milliseconds
+SERIES_MIN_BUCKET = 0.001
+
+# Default and maximum number of alerts returned by api_alerts
+ALERTS_LIMIT = 50
+ALERTS_MAX_LIMIT = 500
+
+# Validation errors reported per ingest batch
+INGEST_MAX_ERRORS = 10
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(value):
+    """Parse durations such as '90s', '15m', '24h' or '7d' into a timedelta"""
+    try:
+        amount = float(value[:-1])
+        unit = DURATION_UNITS[value[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f'Invalid duration: {value!r}')
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError(f'Invalid duration: {value!r}')
+    try:
+        return timedelta(seconds=amount * unit)
+    except OverflowError:
+        raise ValueError(f'Duration too long: {value!r}')
+
+def parse_datetime(value):
+    """Naive local datetime from ISO 8601, like the stored timestamps"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        try:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        except OverflowError:
+            raise ValueError(f'Date out of range: {value!r}')
+    return parsed
+
+def parse_time_range(params, default_window='1h'):
+    """(start, end) from ``start``/``end`` (ISO 8601) or ``window`` query parameters"""
+    end = parse_datetime(params['end']) if 'end' in params else datetime.now()
+    if 'start' in params:
+        start = parse_datetime(params['start'])
+    else:
+        try:
+            start = end - parse_duration(params.get('window', default_window))
+        except OverflowError:
+            raise ValueError('window reaches before the earliest supported date')
+    if start >= end:
+        raise ValueError('start must be before end')
+    return start, end
 
 def advanced_dashboard(request):
     """Main advanced dashboard view"""
     return render(request, 'dashboard/advanced_dashboard.html')
 
-def api_all_data(request):
-    """Combined API endpoint for all data sources"""
-    try:
-        response_data = {
-            'sensors': [],
-            'system_metrics': [],
-            'stocks': [],
-            'weather': [],
-            'ecommerce': [],
-            'social_media': [],
-            'traffic': []
-        }
-        
-        # Get sensor data
-        sensors = SensorData.get_latest(20)
-        response_data['sensors'] = [
-            {
-                'sensor_id': item['sensor_id'],
-                'temperature': item['temperature'],
-                'humidity': item['humidity'],
-                'pressure': item['pressure'],
-                'status': item['status'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in sensors
-        ]
-        
-        # Get system metrics
-        metrics = SystemMetrics.get_latest(20)
-        response_data['system_metrics'] = [
-            {
-                'cpu_usage': item['cpu_usage'],
-                'memory_usage': item['memory_usage'],
-                'disk_usage': item['disk_usage'],
-                'network_in': item['network_in'],
-                'network_out': item['network_out'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in metrics
-        ]
-        
-        # Get stock data
-        stocks = StockData.get_latest(30)
-        response_data['stocks'] = [
-            {
-                'symbol': item['symbol'],
-                'price': item['price'],
-                'volume': item['volume'],
-                'change_percent': item['change_percent'],
-                'market_cap': item.get('market_cap'),
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in stocks
-        ]
-        
-        # Get weather data
-        weather = WeatherData.get_latest(25)
-        response_data['weather'] = [
-            {
-                'city': item['city'],
-                'temperature': item['temperature'],
-                'humidity': item['humidity'],
-                'wind_speed': item['wind_speed'],
-                'condition': item['condition'],
-                'pressure': item['pressure'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in weather
-        ]
-        
-        # Get ecommerce transactions
-        transactions = EcommerceTransaction.get_latest(20)
-        response_data['ecommerce'] = [
-            {
-                'order_id': item['order_id'],
-                'product_name': item['product_name'],
-                'category': item['category'],
-                'amount': item['amount'],
-                'quantity': item['quantity'],
-                'customer_location': item['customer_location'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in transactions
-        ]
-        
-        # Get social media metrics
-        social = SocialMediaMetrics.get_latest(25)
-        response_data['social_media'] = [
-            {
-                'platform': item['platform'],
-                'post_id': item['post_id'],
-                'likes': item['likes'],
-                'shares': item['shares'],
-                'comments': item['comments'],
-                'engagement_rate': item['engagement_rate'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in social
-        ]
-        
-        # Get traffic data
-        traffic = TrafficData.get_latest(25)
-        response_data['traffic'] = [
-            {
-                'location': item['location'],
-                'vehicle_count': item['vehicle_count'],
-                'avg_speed': item['avg_speed'],
-                'congestion_level': item['congestion_level'],
-                'timestamp': item['timestamp'].isoformat()
-            }
-            for item in traffic
-        ]
-        
-        return JsonResponse(response_data, safe=False)
+def build_all_data(cursor=None, timings=None):
+    """Latest documents per source, or only those newer than ``cursor``
+    
+    The per-source queries run concurrently; their durations (ms) are
+    recorded in ``timings`` when a dict is passed.
+    """
+    def query(entry):
+        model, limit = entry
+        if cursor is None:
+            return model.get_latest(limit)
+        return model.get_since(cursor.get(model.source), limit)
+    
+    response_data = {}
+    next_cursor = {}
+    for (model, _), items, duration in map_timed(query, LATEST_LIMITS):
+        response_data[model.source] = model.serialize_many(items)
+        if timings is not None:
+            timings[model.source] = duration
         
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        # Keep the previous position when nothing new arrived
+        mark = high_water_mark(items)
+        if mark is None and cursor and model.source in cursor:
+            mark = str(cursor[model.source])
+        if mark is not None:
+            next_cursor[model.source] = mark
+    
+    response_data['cursor'] = next_cursor
+    response_data['delta'] = cursor is not None
+    return response_data
 
-def api_analytics(request):
-    """MongoDB aggregation analytics"""
-    try:
-        analytics = {
-            'sensor_stats': SensorData.get_aggregated_stats(),
-            'revenue_by_category': EcommerceTransaction.get_revenue_by_category()
-        }
-        
+def build_analytics():
+    """Sensor statistics and revenue by category
+    
+    Read from the incrementally maintained rollups; the full aggregation
+    over the raw collections is only used until they have been populated.
+    """
+    sensor_stats = rollups.get_sensor_stats() or SensorData.get_aggregated_stats()
+    revenue_by_category = (
+        rollups.get_revenue_by_category() or EcommerceTransaction.get_revenue_by_category()
+    )
+    return {
         # Format sensor stats
-        analytics['sensor_stats'] = [
+        'sensor_stats': [
             {
                 'sensor_id': item['_id'],
                 'avg_temp': round(item['avg_temp'], 2),
@@ -144,20 +153,353 @@ def api_analytics(request):
                 'avg_pressure': round(item['avg_pressure'], 2),
                 'count': item['count']
             }
-            for item in analytics['sensor_stats']
-        ]
-        
+            for item in sensor_stats
+        ],
         # Format revenue stats
-        analytics['revenue_by_category'] = [
+        'revenue_by_category': [
             {
                 'category': item['_id'],
                 'total_revenue': round(item['total_revenue'], 2),
                 'total_orders': item['total_orders']
             }
-            for item in analytics['revenue_by_category']
-        ]
+            for item in revenue_by_category
+        ],
+    }
+
+def api_all_data(request):
+    """Combined API endpoint for all data sources
+    
+    Pass ``?since=<cursor>`` with the ``cursor`` of a previous response to
+    receive only the documents inserted after it. Full snapshots carry an
+    ETag and answer 304 to a matching ``If-None-Match``.
+    """
+    try:
+        since = request.GET.get('since')
+        sources = [model.source for model, _ in LATEST_LIMITS]
+        cursor = parse_cursor(since, sources) if since is not None else None
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        started = time.perf_counter()
+        timings = {}
+        if cursor is None:
+            # Full snapshots are identical for every viewer, so share them
+            entry = get_snapshot(
+                'all_data', lambda: build_all_data(timings=timings),
+                models=[model for model, _ in LATEST_LIMITS],
+            )
+            response = snapshot_response(request, entry)
+        else:
+            response = FastJsonResponse(build_all_data(cursor, timings))
+        # No per-source timings means the snapshot came from the cache
+        timings = timings or {'cache': 0.0}
+        timings['total'] = (time.perf_counter() - started) * 1000
+        
+        response['Server-Timing'] = server_timing(timings)
+        return response
+        
+    except Exception as e:
+        logger.exception('%s failed', request.path)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def api_analytics(request):
+    """MongoDB aggregation analytics
+    
+    With ``?window=`` (one of ``ANALYTICS_WINDOWS``, by default 5m, 1h and
+    24h) the statistics cover only that recent window: temperature
+    avg/min/max/p95 per sensor, revenue and orders per category,
+    engagement per platform and speed per location.
+    Responses carry an ETag and answer 304 to a matching ``If-None-Match``.
+    """
+    window = request.GET.get('window')
+    if window is not None:
+        # Only the configured windows, so the snapshot cache holds a fixed set of keys
+        configured = app_setting('ANALYTICS_WINDOWS', 'windows', {})
+        try:
+            seconds = parse_duration(window).total_seconds()
+        except ValueError as e:
+            return FastJsonResponse({'error': str(e)}, status=400)
+        if seconds not in {length for length, _ in configured.values()}:
+            return FastJsonResponse(
+                {'error': f"window must be one of {', '.join(configured)}"}, status=400
+            )
+        seconds = int(seconds)
+    
+    try:
+        if window is None:
+            # No newest-_id shortcut: backfill and rebuild_rollups change the
+            # rollups without inserting newer documents. Reading them is cheap.
+            entry = get_snapshot('analytics', build_analytics)
+        else:
+            entry = get_snapshot(
+                f'analytics:{seconds}', lambda: windows.build_windowed_analytics(seconds)
+            )
+        return snapshot_response(request, entry)
+        
+    except Exception as e:
+        logger.exception('%s failed', request.path)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def api_alerts(request):
+    """Most recent alerts, newest first
+    
+    Query parameters: ``limit`` (default 50, at most 500) and ``source``.
+    """
+    try:
+        limit = int(request.GET.get('limit', ALERTS_LIMIT))
+        if not 0 < limit <= ALERTS_MAX_LIMIT:
+            raise ValueError(f'limit must be between 1 and {ALERTS_MAX_LIMIT}')
+        source = request.GET.get('source')
+        if source is not None and source not in SOURCES:
+            raise ValueError(f'Unknown source: {source}')
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        return FastJsonResponse({'alerts': alerts.get_recent(limit, source)})
+    except Exception as e:
+        logger.exception('%s failed', request.path)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def api_cache_stats(request):
+    """Hit/miss counters of the snapshot cache, MongoDB pool waits, change
+    stream fan-out and hot tier fill in this process"""
+    return FastJsonResponse({
+        **get_snapshot_cache().stats(),
+        'mongodb_pool': get_pool_stats(),
+        'change_stream': get_fanout().stats(),
+        'hot_tier': get_hot_tier_stats(),
+    })
+
+def api_series(request, source):
+    """Historical time series for one source, downsampled server-side
+    
+    Query parameters: ``start``/``end`` (ISO 8601) or ``window`` (e.g. 24h,
+    default 1h); ``fields`` (comma separated numeric fields); ``key`` (sensor,
+    symbol, city...); ``points`` (target resolution); ``bucket`` (seconds,
+    overrides ``points``, raised if needed to stay within
+    ``SERIES_MAX_POINTS``) and ``mode`` (``bucket`` for min/max/avg per
+    interval, ``lttb`` for Largest-Triangle-Three-Buckets sampling).
+    
+    LTTB runs over ``LTTB_BUCKETS_PER_POINT`` x ``points`` averages
+    aggregated server-side, so its cost does not grow with the range.
+    """
+    model = SOURCES.get(source)
+    if model is None:
+        raise Http404(f'Unknown source: {source}')
+    
+    try:
+        params = request.GET
+        start, end = parse_time_range(params)
+        
+        fields = [f for f in params.get('fields', '').split(',') if f] or list(model.numeric_fields)
+        unknown = set(fields) - set(model.numeric_fields)
+        if unknown:
+            raise ValueError(f"Unknown fields for {source}: {', '.join(sorted(unknown))}")
         
-        return JsonResponse(analytics)
+        points = min(int(params.get('points', SERIES_POINTS)), SERIES_MAX_POINTS)
+        if points < 3:
+            raise ValueError('points must be at least 3')
+        bucket = float(params['bucket']) if 'bucket' in params else None
+        if bucket is not None and not (SERIES_MIN_BUCKET <= bucket < math.inf):
+            raise ValueError(f'bucket must be at least {SERIES_MIN_BUCKET:g} seconds')
+        mode = params.get('mode', 'bucket')
+        if mode not in ('bucket', 'lttb'):
+            raise ValueError(f'Unknown mode: {mode!r}')
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        key = request.GET.get('key')
+        response_data = {
+            'source': source,
+            'start': epoch_ms(start),
+            'end': epoch_ms(end),
+            'mode': mode,
+        }
+        
+        if mode == 'lttb':
+            span = (end - start).total_seconds()
+            fine = max(SERIES_MIN_BUCKET, span / (LTTB_BUCKETS_PER_POINT * points))
+            averaged = model.get_range(start, end, bucket=fine, key=key, fields=fields)
+            series = {}
+            for field in fields:
+                values = [
+                    (epoch_ms(item['timestamp']), item[field]['avg'])
+                    for item in averaged if item[field]['avg'] is not None
+                ]
+                series[field] = [
+                    {'timestamp': x, 'value': y} for x, y in lttb(values, points)
+                ]
+            response_data['series'] = series
+        else:
+            span = (end - start).total_seconds()
+            if bucket is None:
+                bucket = max(1, math.ceil(span / points))
+            # No more than SERIES_MAX_POINTS points, in whole milliseconds
+            bucket = max(bucket, math.ceil(span * 1000 / SERIES_MAX_POINTS) / 1000)
+            response_data['bucket'] = bucket
+            response_data['points'] = [
+                dict(point, timestamp=epoch_ms(point['timestamp']))
+                for point in model.get_range(start, end, bucket=bucket, key=key, fields=fields)
+            ]
+        
+        return FastJsonResponse(response_data)
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        logger.exception('%s failed', request.path)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def ingest_records(request):
+    """(position, record) pairs from a JSON array or NDJSON request body
+    
+    NDJSON is read line by line as it streams in; a line that is not
+    valid JSON is paired with the ValueError instead of a record.
+    Positions are 1-based line or array element numbers.
+    """
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        def lines():
+            for number, line in enumerate(request, 1):
+                if line.strip():
+                    try:
+                        yield number, loads(line)
+                    except ValueError as e:
+                        yield number, ValueError(f'invalid JSON: {e}')
+        return lines()
+    
+    records = loads(request.body)
+    if not isinstance(records, list):
+        raise ValueError('body must be a JSON array or NDJSON')
+    return enumerate(records, 1)
+
+@csrf_exempt
+@require_POST
+def api_ingest(request, source):
+    """Bulk ingest for external producers
+    
+    The body is a JSON array of records, or NDJSON with an
+    ``application/x-ndjson`` content type. Each record holds the source's
+    fields plus an optional ``timestamp`` (epoch ms or ISO 8601). Records
+    are validated in batches of ``INGEST_SETTINGS['batch_size']`` and queued
+    for unordered bulk inserts; the 202 response reports accepted and
+    rejected records per batch. When the write queue is full the answer is
+    429: the first ``processed`` records were handled and the rest should
+    be retried after ``Retry-After`` seconds.
+
+    The endpoint answers 404 unless ``INGEST_TOKEN`` is set, and then
+    requires ``Authorization: Bearer <token>``.
+    """
+    model = SOURCES.get(source)
+    if model is None:
+        raise Http404(f'Unknown source: {source}')
+    
+    token = settings.INGEST_SETTINGS.get('token')
+    if not token:
+        # Disabled unless a token is configured
+        raise Http404('Ingest is disabled')
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return FastJsonResponse({'error': 'invalid or missing token'}, status=401)
+    
+    try:
+        records = ingest_records(request)
+    except RequestDataTooBig:
+        return FastJsonResponse(
+            {'error': 'body too large; stream it as NDJSON instead'}, status=413
+        )
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    writer = get_ingest_writer()
+    batches = []
+    processed = 0
+    while True:
+        chunk = list(islice(records, writer.batch_size))
+        if not chunk:
+            break
+        docs = []
+        errors = []
+        for position, record in chunk:
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                docs.append(model.validate(record))
+            except ValueError as e:
+                if len(errors) < INGEST_MAX_ERRORS:
+                    errors.append({'record': position, 'error': str(e)})
+        try:
+            writer.add_many(model, docs)
+        except QueueFull:
+            metrics.INGEST_RECORDS.inc(len(chunk), source=source, outcome='throttled')
+            response = FastJsonResponse({
+                'error': 'write queue full',
+                'source': source,
+                'processed': processed,
+                'batches': batches,
+            }, status=429)
+            response['Retry-After'] = str(math.ceil(writer.flush_interval))
+            return response
+        metrics.INGEST_RECORDS.inc(len(docs), source=source, outcome='accepted')
+        metrics.INGEST_RECORDS.inc(len(chunk) - len(docs), source=source, outcome='rejected')
+        batches.append({
+            'accepted': len(docs),
+            'rejected': len(chunk) - len(docs),
+            'errors': errors,
+        })
+        processed += len(chunk)
+    
+    return FastJsonResponse({
+        'source': source,
+        'processed': processed,
+        'accepted': sum(batch['accepted'] for batch in batches),
+        'rejected': sum(batch['rejected'] for batch in batches),
+        'batches': batches,
+    }, status=202)
+
+def api_export(request, source):
+    """Stream raw documents of one source as NDJSON or CSV
+    
+    Query parameters: ``start``/``end`` (ISO 8601) or ``window`` (default
+    1h); ``format`` (``ndjson`` or ``csv``); ``fields`` (comma separated,
+    default all); ``key`` (sensor, symbol, city...) and ``gzip=1`` for a
+    gzip-compressed download. Memory use does not depend on the export size.
+    """
+    model = SOURCES.get(source)
+    if model is None:
+        raise Http404(f'Unknown source: {source}')
+    
+    try:
+        params = request.GET
+        start, end = parse_time_range(params)
+        export_format = params.get('format', 'ndjson')
+        if export_format not in FORMATS:
+            raise ValueError(f'Unknown format: {export_format!r}')
+        fields = [f for f in params.get('fields', '').split(',') if f] or list(model.fields)
+        unknown = set(fields) - set(model.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields for {source}: {', '.join(sorted(unknown))}")
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    docs = model.iter_range(start, end, key=params.get('key'), fields=fields)
+    if export_format == 'csv':
+        chunks = csv_chunks(docs, fields)
+    else:
+        chunks = ndjson_chunks(docs)
+    content_type, extension = FORMATS[export_format]
+    filename = f"{source}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{extension}"
+    if params.get('gzip') in ('1', 'true'):
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    if isinstance(request, ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+    
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's metrics"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
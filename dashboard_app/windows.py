@@ -0,0 +1,386 @@
+"""Rolling-window analytics (last 5 minutes, hour, day...)
+
+Each ``WindowedStat`` tracks count, sum, min and max of one field per key
+(sensor, category, platform, location), and optionally a histogram for
+percentiles. For every configured window a ``SlidingWindow`` keeps those
+aggregates in fixed-width time buckets: new documents update the current
+bucket and buckets that slide out of the window are dropped, so reading a
+window costs O(keys x buckets) however many documents it covers. Window
+edges are exact to one bucket width.
+
+Like the hot tier, the incremental state is per process: it is warmed up
+from MongoDB and fed with the inserts the process sees, so only enable it
+where that is every insert. Otherwise, and for windows that are not
+configured, the stats are aggregated from the raw collections with a
+``$match`` on the indexed timestamp range.
+"""
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+
+from .conf import app_setting
+from .jsonutils import epoch_ms
+from .metrics import QUERY_SECONDS, percentile
+from .models_advanced import EcommerceTransaction, SensorData, SocialMediaMetrics, TrafficData
+
+logger = logging.getLogger(__name__)
+
+# Timestamps are naive and stored as-is, which MongoDB reads as UTC
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+# How far ahead of the clock a document may be stamped and still be kept
+FUTURE_SKEW = timedelta(seconds=5)
+
+
+def _ms(timestamp):
+    return (timestamp - EPOCH) // MILLISECOND
+
+
+class WindowedStat:
+    """Count, sum, min and max of ``field`` per ``model.key_field``
+
+    With ``resolution`` values are also counted in bins of that width, from
+    which percentiles are estimated.
+    """
+
+    def __init__(self, name, model, field, resolution=None):
+        self.name = name
+        self.model = model
+        self.field = field
+        self.resolution = resolution
+
+    def pipeline(self, start, end, bucket_ms=None):
+        """Aggregation of [start, end) grouped by key, time bucket and bin"""
+        group = {'key': f'${self.model.key_field}'}
+        if bucket_ms is not None:
+            # Date minus date is milliseconds, as in _ms()
+            group['bucket'] = {'$floor': {'$divide': [{'$subtract': ['$timestamp', EPOCH]}, bucket_ms]}}
+        if self.resolution is not None:
+            group['bin'] = {'$floor': {'$divide': [f'${self.field}', self.resolution]}}
+        value = f'${self.field}'
+        return [
+            {'$match': {
+                'timestamp': {'$gte': start, '$lt': end},
+                self.field: {'$type': 'number'},
+            }},
+            {'$group': {
+                '_id': group,
+                'count': {'$sum': 1},
+                'total': {'$sum': value},
+                'low': {'$min': value},
+                'high': {'$max': value},
+            }},
+        ]
+
+    def aggregate(self, start, end, bucket_ms=None):
+        """{(key, bucket): entry} of the raw documents in [start, end)
+
+        ``bucket`` is None unless ``bucket_ms`` is given.
+        """
+        collection = self.model.get_read_collection()
+        groups = {}
+        with QUERY_SECONDS.time(operation=f'{self.name}_window', source=self.model.source):
+            rows = collection.aggregate(self.pipeline(start, end, bucket_ms), allowDiskUse=True)
+            for row in rows:
+                slot = (row['_id'].get('key'), row['_id'].get('bucket'))
+                entry = groups.get(slot)
+                if entry is None:
+                    entry = groups[slot] = _new_entry(self.resolution)
+                _merge(entry, [
+                    row['count'], row['total'], row['low'], row['high'],
+                    {int(row['_id']['bin']): row['count']} if self.resolution else None,
+                ])
+        return groups
+
+
+def _new_entry(resolution):
+    # count, sum, min, max, histogram (bin -> count)
+    return [0, 0, math.inf, -math.inf, {} if resolution else None]
+
+
+def _merge(entry, other):
+    entry[0] += other[0]
+    entry[1] += other[1]
+    entry[2] = min(entry[2], other[2])
+    entry[3] = max(entry[3], other[3])
+    if entry[4] is not None and other[4]:
+        histogram = entry[4]
+        for index, count in other[4].items():
+            histogram[index] = histogram.get(index, 0) + count
+
+
+def entry_percentile(entry, resolution, q):
+    """Estimated ``q`` quantile (0-1) of an entry's histogram: the midpoint
+    of the bin holding it, clamped to the observed range"""
+    histogram = entry[4]
+    if not histogram:
+        return None
+    bins = sorted(histogram)
+    index = percentile(bins, q, [histogram[index] for index in bins])
+    return min(max((index + 0.5) * resolution, entry[2]), entry[3])
+
+
+class SlidingWindow:
+    """Aggregates of one stat over the last ``length`` seconds, per key,
+    kept in ``buckets`` time buckets"""
+
+    def __init__(self, stat, length, buckets):
+        self.stat = stat
+        self.length = length
+        self.bucket_ms = max(1, int(length * 1000 / buckets))
+        self.bucket_count = buckets
+        # Bucket index -> {key: entry}
+        self._buckets = {}
+
+    def add(self, key, value, timestamp, now):
+        """Count a value stamped ``timestamp``, unless it falls outside the
+        window ending at ``now`` or more than FUTURE_SKEW after it"""
+        current = _ms(now) // self.bucket_ms
+        index = _ms(timestamp) // self.bucket_ms
+        if index <= current - self.bucket_count or index > _ms(now + FUTURE_SKEW) // self.bucket_ms:
+            return
+        if index not in self._buckets:
+            # A new bucket, so older ones may have slid out of the window
+            self._expire(current)
+        resolution = self.stat.resolution
+        _merge(self._entry(index, key), [
+            1, value, value, value,
+            {math.floor(value / resolution): 1} if resolution else None,
+        ])
+
+    def _entry(self, index, key):
+        bucket = self._buckets.get(index)
+        if bucket is None:
+            bucket = self._buckets[index] = {}
+        if key not in bucket:
+            bucket[key] = _new_entry(self.stat.resolution)
+        return bucket[key]
+
+    def clear(self):
+        self._buckets = {}
+
+    def load(self, groups):
+        """Merge ``stat.aggregate(..., bucket_ms)`` output into the buckets"""
+        for (key, index), entry in groups.items():
+            _merge(self._entry(int(index), key), entry)
+
+    def _expire(self, current):
+        oldest = current - self.bucket_count + 1
+        for index in [index for index in self._buckets if index < oldest]:
+            del self._buckets[index]
+
+    def totals(self, now):
+        """{key: entry} over the buckets of the window ending at ``now``"""
+        current = _ms(now) // self.bucket_ms
+        self._expire(current)
+        totals = {}
+        for index, bucket in self._buckets.items():
+            if index > current:
+                # Documents stamped in the future count once their time comes
+                continue
+            for key, entry in bucket.items():
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = _new_entry(self.stat.resolution)
+                _merge(total, entry)
+        return totals
+
+
+class WindowedAnalytics:
+    """Sliding windows of every stat, by window name"""
+
+    def __init__(self, stats, windows):
+        self.stats = tuple(stats)
+        # Window name -> (seconds, buckets)
+        self.windows = dict(windows)
+        self.ready = False
+        # While warming up, inserts stamped before this are loaded from MongoDB
+        self._warm_from = None
+        self._sliding = {
+            (stat, name): SlidingWindow(stat, seconds, buckets)
+            for stat in self.stats
+            for name, (seconds, buckets) in self.windows.items()
+        }
+        self._lock = threading.Lock()
+
+    def add(self, model, documents):
+        """Feed newly inserted documents"""
+        now = datetime.now()
+        with self._lock:
+            for (stat, _), window in self._sliding.items():
+                if stat.model is not model:
+                    continue
+                for doc in documents:
+                    value = doc.get(stat.field)
+                    timestamp = doc.get('timestamp')
+                    if not isinstance(value, (int, float)) or not isinstance(timestamp, datetime):
+                        continue
+                    if self._warm_from is not None and timestamp < self._warm_from:
+                        continue
+                    window.add(doc.get(model.key_field), value, timestamp, now)
+
+    def warm(self):
+        """Load every window from the raw collections"""
+        with self._lock:
+            now = self._warm_from = datetime.now()
+            for window in self._sliding.values():
+                window.clear()
+        try:
+            loaded = {
+                slot: window.stat.aggregate(
+                    # One extra bucket fills the oldest, partly covered one
+                    now - timedelta(seconds=window.length + window.bucket_ms / 1000),
+                    now, window.bucket_ms,
+                )
+                for slot, window in self._sliding.items()
+            }
+            with self._lock:
+                for slot, window in self._sliding.items():
+                    window.load(loaded[slot])
+                self.ready = True
+        finally:
+            self._warm_from = None
+
+    def totals(self, name, now=None):
+        """{stat: {key: entry}} for window ``name``, or None before warm-up"""
+        if not self.ready or name not in self.windows:
+            return None
+        now = now or datetime.now()
+        with self._lock:
+            return {
+                stat: window.totals(now)
+                for (stat, window_name), window in self._sliding.items()
+                if window_name == name
+            }
+
+
+SENSOR_TEMPERATURE = WindowedStat(
+    'temperature_by_sensor', SensorData, 'temperature', resolution=0.1
+)
+REVENUE_BY_CATEGORY = WindowedStat('revenue_by_category', EcommerceTransaction, 'amount')
+ENGAGEMENT_BY_PLATFORM = WindowedStat(
+    'engagement_by_platform', SocialMediaMetrics, 'engagement_rate'
+)
+SPEED_BY_LOCATION = WindowedStat('speed_by_location', TrafficData, 'avg_speed')
+
+STATS = (SENSOR_TEMPERATURE, REVENUE_BY_CATEGORY, ENGAGEMENT_BY_PLATFORM, SPEED_BY_LOCATION)
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def format_windowed(totals):
+    """API payload of {stat: {key: entry}}"""
+    def entries(stat):
+        return [(key, entry) for key, entry in totals[stat].items() if entry[0]]
+
+    revenue = [
+        {'category': key, 'total_revenue': _round(entry[1]), 'total_orders': entry[0]}
+        for key, entry in entries(REVENUE_BY_CATEGORY)
+    ]
+    return {
+        'sensor_stats': sorted([
+            {
+                'sensor_id': key,
+                'avg_temp': _round(entry[1] / entry[0]),
+                'min_temp': _round(entry[2]),
+                'max_temp': _round(entry[3]),
+                'p95_temp': _round(entry_percentile(entry, SENSOR_TEMPERATURE.resolution, 0.95)),
+                'count': entry[0],
+            }
+            for key, entry in entries(SENSOR_TEMPERATURE)
+        ], key=lambda item: str(item['sensor_id'])),
+        'revenue_by_category': sorted(
+            revenue, key=lambda item: item['total_revenue'], reverse=True
+        ),
+        'engagement_by_platform': sorted([
+            {
+                'platform': key,
+                'avg_engagement_rate': _round(entry[1] / entry[0]),
+                'count': entry[0],
+            }
+            for key, entry in entries(ENGAGEMENT_BY_PLATFORM)
+        ], key=lambda item: str(item['platform'])),
+        'speed_by_location': sorted([
+            {'location': key, 'avg_speed': _round(entry[1] / entry[0]), 'count': entry[0]}
+            for key, entry in entries(SPEED_BY_LOCATION)
+        ], key=lambda item: str(item['location'])),
+    }
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_windowed_analytics():
+    """Process-wide WindowedAnalytics, or None unless incremental windows are enabled"""
+    global _analytics
+    if not app_setting('ANALYTICS_WINDOWS', 'incremental', False):
+        return None
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = WindowedAnalytics(
+                    STATS, app_setting('ANALYTICS_WINDOWS', 'windows', {})
+                )
+    return _analytics
+
+
+def build_windowed_analytics(seconds):
+    """Stats over the last ``seconds``: from the sliding windows when one of
+    that length is maintained, otherwise aggregated from the raw data"""
+    end = datetime.now()
+    start = end - timedelta(seconds=seconds)
+    analytics = get_windowed_analytics()
+    totals = None
+    if analytics is not None:
+        for name, (length, _) in analytics.windows.items():
+            if length == seconds:
+                totals = analytics.totals(name, end)
+                break
+    incremental = totals is not None
+    if not incremental:
+        totals = {}
+        for stat in STATS:
+            totals[stat] = {key: entry for (key, _), entry in stat.aggregate(start, end).items()}
+    return {
+        'window': seconds,
+        'start': epoch_ms(start),
+        'end': epoch_ms(end),
+        'incremental': incremental,
+        **format_windowed(totals),
+    }
+
+
+def warm_up():
+    """Load the sliding windows from MongoDB; returns whether that worked
+
+    Until it does, requests keep using the raw aggregation. Run it with
+    ``db_utils.retry_in_background()`` to retry until it succeeds.
+    """
+    analytics = get_windowed_analytics()
+    if analytics is None:
+        return True
+    try:
+        analytics.warm()
+    except Exception:
+        logger.exception('Could not warm up the analytics windows')
+        return False
+    return True
+
+
+def feed_batch(batch):
+    """Feed a change stream batch (model -> documents)"""
+    analytics = get_windowed_analytics()
+    if analytics is not None:
+        for model, documents in batch.items():
+            analytics.add(model, documents)
+
+
+def update_windows(sender, documents, **kwargs):
+    """documents_inserted receiver: fold new documents into the sliding windows"""
+    analytics = get_windowed_analytics()
+    if analytics is not None and documents:
+        analytics.add(sender, documents)
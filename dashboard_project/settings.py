@@ -13,6 +13,7 @@ DEBUG = os.getenv('DEBUG', 'True') == 'True'
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
 INSTALLED_APPS = [
+    'daphne',  # ASGI runserver so WebSockets work in development
     'django.contrib.contenttypes',
     'django.contrib.staticfiles',
     'dashboard_app',
@@ -20,6 +21,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dashboard_app.metrics.MetricsMiddleware',
+    'dashboard_app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise
     'django.middleware.common.CommonMiddleware',
@@ -44,11 +47,139 @@ TEMPLATES = [
 ]
 
 # MongoDB Configuration (PyMongo)
+_write_w = os.getenv('MONGODB_WRITE_W', '1')
+# "source=seconds" pairs, '*' for every other source, e.g. "*=2592000,stocks=7776000"
+_retention = dict(
+    item.split('=', 1) for item in os.getenv('MONGODB_RETENTION', '').split(',') if '=' in item
+)
 MONGODB_SETTINGS = {
     'host': os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
-    'db_name': os.getenv('MONGODB_DB_NAME', 'realtime_dashboard')
+    'db_name': os.getenv('MONGODB_DB_NAME', 'realtime_dashboard'),
+    # Create model indexes in the background when the app starts
+    'ensure_indexes': os.getenv('MONGODB_ENSURE_INDEXES', 'False') == 'True',
+    # Connection pool (per process; clients are created after fork)
+    'max_pool_size': int(os.getenv('MONGODB_MAX_POOL_SIZE', '50')),
+    'min_pool_size': int(os.getenv('MONGODB_MIN_POOL_SIZE', '0')),
+    'max_idle_time_ms': int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '60000')),
+    'connect_timeout_ms': int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000')),
+    'server_selection_timeout_ms': int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    'wait_queue_timeout_ms': int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    # Write concern for the ingest path and read preference for dashboard queries
+    'write_concern': {
+        'w': int(_write_w) if _write_w.isdigit() else _write_w,
+        'j': os.getenv('MONGODB_WRITE_J', 'False') == 'True',
+    },
+    'read_preference': os.getenv('MONGODB_READ_PREFERENCE', 'secondaryPreferred'),
+    # Create missing source collections as time-series collections (MongoDB 5.0+)
+    'timeseries': os.getenv('MONGODB_TIMESERIES', 'False') == 'True',
+    'timeseries_granularity': os.getenv('MONGODB_TIMESERIES_GRANULARITY', 'seconds'),
+    # Raw data retention (expireAfterSeconds) of time-series collections per source
+    'retention_seconds': {source.strip(): int(seconds) for source, seconds in _retention.items()},
+}
+
+# Bulk ingest buffering (see dashboard_app.ingest.BufferedWriter)
+INGEST_SETTINGS = {
+    'batch_size': int(os.getenv('INGEST_BATCH_SIZE', '500')),
+    'flush_interval': float(os.getenv('INGEST_FLUSH_INTERVAL', '1.0')),
+    # /api/ingest/ answers 429 once this many documents are waiting to be written
+    'max_pending': int(os.getenv('INGEST_MAX_PENDING', '50000')),
+    # Bearer token required by /api/ingest/, which is disabled while unset
+    'token': os.getenv('INGEST_TOKEN') or None,
 }
 
+# Redis (optional) backs the shared snapshot cache across worker processes
+REDIS_URL = os.getenv('REDIS_URL')
+# Channel layer for the live feed (configured in CHANNEL_LAYERS below).
+# 'memory' only reaches consumers in the same process. 'redis' (channels_redis
+# core) and 'redis-pubsub' (Redis pub/sub) share the live feed across ASGI
+# workers and hosts.
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'redis' if REDIS_URL else 'memory')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if REDIS_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Latest-snapshot cache for the dashboard APIs (see dashboard_app.cache)
+SNAPSHOT_CACHE = {
+    'ttl': float(os.getenv('SNAPSHOT_CACHE_TTL', '2.0')),
+    # Django cache alias shared by all workers; None keeps it in-process
+    'backend': os.getenv('SNAPSHOT_CACHE_BACKEND', 'shared' if REDIS_URL else '') or None,
+}
+
+# Live updates from a MongoDB change stream (replica set required) instead of
+# the insert signal of the writing process. With 'autostart' every web process
+# watches on its first WebSocket connection. It is off by default with a shared
+# channel layer, where each process's watcher would send every insert to every
+# dashboard: run one `manage.py watch_changes` process instead.
+CHANGE_STREAM = {
+    'enabled': os.getenv('CHANGE_STREAM_ENABLED', 'False') == 'True',
+    'autostart': os.getenv(
+        'CHANGE_STREAM_AUTOSTART', 'True' if CHANNEL_LAYER == 'memory' else 'False'
+    ) == 'True',
+    'batch_interval': float(os.getenv('CHANGE_STREAM_BATCH_INTERVAL', '0.1')),
+    'max_batch': int(os.getenv('CHANGE_STREAM_MAX_BATCH', '1000')),
+}
+
+# Per-process in-memory copy of the newest documents per source and key
+# (see dashboard_app.hottier). It must see every insert, so it is fed from
+# the change stream when CHANGE_STREAM is enabled and stays off otherwise,
+# unless 'single_process' says this process is the only writer (e.g. one
+# daphne process taking all of /api/ingest/).
+HOT_TIER = {
+    'enabled': os.getenv('HOT_TIER_ENABLED', 'False') == 'True',
+    'single_process': os.getenv('HOT_TIER_SINGLE_PROCESS', 'False') == 'True',
+    # Documents kept per source, and per sensor/symbol/city...
+    'capacity': int(os.getenv('HOT_TIER_CAPACITY', '1000')),
+    'key_capacity': int(os.getenv('HOT_TIER_KEY_CAPACITY', '100')),
+    # Keys kept per source; the least recently written are dropped first
+    'max_keys': int(os.getenv('HOT_TIER_MAX_KEYS', '1000')),
+}
+
+# Rolling-window analytics (see dashboard_app.windows): "window=buckets" pairs,
+# each window's edges being exact to window/buckets. 'incremental' maintains
+# them in memory from the inserts this process sees; only enable it where
+# that is every insert, like HOT_TIER. Otherwise they are aggregated per request.
+_duration_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_windows = dict(
+    item.strip().split('=', 1)
+    for item in os.getenv('ANALYTICS_WINDOWS', '5m=60,1h=60,24h=96').split(',') if '=' in item
+)
+ANALYTICS_WINDOWS = {
+    'incremental': os.getenv('ANALYTICS_WINDOWS_INCREMENTAL', 'False') == 'True',
+    # Window name -> (seconds, buckets)
+    'windows': {
+        name: (int(name[:-1]) * _duration_units[name[-1]], int(buckets))
+        for name, buckets in _windows.items()
+    },
+}
+
+# Streaming alert rules run on every insert (see dashboard_app.alerts). Alerts
+# are broadcast from the writing process, so a shared channel layer is needed
+# when writers and dashboards run in different processes.
+ALERTS = {
+    'enabled': os.getenv('ALERTS_ENABLED', 'True') == 'True',
+    'broadcast': os.getenv('ALERTS_BROADCAST', 'True') == 'True',
+}
+
+# Response compression (see dashboard_app.compression); Brotli needs the
+# optional brotli package
+COMPRESSION = {
+    'brotli_quality': int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5')),
+    'gzip_level': int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')),
+    # Compressed snapshot bodies kept per ETag
+    'cache_entries': int(os.getenv('COMPRESSION_CACHE_ENTRIES', '32')),
+}
+
+# Threads used to query the seven sources concurrently in the API views
+API_QUERY_WORKERS = int(os.getenv('API_QUERY_WORKERS', '8'))
+
 # Dummy database for Django (required but not used)
 DATABASES = {
     'default': {
@@ -67,8 +198,45 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Django Channels for WebSockets
 ASGI_APPLICATION = 'dashboard_project.asgi.application'
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
+_channel_layer_limits = {
+    # Messages queued per channel before new ones are dropped
+    'capacity': int(os.getenv('CHANNEL_LAYER_CAPACITY', '100')),
+    # Seconds an undelivered message is kept
+    'expiry': int(os.getenv('CHANNEL_LAYER_EXPIRY', '10')),
+    # Seconds a consumer stays in a group without re-joining
+    'group_expiry': int(os.getenv('CHANNEL_LAYER_GROUP_EXPIRY', '86400')),
+}
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL or 'redis://localhost:6379/0'],
+                **_channel_layer_limits,
+            },
+        },
+    }
+elif CHANNEL_LAYER == 'redis-pubsub':
+    # Fire-and-forget pub/sub: no per-channel queues, so no capacity or expiry
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL or 'redis://localhost:6379/0']},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': _channel_layer_limits,
+        },
+    }
+
+# Live feed messages (see dashboard_app.broadcast)
+BROADCAST = {
+    # Inserts within this many seconds go out as one message; 0 sends each at once
+    'batch_interval': float(os.getenv('BROADCAST_BATCH_INTERVAL', '0.1')),
+    # Frames at least this large are zlib-compressed on the channel layer
+    'compress_min_bytes': int(os.getenv('BROADCAST_COMPRESS_MIN_BYTES', '4096')),
+    'compress_level': int(os.getenv('BROADCAST_COMPRESS_LEVEL', '1')),
 }
\ No newline at end of file
@@ -127,33 +127,203 @@ function initializeCharts() {
     });
 }
 
-// Fetch and update all data
+// Latest documents kept per source, newest first (mirrors LATEST_LIMITS in views_advanced.py)
+const SOURCE_LIMITS = {
+    sensors: 20,
+    system_metrics: 20,
+    stocks: 30,
+    weather: 25,
+    ecommerce: 20,
+    social_media: 25,
+    traffic: 25
+};
+const POLL_INTERVAL = 5000;
+const ANALYTICS_INTERVAL = 5000;
+
+let dashboardData = null;
+// Newest ObjectId seen per source, sent back as ?since= for delta requests
+let cursor = {};
+let pollTimer = null;
+let renderScheduled = false;
+let lastAnalyticsFetch = 0;
+
+function renderDashboard() {
+    // Update stats
+    updateStats(dashboardData);
+    
+    // Update charts
+    updateCharts(dashboardData);
+    
+    // Update tables
+    updateTables(dashboardData);
+    
+    // Update last update time
+    document.getElementById('lastUpdate').textContent = 
+        'Last updated: ' + new Date().toLocaleTimeString();
+}
+
+function scheduleRender() {
+    // Several sources usually arrive together; render once per frame
+    if (!renderScheduled) {
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            renderDashboard();
+        });
+    }
+}
+
+function cursorParam() {
+    return Object.entries(cursor).map(([source, id]) => `${source}:${id}`).join(',');
+}
+
+// Fetch the full snapshot once, then only documents newer than the cursor
 async function fetchAllData() {
     try {
-        const response = await fetch('/api/all-data/');
+        const delta = dashboardData !== null;
+        const url = delta
+            ? '/api/all-data/?since=' + encodeURIComponent(cursorParam())
+            : '/api/all-data/';
+        const response = await fetch(url);
         const data = await response.json();
+        if (data.error) {
+            throw new Error(data.error);
+        }
         
-        // Update stats
-        updateStats(data);
-        
-        // Update charts
-        updateCharts(data);
-        
-        // Update tables
-        updateTables(data);
+        if (delta) {
+            Object.keys(SOURCE_LIMITS).forEach(source => mergeDocuments(source, data[source]));
+        } else {
+            dashboardData = data;
+        }
+        cursor = Object.assign(cursor, data.cursor);
+        scheduleRender();
         
         // Fetch analytics
         await fetchAnalytics();
-        
-        // Update last update time
-        document.getElementById('lastUpdate').textContent = 
-            'Last updated: ' + new Date().toLocaleTimeString();
+        lastAnalyticsFetch = Date.now();
         
     } catch (error) {
         console.error('Error fetching data:', error);
     }
 }
 
+// Prepend new documents (newest first) and trim to the source limit
+function mergeDocuments(source, newestFirst) {
+    if (!newestFirst || newestFirst.length === 0) {
+        return;
+    }
+    dashboardData[source] = newestFirst.concat(dashboardData[source]).slice(0, SOURCE_LIMITS[source]);
+}
+
+// Merge documents pushed over the WebSocket into the local snapshot
+function applyUpdate(source, docs, position) {
+    if (!dashboardData || !dashboardData[source]) {
+        return;
+    }
+    // Already merged, from a delta fetch or a second watcher relaying the
+    // same inserts. ObjectId hex strings of equal length sort in _id order.
+    if (position && cursor[source] && position <= cursor[source]) {
+        return;
+    }
+    mergeDocuments(source, docs.slice().reverse());
+    if (position) {
+        cursor[source] = position;
+    }
+    scheduleRender();
+    
+    if (Date.now() - lastAnalyticsFetch >= ANALYTICS_INTERVAL) {
+        lastAnalyticsFetch = Date.now();
+        fetchAnalytics();
+    }
+}
+
+// Stored strings come from ingested documents, so escape them before use in HTML
+const HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => HTML_ESCAPES[c]);
+}
+
+// Alerts from the server-side rules engine, newest first
+const ALERT_LIMIT = 20;
+let alerts = [];
+
+async function fetchAlerts() {
+    try {
+        const response = await fetch(`/api/alerts/?limit=${ALERT_LIMIT}`);
+        const data = await response.json();
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        alerts = data.alerts;
+        renderAlerts();
+    } catch (error) {
+        console.error('Error fetching alerts:', error);
+    }
+}
+
+function addAlerts(newAlerts) {
+    alerts = newAlerts.slice().reverse().concat(alerts).slice(0, ALERT_LIMIT);
+    renderAlerts();
+}
+
+function renderAlerts() {
+    const alertTbody = document.querySelector('#alertTable tbody');
+    alertTbody.innerHTML = alerts.map(a => `
+        <tr>
+            <td>${new Date(a.timestamp).toLocaleTimeString()}</td>
+            <td>${escapeHtml(a.source)}${a.key ? ' / ' + escapeHtml(a.key) : ''}</td>
+            <td>${escapeHtml(a.message)}</td>
+            <td><span class="badge ${escapeHtml(a.severity)}">${escapeHtml(a.severity)}</span></td>
+        </tr>
+    `).join('');
+}
+
+function startPolling() {
+    if (pollTimer === null) {
+        pollTimer = setInterval(fetchAllData, POLL_INTERVAL);
+    }
+}
+
+function stopPolling() {
+    if (pollTimer !== null) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+}
+
+// Live updates over WebSocket. Polling stops only when the server reports
+// that the socket carries every insert (a shared channel layer or change
+// streams); otherwise writers in other processes would never be seen.
+function connectSocket() {
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${scheme}://${window.location.host}/ws/dashboard/`);
+    
+    socket.onopen = () => {
+        // Resynchronise in case updates were missed while disconnected
+        fetchAllData();
+        fetchAlerts();
+    };
+    
+    socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'hello') {
+            if (message.complete) {
+                stopPolling();
+            }
+        } else if (message.type === 'batch') {
+            message.updates.forEach((update) => applyUpdate(update.source, update.data, update.cursor));
+        } else if (message.type === 'alerts') {
+            addAlerts(message.alerts);
+        }
+    };
+    
+    socket.onclose = () => {
+        startPolling();
+        setTimeout(connectSocket, POLL_INTERVAL);
+    };
+}
+
 function updateStats(data) {
     // Average Temperature
     if (data.sensors.length > 0) {
@@ -295,10 +465,10 @@ function updateTables(data) {
     const sensorTbody = document.querySelector('#sensorTable tbody');
     sensorTbody.innerHTML = data.sensors.slice(0, 8).map(s => `
         <tr>
-            <td>${s.sensor_id}</td>
+            <td>${escapeHtml(s.sensor_id)}</td>
             <td>${s.temperature.toFixed(1)}°C</td>
             <td>${s.humidity.toFixed(1)}%</td>
-            <td><span class="badge ${s.status}">${s.status}</span></td>
+            <td><span class="badge ${escapeHtml(s.status)}">${escapeHtml(s.status)}</span></td>
         </tr>
     `).join('');
     
@@ -306,10 +476,10 @@ function updateTables(data) {
     const ecommerceTbody = document.querySelector('#ecommerceTable tbody');
     ecommerceTbody.innerHTML = data.ecommerce.slice(0, 8).map(t => `
         <tr>
-            <td>${t.order_id}</td>
-            <td>${t.product_name}</td>
+            <td>${escapeHtml(t.order_id)}</td>
+            <td>${escapeHtml(t.product_name)}</td>
             <td>$${t.amount.toFixed(2)}</td>
-            <td>${t.customer_location}</td>
+            <td>${escapeHtml(t.customer_location)}</td>
         </tr>
     `).join('');
     
@@ -324,7 +494,7 @@ function updateTables(data) {
     
     stockTbody.innerHTML = Object.values(latestStocksBySymbol).slice(0, 6).map(s => `
         <tr>
-            <td><strong>${s.symbol}</strong></td>
+            <td><strong>${escapeHtml(s.symbol)}</strong></td>
             <td>$${s.price.toFixed(2)}</td>
             <td class="${s.change_percent >= 0 ? 'positive' : 'negative'}">
                 ${s.change_percent >= 0 ? '+' : ''}${s.change_percent.toFixed(2)}%
@@ -337,18 +507,20 @@ function updateTables(data) {
     const trafficTbody = document.querySelector('#trafficTable tbody');
     trafficTbody.innerHTML = data.traffic.slice(0, 8).map(t => `
         <tr>
-            <td>${t.location}</td>
-            <td>${t.vehicle_count}</td>
+            <td>${escapeHtml(t.location)}</td>
+            <td>${escapeHtml(t.vehicle_count)}</td>
             <td>${t.avg_speed.toFixed(1)} km/h</td>
-            <td><span class="badge ${t.congestion_level.toLowerCase()}">${t.congestion_level}</span></td>
+            <td><span class="badge ${escapeHtml(String(t.congestion_level).toLowerCase())}">${escapeHtml(t.congestion_level)}</span></td>
         </tr>
     `).join('');
 }
 
-// Initialize and start auto-update
+// Initialize and start live updates
 initializeCharts();
 fetchAllData();
-setInterval(fetchAllData, 5000); // Update every 5 seconds
+fetchAlerts();
+startPolling();
+connectSocket();
 
 console.log('🚀 Advanced Dashboard initialized - MongoDB NoSQL Backend');
-console.log('📊 Auto-updating every 5 seconds with 7 data sources');
+console.log('📡 Live updates over WebSocket with 7 data sources');